@@ -6,7 +6,8 @@ from pathlib import Path
 
 import mkdocs_gen_files
 
-IGNORE = {"__pycache__", "tests", "test", "examples", "docs", "doc", "build", "dist", "__init__", "__main__", "main"}
+IGNORE = {"__pycache__", "tests", "test", "examples", "docs", "doc", "build", "dist", "__init__", "__main__", "main",
+          "benchmark", "cluster"}
 
 nav = mkdocs_gen_files.Nav()
 
@@ -0,0 +1,678 @@
+#!/bin/bash
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field, fields
+from random import randint
+from time import perf_counter, sleep
+
+from dataclasses_json import dataclass_json
+
+from utils.codec import WireFormat, encode_message, decode_message
+from utils.communication import CipherMode, Communication, KeyManager, WireCipher
+from utils.compression import Compressor
+from utils.msg import Message, MessageComposer, marshall_message
+from utils.msg_variables import MsgKey, MsgType
+from utils.peers import CLIENT_BASE_PORT
+from utils.utils import OpQueue, signp
+
+N_REPLICAS = 7  # number of replicas used to build the sample messages and to run the local cluster
+CLUSTER_CLIENT_PID = 1000  # id of the client driving the local cluster, its port is 8000 + id
+CLUSTER_TIMEOUT = 5  # seconds after which a request to the local cluster is considered lost
+
+
+def sample_messages() -> dict:
+    """
+    Build a sample message for the most common message types of a sieve round.
+
+    Returns:
+        dictionary that contains the message type name as key and the message as value
+    """
+
+    operation = MessageComposer.compose_operation("key", "value")
+    op_id = (CLUSTER_CLIENT_PID, 1)
+    sign = signp(operation)
+    approves = dict((pid, MessageComposer.compose_approve(1, op_id, sign)) for pid in range(1, N_REPLICAS + 1))
+
+    new_sieve_config = MessageComposer.compose_new_sieve_config(2, 3)
+    new_sieve_config.leader_buffer = [dict((pid, (CLUSTER_CLIENT_PID, pid)) for pid in range(1, N_REPLICAS + 1)),
+                                      list(range(1, N_REPLICAS + 1)),
+                                      [((CLUSTER_CLIENT_PID, pid), ("key" + str(pid), "value"))
+                                       for pid in range(1, N_REPLICAS + 1)]]
+
+    return {
+        MsgType.EXECUTE.name: MessageComposer.compose_execute(1, operation, op_id),
+        MsgType.APPROVE.name: approves[1],
+        MsgType.VALIDATION.name: MessageComposer.compose_validation(MsgType.CONFIRM.value, 1, op_id),
+        MsgType.ORDER.name: MessageComposer.compose_order(MsgType.CONFIRM.value, 1, op_id, 8, operation, approves),
+        MsgType.NEW_SIEVE_CONFIG.name: new_sieve_config
+    }
+
+
+def measure(function, iterations: int) -> float:
+    """
+    Measure the mean execution time of a function.
+
+    Parameters:
+        function: function without parameters to measure
+        iterations: number of executions
+
+    Returns:
+        mean execution time in microseconds
+    """
+
+    start = perf_counter()
+    for _ in range(iterations):
+        function()
+    return (perf_counter() - start) / iterations * 1e6
+
+
+def benchmark_cipher_modes(iterations: int = 5000) -> None:
+    """
+    Compare the wire cipher modes: encryption and decryption time, bytes on the wire and rejection time of a forged
+    datagram.
+
+    Parameters:
+        iterations: number of executions for each measure
+    """
+
+    print(f"{'mode':<10}{'message':<18}{'bytes':>8}{'enc (us)':>12}{'dec (us)':>12}{'reject (us)':>14}")
+
+    for mode in CipherMode:
+        cipher = WireCipher(mode)
+        key = KeyManager(key_length=cipher.key_length).get("12")
+
+        for name, message in sample_messages().items():
+            plaintext = json.dumps(marshall_message(message)).encode()
+            data = cipher.encrypt(plaintext, key)
+            forged = data[:-1] + bytes([data[-1] ^ 1])
+
+            enc_time = measure(lambda: cipher.encrypt(plaintext, key), iterations)
+            dec_time = measure(lambda: cipher.decrypt(data, key), iterations)
+            if mode == CipherMode.CBC:
+                # Without authentication the forged datagram is only rejected when it fails to be parsed
+                reject_time = measure(lambda: parse_or_none(cipher.decrypt(forged, key)), iterations)
+            else:
+                reject_time = measure(lambda: cipher.decrypt(forged, key), iterations)
+
+            print(f"{mode.value:<10}{name:<18}{len(data):>8}{enc_time:>12.2f}{dec_time:>12.2f}{reject_time:>14.2f}")
+
+
+def benchmark_wire_formats(iterations: int = 5000) -> None:
+    """
+    Compare the wire formats: encoding and decoding time and size of the serialized messages.
+
+    Parameters:
+        iterations: number of executions for each measure
+    """
+
+    print(f"{'format':<10}{'message':<18}{'bytes':>8}{'enc (us)':>12}{'dec (us)':>12}")
+
+    for wire_format in WireFormat:
+        for name, message in sample_messages().items():
+            data = encode_message(message, wire_format)
+
+            enc_time = measure(lambda: encode_message(message, wire_format), iterations)
+            dec_time = measure(lambda: decode_message(data), iterations)
+
+            print(f"{wire_format.value:<10}{name:<18}{len(data):>8}{enc_time:>12.2f}{dec_time:>12.2f}")
+
+
+def legacy_message_class() -> type:
+    """
+    Build the message class as it was before using slots: a dataclass with a per-instance dictionary.
+
+    Returns:
+        the legacy message class
+    """
+
+    namespace = {"__annotations__": dict(Message.__annotations__)}
+    for message_field in fields(Message):
+        namespace[message_field.name] = field(default=None, metadata=message_field.metadata)
+
+    return dataclass_json(dataclass(type("LegacyMessage", (), namespace)))
+
+
+def allocated_bytes(function, iterations: int) -> float:
+    """
+    Measure the mean number of bytes kept allocated by the objects a function returns.
+
+    Parameters:
+        function: function without parameters to measure
+        iterations: number of executions
+
+    Returns:
+        mean allocated bytes for each execution
+    """
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [function() for _ in range(iterations)]
+    allocated = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del objects
+
+    return allocated / iterations
+
+
+def benchmark_message_allocation(iterations: int = 20000) -> None:
+    """
+    Compare the message representations: bytes allocated for each message and construction time, for the slots based
+    message built by the composer and for the legacy message built through dataclasses_json.
+
+    Parameters:
+        iterations: number of executions for each measure
+    """
+
+    legacy_message = legacy_message_class()
+    operation = ["key", "value"]
+    invoke = {MsgKey.TYPE.value: MsgType.INVOKE.value, MsgKey.CONFIG.value: 1, MsgKey.OPERATION.value: operation,
+              MsgKey.PID.value: 1000}
+
+    cases = {
+        "legacy from_dict": lambda: legacy_message.from_dict(invoke),
+        "legacy init": lambda: legacy_message(type=MsgType.INVOKE.value, c=1, o=operation, pid=1000),
+        "slots composer": lambda: MessageComposer.compose_invoke(1, operation, (1000, 1))
+    }
+
+    print(f"{'construction':<20}{'object (B)':>12}{'alloc (B)':>12}{'time (us)':>12}")
+
+    for name, function in cases.items():
+        size = sys.getsizeof(function())
+        message = function()
+        if hasattr(message, "__dict__"):
+            size += sys.getsizeof(message.__dict__)
+
+        print(f"{name:<20}{size:>12}{allocated_bytes(function, iterations):>12.1f}"
+              f"{measure(function, iterations):>12.2f}")
+
+
+def benchmark_broadcast(iterations: int = 200) -> None:
+    """
+    Compare the time spent by the leader to broadcast an ORDER message with and without the group key, and to only
+    queue it for the send workers, for increasing numbers of replicas. The replicas are not started, the datagrams
+    are sent to unused local ports.
+
+    Parameters:
+        iterations: number of broadcasts for each measure
+    """
+
+    message = sample_messages()[MsgType.ORDER.name]
+
+    print(f"{'replicas':>10}{'pairwise (us)':>16}{'group (us)':>14}{'queued (us)':>14}")
+
+    for n_replicas in (4, 7, 16, 31):
+        hosts = dict((str(pid), "127.0.0.1") for pid in range(1, n_replicas + 1))
+        ports = dict((str(pid), 20000 + pid) for pid in range(1, n_replicas + 1))
+        keys = dict((str(pid), "1" + str(pid)) for pid in range(2, n_replicas + 1))
+        times = []
+
+        for group_key, senders in ((None, False), ("group", False), ("group", True)):
+            communication = Communication(hosts, ports, keys, 1, wire_format=WireFormat.BINARY, group_key=group_key)
+            if senders:
+                communication.start_senders()
+            with redirect_stdout(io.StringIO()):
+                times.append(measure(lambda: communication.broadcast(message), iterations))
+                communication.close()
+
+        print(f"{n_replicas:>10}{times[0]:>16.2f}{times[1]:>14.2f}{times[2]:>14.2f}")
+
+
+def benchmark_compression(iterations: int = 2000) -> None:
+    """
+    Measure the bytes saved by the compression with the shared dictionary and its CPU cost, for each message type and
+    wire format.
+
+    Parameters:
+        iterations: number of executions for each measure
+    """
+
+    compressor = Compressor(threshold=1)
+
+    print(f"{'format':<10}{'message':<18}{'bytes':>8}{'compressed':>12}{'saved':>8}{'comp (us)':>12}"
+          f"{'decomp (us)':>13}")
+
+    for wire_format in WireFormat:
+        for name, message in sample_messages().items():
+            data = encode_message(message, wire_format)
+            compressed = compressor.compress(data)
+
+            comp_time = measure(lambda: compressor.compress(data), iterations)
+            decomp_time = measure(lambda: compressor.decompress(compressed), iterations)
+            saved = 1 - len(compressed) / len(data)
+
+            print(f"{wire_format.value:<10}{name:<18}{len(data):>8}{len(compressed):>12}{saved:>8.0%}"
+                  f"{comp_time:>12.2f}{decomp_time:>13.2f}")
+
+
+def receive_peak(communication: Communication, receive, send, iterations: int) -> tuple:
+    """
+    Measure a receive path of a communication: the peak of the bytes allocated while receiving a message and the time
+    spent receiving it.
+
+    Parameters:
+        communication: communication receiving the messages
+        receive: function without parameters receiving a message
+        send: function without parameters sending a message to the communication
+        iterations: number of messages received for each measure
+
+    Returns:
+        tuple (mean peak of allocated bytes, mean receive time in microseconds)
+    """
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        send()
+        receive()
+
+        elapsed = 0.0
+        for _ in range(iterations):
+            send()
+            start = perf_counter()
+            receive()
+            elapsed += perf_counter() - start
+
+        peaks = 0
+        tracemalloc.start()
+        for _ in range(iterations):
+            send()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            receive()
+            peaks += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+
+    return peaks / iterations, elapsed / iterations * 1e6
+
+
+def benchmark_receive(iterations: int = 2000) -> None:
+    """
+    Compare the receive paths: peak of the bytes allocated for each received message and receive time, for a datagram
+    received into a new bytes object and sliced before the decryption, and for a datagram received into a buffer of
+    the pool and decrypted through views of it.
+
+    Parameters:
+        iterations: number of messages received for each measure
+    """
+
+    hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+    ports = {"1": 19001, "2": 19002}
+    sender = Communication(dict(hosts), dict(ports), {"2": "12"}, 1, 8192, wire_format=WireFormat.BINARY)
+    receiver = Communication(dict(hosts), dict(ports), {"1": "12"}, 2, 8192)
+
+    def receive_bytes():
+        print("Waiting for message")
+        data, addr = receiver.socket.recvfrom(receiver.buffer_size)
+        return receiver.handle_datagram(data, addr)
+
+    paths = {"recvfrom": receive_bytes, "recvfrom_into": receiver.receive}
+
+    print(f"{'message':<18}{'path':<16}{'peak alloc (B)':>16}{'time (us)':>12}")
+
+    for name, message in sample_messages().items():
+        for path, receive in paths.items():
+            peak, elapsed = receive_peak(receiver, receive, lambda: sender.send(message, 2), iterations)
+            print(f"{name:<18}{path:<16}{peak:>16.0f}{elapsed:>12.2f}")
+
+    print(f"buffers: {receiver.get_stats()['buffers']}")
+    sender.close()
+    receiver.close()
+
+
+def start_cluster(n_replicas: int = N_REPLICAS, runtime: str = "threads", **settings) -> list:
+    """
+    Start a cluster of replicas on the local host, each one in its own python process, or all of them in the same
+    python process.
+
+    Parameters:
+        n_replicas: number of replicas
+        runtime: runtime of the replicas, threads or asyncio for a python process for each replica, hosted for all the
+            replicas in the asyncio event loop of a single python process
+        settings: environment variables added to the configuration of each replica
+
+    Returns:
+        the list of the python processes
+    """
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, N_PROCESSES=str(n_replicas), BUFFER_SIZE="8192", FAULTY="0", PROCESS_HOST="127.0.0.1",
+               CLIENT_BASE_PORT=str(CLIENT_BASE_PORT), RUNTIME=runtime, **settings)
+
+    if runtime == "hosted":
+        return [subprocess.Popen([sys.executable, "cluster.py"], env=env, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL, cwd=directory)]
+
+    replicas = []
+    for pid in range(1, n_replicas + 1):
+        env = dict(env, PROCESS_ID=str(pid))
+        for other in range(1, n_replicas + 1):
+            if other != pid:
+                env["KEY" + str(other)] = str(min(pid, other)) + str(max(pid, other))
+        replicas.append(subprocess.Popen([sys.executable, "main.py"], env=env, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL, cwd=directory))
+
+    return replicas
+
+
+def cluster_client(n_replicas: int = N_REPLICAS) -> Communication:
+    """
+    Build the communication of a client of the local cluster.
+
+    Parameters:
+        n_replicas: number of replicas
+
+    Returns:
+        the communication of the client
+    """
+
+    pids = [str(pid) for pid in range(1, n_replicas + 1)] + [str(CLUSTER_CLIENT_PID)]
+    communication = Communication(dict((pid, "127.0.0.1") for pid in pids),
+                                  dict((pid, (CLIENT_BASE_PORT if pid in pids[:-1] else 8000) + int(pid))
+                                       for pid in pids),
+                                  dict((pid, pid) for pid in pids[:-1]), CLUSTER_CLIENT_PID, 8192)
+    communication.socket.settimeout(CLUSTER_TIMEOUT)
+    return communication
+
+
+def receive_output(communication: Communication, msg_type: int) -> Message:
+    """
+    Receive the messages until an output of the given type arrives or the timeout expires.
+
+    Parameters:
+        communication: communication of the client
+        msg_type: type of the expected output
+
+    Returns:
+        the output message, None if it doesn't arrive before the timeout
+    """
+
+    deadline = perf_counter() + CLUSTER_TIMEOUT
+    while perf_counter() < deadline:
+        message, _ = communication.receive()
+        if message is not None and message.type == msg_type:
+            return message
+    return None
+
+
+def measure_cluster(n_replicas: int, runtime: str, requests: int, window: int, operations: int, **settings) -> tuple:
+    """
+    Measure a local cluster of replicas: the rate of REQUEST_VALUE messages a replica answers, and the rate of the
+    operations committed one after the other by a client.
+
+    Parameters:
+        n_replicas: number of replicas
+        runtime: runtime of the replicas, see start_cluster
+        requests: number of REQUEST_VALUE messages sent to a replica
+        window: max number of REQUEST_VALUE messages waiting for an answer
+        operations: number of operations committed
+        settings: environment variables added to the configuration of each replica
+
+    Returns:
+        tuple (answered, answered per second, committed, committed per second)
+    """
+
+    replicas = start_cluster(n_replicas, runtime, **settings)
+    communication = cluster_client(n_replicas)
+
+    try:
+        with redirect_stdout(io.StringIO()):
+            prepare_cluster(communication, n_replicas)
+
+            # Messages answered by a single replica, with at most window messages waiting for an answer
+            answered = 0
+            start = perf_counter()
+            for index in range(requests):
+                communication.send(MessageComposer.compose_request_value("key"), 2)
+                if index >= window:
+                    answered += receive_output(communication, MsgType.REQUEST_VALUE.value) is not None
+            while answered < requests and receive_output(communication, MsgType.REQUEST_VALUE.value) is not None:
+                answered += 1
+            request_time = perf_counter() - start
+
+            # Operations committed one after the other
+            committed = 0
+            start = perf_counter()
+            for index in range(operations):
+                communication.send(MessageComposer.compose_client_invoke(
+                    MessageComposer.compose_operation("key" + str(index), index), (CLUSTER_CLIENT_PID, index)),
+                    randint(1, n_replicas))
+                committed += receive_output(communication, MsgType.COMMIT.value) is not None
+            operation_time = perf_counter() - start
+    finally:
+        stop_cluster(communication, replicas)
+
+    return answered, answered / request_time, committed, committed / operation_time
+
+
+def measure_concurrent_operations(n_replicas: int, operations: int, keys: int, **settings) -> tuple:
+    """
+    Measure the rate of the operations committed by a local cluster when a client invokes them all at once, spread
+    over the replicas but the leader.
+
+    Parameters:
+        n_replicas: number of replicas
+        operations: number of operations invoked
+        keys: number of keys written by the operations
+        settings: environment variables added to the configuration of each replica
+
+    Returns:
+        tuple (committed, committed per second)
+    """
+
+    replicas = start_cluster(n_replicas, "threads", **settings)
+    communication = cluster_client(n_replicas)
+
+    try:
+        with redirect_stdout(io.StringIO()):
+            prepare_cluster(communication, n_replicas)
+
+            committed = 0
+            start = end = perf_counter()
+            for index in range(operations):
+                communication.send(MessageComposer.compose_client_invoke(
+                    MessageComposer.compose_operation("key" + str(index % keys), index), (CLUSTER_CLIENT_PID, index)),
+                    2 + index % (n_replicas - 1))
+            while committed < operations and receive_output(communication, MsgType.COMMIT.value) is not None:
+                committed += 1
+                end = perf_counter()
+    finally:
+        stop_cluster(communication, replicas)
+
+    return committed, committed / (end - start)
+
+
+def prepare_cluster(communication: Communication, n_replicas: int) -> None:
+    """
+    Wait until the replicas of a local cluster answer, then register the client and disable the simulated execution
+    time.
+
+    Parameters:
+        communication: communication of the client
+        n_replicas: number of replicas
+    """
+
+    for _ in range(int(60 / CLUSTER_TIMEOUT)):
+        communication.send(MessageComposer.compose_request_value("key"), n_replicas)
+        if receive_output(communication, MsgType.REQUEST_VALUE.value) is not None:
+            break
+    for _ in range(2):
+        communication.broadcast(MessageComposer.compose_start())
+    communication.broadcast(MessageComposer.compose_debug((MsgKey.DEBUG_EX_TIME.value, (10, 10, 0))))
+    sleep(0.5)
+
+
+def stop_cluster(communication: Communication, replicas: list) -> None:
+    """
+    Close the replicas of a local cluster and the communication of the client.
+
+    Parameters:
+        communication: communication of the client
+        replicas: python processes of the replicas
+    """
+
+    communication.broadcast(MessageComposer.compose_close())
+    communication.close()
+    for replica in replicas:
+        try:
+            replica.wait(CLUSTER_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            replica.kill()
+
+
+def benchmark_cluster(requests: int = 2000, window: int = 50, operations: int = 50) -> None:
+    """
+    Compare the runtimes of the replicas on a local cluster: the rate of REQUEST_VALUE messages a replica answers,
+    and the rate and latency of the operations committed one after the other by a client.
+
+    Parameters:
+        requests: number of REQUEST_VALUE messages sent to a replica
+        window: max number of REQUEST_VALUE messages waiting for an answer
+        operations: number of operations committed
+    """
+
+    print(f"{'runtime':<10}{'settings':<20}{'replicas':>10}{'answered':>10}{'msg/s':>10}{'committed':>11}{'ops/s':>8}"
+          f"{'latency (ms)':>14}")
+
+    for runtime, n_replicas, settings in (("threads", N_REPLICAS, {}), ("threads", N_REPLICAS, {"DECODE_WORKERS": "4"}),
+                                          ("threads", N_REPLICAS, {"RECEIVE_SOCKETS": "4"}),
+                                          ("asyncio", N_REPLICAS, {}), ("hosted", N_REPLICAS, {}), ("hosted", 16, {})):
+        answered, answer_rate, committed, commit_rate = measure_cluster(n_replicas, runtime, requests, window,
+                                                                        operations, **settings)
+        description = ",".join(f"{name}={value}" for name, value in settings.items())
+        print(f"{runtime:<10}{description:<20}{n_replicas:>10}{answered:>10}{answer_rate:>10.0f}{committed:>11}"
+              f"{commit_rate:>8.1f}{1000 / commit_rate if commit_rate else 0:>14.1f}")
+
+
+def benchmark_batching(requests: int = 2000, window: int = 50, operations: int = 50) -> None:
+    """
+    Measure the latency and throughput trade-off of the batching of the messages sent to the same peer, on a local
+    cluster, for increasing batch windows.
+
+    Parameters:
+        requests: number of REQUEST_VALUE messages sent to a replica
+        window: max number of REQUEST_VALUE messages waiting for an answer
+        operations: number of operations committed
+    """
+
+    print(f"{'window (ms)':>12}{'budget (B)':>12}{'answered':>10}{'msg/s':>10}{'committed':>11}{'ops/s':>8}"
+          f"{'latency (ms)':>14}")
+
+    for batch_window, batch_bytes in ((0, 0), (0, 1400), (0.5, 1400), (2, 1400), (5, 1400), (5, 8000)):
+        answered, answer_rate, committed, commit_rate = measure_cluster(
+            N_REPLICAS, "threads", requests, window, operations, SEND_BATCH_WINDOW=str(batch_window / 1000),
+            SEND_BATCH_BYTES=str(batch_bytes))
+        print(f"{batch_window:>12}{batch_bytes:>12}{answered:>10}{answer_rate:>10.0f}{committed:>11}"
+              f"{commit_rate:>8.1f}{1000 / commit_rate if commit_rate else 0:>14.1f}")
+
+
+def benchmark_sieve_batches(operations: int = 300, keys: int = 20) -> None:
+    """
+    Measure the throughput of the operations committed by a local cluster for increasing sizes of the batches of
+    operations executed by an EXECUTE, with and without linger time and pipelined rounds. The leader buffers an
+    operation for each replica, so a batch holds at most an operation for each replica.
+
+    Parameters:
+        operations: number of operations invoked at once
+        keys: number of keys written by the operations
+    """
+
+    print(f"{'batch':>6}{'linger (ms)':>13}{'window':>8}{'committed':>11}{'ops/s':>8}")
+
+    for batch_size, linger, window in ((1, 0, 1), (2, 0, 1), (4, 0, 1), (6, 0, 1), (6, 2, 1), (6, 0, 4), (1, 0, 4)):
+        committed, commit_rate = measure_concurrent_operations(
+            N_REPLICAS, operations, keys, BATCH_SIZE=str(batch_size), BATCH_LINGER=str(linger / 1000),
+            PIPELINE_WINDOW=str(window))
+        print(f"{batch_size:>6}{linger:>13}{window:>8}{committed:>11}{commit_rate:>8.1f}")
+
+
+def benchmark_op_queue(iterations: int = 2000) -> None:
+    """
+    Measure the operations done on the queue of the pending operations on every invocation and commit, for the
+    indexed queue and for the list that backed it before, with increasing numbers of pending operations.
+
+    Parameters:
+        iterations: number of executions for each measure
+    """
+
+    print(f"{'pending':>10}{'queue':>8}{'presence (us)':>15}{'remove (us)':>13}{'pop (us)':>10}{'count (us)':>12}")
+
+    for pending in (10000, 100000):
+        operations = [("key" + str(value), value) for value in range(pending)]
+        middle = operations[pending // 2]
+
+        op_ids = [(1000 + value % 100, value) for value in range(pending)]
+        middle_id = op_ids[pending // 2]
+
+        queue = OpQueue()
+        for op_id in op_ids:
+            queue.add(op_id)
+
+        def remove_indexed():
+            queue.remove(middle_id)
+            queue.add(middle_id)
+
+        def pop_indexed():
+            queue.add(queue.pop_left())
+
+        indexed = (measure(lambda: queue.check_presence(middle_id), iterations), measure(remove_indexed, iterations),
+                   measure(pop_indexed, iterations), measure(lambda: queue.count_client(1000), iterations))
+
+        # The list backed queue scans the operations and the clients of the whole queue
+        pending_list = list(operations)
+        clients = dict((operation, 1000 + value % 100) for value, operation in enumerate(operations))
+
+        def remove_listed():
+            pending_list.remove(middle)
+            pending_list.append(middle)
+
+        def pop_listed():
+            pending_list.append(pending_list.pop(0))
+
+        listed = (measure(lambda: middle in pending_list, iterations), measure(remove_listed, iterations),
+                  measure(pop_listed, iterations),
+                  measure(lambda: sum(1 for client_id in clients.values() if client_id == 1000), iterations))
+
+        for name, times in (("indexed", indexed), ("list", listed)):
+            print(f"{pending:>10}{name:>8}{times[0]:>15.2f}{times[1]:>13.2f}{times[2]:>10.2f}{times[3]:>12.2f}")
+
+
+def parse_or_none(plaintext: bytes) -> object:
+    """
+    Parse the plaintext as json.
+
+    Parameters:
+        plaintext: data to parse
+
+    Returns:
+        the parsed data, or None if the data is not valid
+    """
+
+    try:
+        return json.loads(plaintext)
+    except (TypeError, ValueError):
+        return None
+
+
+BENCHMARKS = {
+    "cipher": benchmark_cipher_modes,
+    "codec": benchmark_wire_formats,
+    "message": benchmark_message_allocation,
+    "broadcast": benchmark_broadcast,
+    "compression": benchmark_compression,
+    "receive": benchmark_receive,
+    "cluster": benchmark_cluster,
+    "batching": benchmark_batching,
+    "sieve_batches": benchmark_sieve_batches,
+    "op_queue": benchmark_op_queue
+}
+
+if __name__ == "__main__":
+    # The command line arguments are reserved to the client configuration, select the benchmarks with BENCHMARK=a,b
+    names = os.environ["BENCHMARK"].split(",") if "BENCHMARK" in os.environ else BENCHMARKS.keys()
+    for benchmark_name in names:
+        print(f"\n### {benchmark_name}")
+        BENCHMARKS[benchmark_name]()
@@ -2,13 +2,14 @@
 
 from threading import Thread
 from random import randint
-from utils.communication import Communication
-from gui.client_config import HOST_MAP, PORT_MAP, CLIENT_PID, CRYPTO_KEYS, BUFFER_SIZE, N_PROCESSES, CLIENT_SOCKET
+from utils.codec import WireFormat
+from utils.communication import Communication, CipherMode
+from gui.client_config import HOST_MAP, PORT_MAP, CLIENT_PID, CRYPTO_KEYS, BUFFER_SIZE, N_PROCESSES, CLIENT_SOCKET, \
+    CIPHER_MODE, WIRE_FORMAT
 from utils.utils import State
 from utils.msg import MessageComposer, Message
 from utils.msg_variables import MsgType
 from gui.gui import Gui
-from time import sleep
 
 
 class Client:
@@ -29,10 +30,12 @@ class Client:
             HOST_MAP[str(pid)] = CLIENT_SOCKET[0]
             PORT_MAP[str(pid)] = CLIENT_SOCKET[1]
 
-        self.communication = Communication(HOST_MAP, PORT_MAP, CRYPTO_KEYS, pid, BUFFER_SIZE, port)
+        self.communication = Communication(HOST_MAP, PORT_MAP, CRYPTO_KEYS, pid, BUFFER_SIZE, port,
+                                           CipherMode(CIPHER_MODE), WireFormat(WIRE_FORMAT))
         self.gui = None
         self.s = State.RUNNING
         self.history = None
+        self.sequence = 0  # sequence number of the last operation invoked
 
     def run_listener(self) -> None:
         """
@@ -48,8 +51,6 @@ class Client:
             except Exception as e:
                 print(f"Error in message type: {e}")
 
-            sleep(0.01)
-
     def __route(self, message: Message, sender_id: int) -> None:
         """
         Route the message to the right handler.
@@ -92,7 +93,7 @@ class Client:
         """
 
         if self.gui:
-            self.gui.show_operation_not_queued()
+            self.gui.show_operation_not_queued(message.retry_after)
         else:
             print(f"Received operation not queued message: {message}")
 
@@ -214,7 +215,8 @@ class Client:
 
     def build_invoke(self, key: object, value: object) -> Message:
         """
-        Build the invoke message.
+        Build the invoke message, numbering the operation. The replicas identify the operation by the client id and
+        this sequence number, and refer to it in the outputs.
 
         Parameters:
             key: key of the operation
@@ -225,8 +227,9 @@ class Client:
         """
 
         operation = MessageComposer.compose_operation(key, value)
+        self.sequence += 1
 
-        return MessageComposer.compose_client_invoke(operation)
+        return MessageComposer.compose_client_invoke(operation, (self.communication.pid, self.sequence))
 
     def request_value(self, key: object) -> None:
         """
@@ -0,0 +1,53 @@
+#!/bin/bash
+
+import asyncio
+import os
+
+# The environment describes the first replica, the other replicas hosted by this program are configured in the same way
+os.environ.setdefault("N_PROCESSES", "7")
+os.environ.setdefault("PROCESS_ID", "1")
+os.environ.setdefault("BUFFER_SIZE", "8192")
+os.environ.setdefault("FAULTY", "0")
+os.environ.setdefault("PROCESS_HOST", "127.0.0.1")
+
+
+def pair_key(pid: int, other: int) -> str:
+    """
+    Get the crypto key shared by two replicas, following the convention of the docker compose file.
+
+    Parameters:
+        pid: id of a replica
+        other: id of the other replica
+
+    Returns:
+        the crypto key
+    """
+
+    return str(min(pid, other)) + str(max(pid, other))
+
+
+for i in range(2, int(os.environ["N_PROCESSES"]) + 1):
+    os.environ.setdefault("KEY" + str(i), pair_key(1, i))
+
+from process import Process
+from rsm.env_config import N_PROCESSES, HOST_MAP, PORT_MAP, FAULTY, CIPHER_MODE
+from utils.communication import CipherMode, KeyManager, WireCipher
+
+
+async def run_cluster() -> None:
+    """
+    Run all the replicas of the cluster in the same asyncio event loop. The replicas share the cache of the derived
+    keys, so each pairwise key is derived once.
+    """
+
+    key_manager = KeyManager(key_length=WireCipher(CipherMode(CIPHER_MODE)).key_length)
+    processes = []
+    for pid in range(1, N_PROCESSES + 1):
+        keys = dict((str(other), pair_key(pid, other)) for other in range(1, N_PROCESSES + 1) if other != pid)
+        processes.append(Process(pid, dict(HOST_MAP), dict(PORT_MAP), keys, FAULTY, key_manager))
+
+    await asyncio.gather(*(process.run_async() for process in processes))
+
+
+if __name__ == "__main__":
+    asyncio.run(run_cluster())
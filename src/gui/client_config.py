@@ -1,5 +1,6 @@
 #!/bin/bash
 
+import os
 import sys
 
 # Global variables
@@ -7,6 +8,10 @@ CLIENT_PID = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
 CLIENT_SOCKET = ("127.0.0.1", 8000 + CLIENT_PID)
 N_PROCESSES = int(sys.argv[1]) if len(sys.argv) > 2 else 7
 BUFFER_SIZE = int(sys.argv[2]) if len(sys.argv) > 3 else 8192
+CIPHER_MODE = os.environ.get("CIPHER_MODE", "cbc")  # must match the cipher mode of the processes
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT", "json")  # json or binary
+PROCESS_HOST = os.environ.get("PROCESS_HOST", "process{}")  # host of the processes, {} is replaced by the process id
+CLIENT_BASE_PORT = int(os.environ.get("CLIENT_BASE_PORT", "0"))  # must match the client base port of the processes
 CRYPTO_KEYS = {}  # {process_id: key}
 HOST_MAP = {}  # {process_id: host}
 PORT_MAP = {}  # {process_id: port}
@@ -16,8 +21,8 @@ for i in range(1, N_PROCESSES + 1):
     CRYPTO_KEYS[str(i)] = str(i)
 
     # Set port values
-    PORT_MAP[str(i)] = 8000 + i
-    HOST_MAP[str(i)] = "process" + str(i)
+    PORT_MAP[str(i)] = (CLIENT_BASE_PORT or 8000) + i
+    HOST_MAP[str(i)] = PROCESS_HOST.format(i)
 
 PORT_MAP[str(CLIENT_PID)] = CLIENT_SOCKET[1]
 HOST_MAP[str(CLIENT_PID)] = CLIENT_SOCKET[0]
@@ -334,11 +334,15 @@ class Gui:
             timestamp = datetime.now().strftime('%H:%M:%S')
             self.window[LOG_KEY].update(f"{timestamp} > SV: close received.\n", append=True)
 
-    def show_operation_not_queued(self) -> None:
+    def show_operation_not_queued(self, retry_after: float = None) -> None:
         """
         Show the operation not queued message in the log.
+
+        Parameters:
+            retry_after: seconds to wait before invoking the operation again, None if the replica gave no hint
         """
 
         if self.window is not None:
             timestamp = datetime.now().strftime('%H:%M:%S')
-            self.window[LOG_KEY].update(f"{timestamp} > SV: operation not queued.\n", append=True)
+            hint = "" if retry_after is None else f", retry in {retry_after:.1f}s"
+            self.window[LOG_KEY].update(f"{timestamp} > SV: operation not queued{hint}.\n", append=True)
@@ -1,16 +1,22 @@
 #!/bin/bash
 
+import asyncio
 from threading import Thread
 
 from process import Process
+from rsm.env_config import RUNTIME
 
 
 def main():
     """
-    Start the process and the listener threads for the docker container.
+    Start the process and the listener threads for the docker container, or the asyncio event loop running both.
     """
     p = Process()
 
+    if RUNTIME == "asyncio":
+        asyncio.run(p.run_async())
+        return
+
     threads = []
 
     execution_thread = Thread(target=p.run, daemon=False)
@@ -19,9 +25,6 @@ def main():
     listening_thread = Thread(target=p.run_listener, daemon=False)
     threads.append(listening_thread)
 
-    age_thread = Thread(target=p.run_check_age, daemon=False)
-    threads.append(age_thread)
-
     for t in threads:
         t.start()
 
@@ -1,19 +1,33 @@
 #!/bin/bash
 
+import asyncio
 from random import randint
-from time import sleep, time
-from queue import Queue
-
-from rsm.env_config import HOST_MAP, PORT_MAP, CRYPTO_KEYS, PROCESS_ID, BUFFER_SIZE, N_FAULTY_PROCESSES, FAULTY
-from utils.communication import Communication
+from socket import socket
+from threading import Lock, Thread
+from time import sleep, time, monotonic
+from queue import Empty
+
+from rsm.env_config import HOST_MAP, PORT_MAP, CLIENT_PORT_MAP, CRYPTO_KEYS, PROCESS_ID, BUFFER_SIZE, \
+    N_FAULTY_PROCESSES, FAULTY, CIPHER_MODE, WIRE_FORMAT, GROUP_KEY, COMPRESSION_THRESHOLD, MAX_CLIENTS, \
+    CLIENT_IDLE_TIMEOUT, DECODE_WORKERS, RECEIVE_SOCKETS, SOCKET_RCVBUF, SOCKET_SNDBUF, SEND_WORKERS, \
+    SEND_QUEUE_DEPTH, SEND_BATCH_WINDOW, SEND_BATCH_BYTES, LANE_BURST, INBOX_DEPTH, CONSENSUS_DEPTH, MAX_PENDING_OPS, \
+    MAX_CLIENT_PENDING_OPS, PIPELINE_WINDOW, BATCH_SIZE, BATCH_LINGER
+from utils.codec import WireFormat
+from utils.communication import Communication, CipherMode, KeyManager
 from utils.msg import MessageComposer, Message
+from utils.inbox import PriorityInbox
 from utils.msg_variables import MsgType
-from utils.utils import OpQueue, State, signp, check_approve, check_validation_confirm, check_validation_abort, \
-    remove_unwanted_messages, dict_to_list, compute_correct_rs
+from utils.pipeline import ReceivePipeline
+from utils.slots import Slot, SlotWindow
+from utils.timers import TimerHeap
+from utils.utils import OpQueue, State, verifyp, check_approve, check_approve_batch, check_validation_confirm, \
+    check_validation_abort, check_validation_batch, compute_correct_rs
 
 COMPLAIN_THRESHOLD = 7  # threshold for the complain message
 OP_MAX_AGE = 4  # max age of an operation in seconds
 NEW_SIEVE_CONFIG_THRESHOLD = 3  # threshold for the new sieve config start
+INVOKE_RETRY_INTERVAL = 0.1  # seconds between the invocations of the queued operations on the leader
+RETRY_AFTER = 0.5  # min seconds a client is asked to wait before invoking again a rejected operation
 
 
 class Process:
@@ -21,50 +35,83 @@ class Process:
     Class representing a process.
 
     Attributes:
+        pid (int): process id
         communication (Communication): communication object
         I (OpQueue): queue of all operations invoked
         config (int): sieve-config number (actual turn)
         next_epoch (int): next config
         s (State): actual state
-        t (State): speculative state
         B (dict): leader's buffer
         buffer_queue (list): buffer for FIFO execution of the operations in leader's buffer
-        clients_ids (dict): ids of the clients that invoked operations
+        requests (dict): request table, with the (client id, sequence number) id of the operations in progress as key
+            and the operation as value
         leader (int): leader's process id
         next_leader (int): next leaders process id
-        cur (list): current operation
-        cur_pid (int): current operation process id invoker
-        r (list): speculative response (in this case is equal to the operation)
-        msg_buffer (dict): buffer for approve, validation and new sieve config messages received
+        slots (SlotWindow): operations in progress, each one with its speculative state and response, committed in
+            the order given by the leader
+        next_slot (int): number of the next slot opened by the leader
+        msg_buffer (dict): buffer for new sieve config messages received
         dictionary (dict): shared dictionary between processes
-        last_order (Message): last order received
         faulty (int): indicates if the process is faulty for simulation
         ex_time (tuple): debug option for execution time simulation
-        new_sieve_config_start (float): time of the start of the new sieve config
+        new_sieve_config_start (float): monotonic time of the start of the new sieve config
+        execution_deadline (float): monotonic time at which the leader ends the execution of the last slot opened
+        batch_deadline (float): monotonic time at which the leader executes the buffered operations even if they
+            don't fill a batch
+        timers (TimerHeap): timers of the operations age, of the invocations retry, of the new sieve config retry, of
+            the execution of the last slot opened and of the batch linger
+        expired (dict): ids of the operations past their max age, as keys in the order they expired, handled once the
+            process executes an operation
+        rejected (dict): counters of the client operations rejected by the admission control, by reason
     """
 
-    def __init__(self):
-        self.communication = Communication(HOST_MAP, PORT_MAP, CRYPTO_KEYS, PROCESS_ID, BUFFER_SIZE)
-        self.receive_buffer = Queue()  # buffer for the received messages to be processed
+    def __init__(self, pid: int = PROCESS_ID, hosts: dict = None, ports: dict = None, keys: dict = None,
+                 faulty: int = FAULTY, key_manager: KeyManager = None, client_port: int = None):
+        """
+        Initialize the process, by default with the configuration given by the environment.
+
+        Parameters:
+            pid: process id
+            hosts: dictionary that contains the process id as key and the host as value
+            ports: dictionary that contains the process id as key and the port as value
+            keys: dictionary that contains the process id as key and the crypto key as value
+            faulty: indicates if the process is faulty for simulation
+            key_manager: cache of the derived keys, it can be shared by the processes hosted by the same program
+            client_port: port the clients are received on, by default the one given by the environment
+        """
+        self.pid = pid  # process id
+        self.communication = Communication(HOST_MAP if hosts is None else hosts, PORT_MAP if ports is None else ports,
+                                           CRYPTO_KEYS if keys is None else keys, pid, BUFFER_SIZE,
+                                           cipher_mode=CipherMode(CIPHER_MODE), wire_format=WireFormat(WIRE_FORMAT),
+                                           group_key=GROUP_KEY, compression_threshold=COMPRESSION_THRESHOLD,
+                                           max_clients=MAX_CLIENTS, client_idle_timeout=CLIENT_IDLE_TIMEOUT,
+                                           key_manager=key_manager, receive_sockets=RECEIVE_SOCKETS,
+                                           receive_buffer_bytes=SOCKET_RCVBUF, send_buffer_bytes=SOCKET_SNDBUF,
+                                           client_port=CLIENT_PORT_MAP.get(str(pid)) if client_port is None
+                                           else client_port)
+        self.receive_buffer = PriorityInbox(LANE_BURST, INBOX_DEPTH, CONSENSUS_DEPTH)  # received messages, by priority
         self.I = OpQueue()  # queue of all operations invoked
         self.config = 0  # sieve-config number (actual turn)
         self.next_epoch = None  # next config
         self.s = State.S0  # actual state
-        self.t = None  # speculative state
         self.B = {}  # leader's buffer
         self.buffer_queue = []  # buffer for FIFO execution of the operations in leader's buffer
-        self.clients_ids = {}  # ids of the clients that invoked operations
+        self.requests = {}  # operations in progress by id
         self.leader = 1  # leader"s process id (default 1)
         self.next_leader = None  # next leaders process id
-        self.cur = None  # current operation
-        self.cur_pid = None  # current operation process id invoker
-        self.r = None  # speculative response (in this case is equal to the operation)
-        self.msg_buffer = {}  # buffer for approve, validation and new sieve config messages received
+        self.slots = SlotWindow(PIPELINE_WINDOW)  # operations in progress, committed in order
+        self.next_slot = 0  # number of the next slot opened by the leader
+        self.msg_buffer = {}  # buffer for new sieve config messages received
         self.dictionary = {}  # shared dictionary
-        self.last_order = None  # last order received
-        self.faulty = FAULTY  # indicates if the process is faulty for simulation
+        self.faulty = faulty  # indicates if the process is faulty for simulation
         self.ex_time = (1, 100, 20)  # debug option for execution time simulation
-        self.new_sieve_config_start = None  # time of the start of the new sieve config
+        self.new_sieve_config_start = None  # monotonic time of the start of the new sieve config
+        self.execution_deadline = None  # monotonic time at which the leader ends the execution of the last slot
+        self.batch_deadline = None  # monotonic time at which the leader stops waiting to fill a batch
+        self.timers = TimerHeap()  # timers of the process, ordered by deadline
+        self.expired = {}  # operations past their max age, handled once the process executes an operation
+        self.rejected = {"inbox_full": 0, "replica_pending": 0, "client_pending": 0, "leader_busy": 0}
+        self.rejected_lock = Lock()
 
     ##########################################
     #   Thread functions
@@ -72,64 +119,274 @@ class Process:
 
     def run(self) -> None:
         """
-        Run the process.
+        Run the process. The thread waits for the next message or for the next timer that is due, then handles all
+        the messages that are ready. If the send workers are set, the messages are only queued by the thread, and
+        packed in batches if the batch budget is set.
         """
+
+        if SEND_WORKERS:
+            self.communication.start_senders(SEND_WORKERS, SEND_QUEUE_DEPTH, SEND_BATCH_WINDOW, SEND_BATCH_BYTES)
+
         while self.s != State.CLOSING:
+            timeout = self.__next_timeout()
 
-            if not self.receive_buffer.empty():
-                message, sender_id = self.receive_buffer.get()
-                try:
-                    self.__route(message, int(sender_id))
-                except TypeError as e:
-                    pass
-                except Exception as e:
-                    print(f"Error in message type: {e}")
-                self.receive_buffer.task_done()
+            if self.execution_deadline is None:
+                self.__handle_messages(timeout)
+            elif timeout:
+                # The leader executing an operation doesn't handle messages until the execution ends
+                sleep(timeout)
 
-            if self.s == State.S0:
-                if self.B:
-                    self.__request_execution(self.buffer_queue.pop(0))
+            self.__wake_up()
+
+        self.close()
+
+    def run_listener(self) -> None:
+        """
+        Run the listener, with a thread for each socket of the communication, the client sockets included. If the
+        decode workers are set, the datagrams are decrypted and decoded by a pool of threads and handed off in the
+        order they were received.
+        """
+
+        if DECODE_WORKERS:
+            pipeline = ReceivePipeline(self.communication, self.__queue, DECODE_WORKERS)
+            pipeline.run()
+            return
+
+        listeners = [Thread(target=self.__listen, args=(sock,), daemon=True)
+                     for sock in self.communication.sockets[1:] + self.communication.client_sockets]
+        for listener in listeners:
+            listener.start()
+
+        self.__listen(self.communication.socket)
+
+        for listener in listeners:
+            listener.join()
+
+    def __listen(self, sock: socket) -> None:
+        """
+        Receive the messages from a socket and put them in the receive buffer.
+
+        Parameters:
+            sock: socket to receive from
+        """
+
+        while self.s != State.CLOSING:
+            message, sender_id = self.communication.receive(sock)
+            if message is not None:
+                self.__queue(message, sender_id)
+
+    async def run_async(self) -> None:
+        """
+        Run the process and its listener in the asyncio event loop, in place of the run and run_listener threads.
+        The loop can run many processes, each one waiting for its messages and its timers without blocking the others.
+        """
+
+        arrived = asyncio.Event()
+
+        def on_message(message: Message, sender_id: str) -> None:
+            self.__queue(message, sender_id)
+            arrived.set()
+
+        await self.communication.start_async(on_message)
+
+        while self.s != State.CLOSING:
+            timeout = self.__next_timeout()
+
+            if self.execution_deadline is None:
+                await self.__handle_messages_async(arrived, timeout)
+            elif timeout:
+                await asyncio.sleep(timeout)
+
+            self.__wake_up()
+
+        self.close()
+
+    def __queue(self, message: Message, sender_id: str) -> None:
+        """
+        Put a received message in the receive buffer. If the lane of the message is full, the message is dropped and,
+        if it is an operation invoked by a client, the client is told to invoke it again later.
+
+        Parameters:
+            message: message received
+            sender_id: id of the process that sent the message
+        """
+
+        if self.receive_buffer.put((message, sender_id)):
+            return
+
+        if message.type == MsgType.CLIENT_INVOKE.value:
+            sequence = message.op_id[1] if message.op_id else None
+            self.__reject(message.o, (int(sender_id), sequence), "inbox_full", RETRY_AFTER)
+
+    def __wake_up(self) -> None:
+        """
+        Run the timers that are due, apply the state transitions and arm the retry of the invocations if the process
+        waits for the leader.
+        """
+
+        self.__run_timers()
+        self.__advance()
+
+        # The operations are invoked again on the leader while the process can take part in another slot
+        if (not self.slots.is_full() and self.leader != self.pid and self.s != State.ABORT and not self.I.is_empty()
+                and "invoke" not in self.timers):
+            self.timers.arm("invoke", monotonic() + INVOKE_RETRY_INTERVAL, self.__invoke_operations)
+
+    def __handle(self, message: Message, sender_id: str) -> None:
+        """
+        Handle a message and apply the state transitions it enables.
+
+        Parameters:
+            message: message received
+            sender_id: id of the process that sent the message
+        """
+
+        try:
+            self.__route(message, int(sender_id))
+        except TypeError as e:
+            pass
+        except Exception as e:
+            print(f"Error in message type: {e}")
+        self.__advance()
+
+    def __handle_messages(self, timeout: float) -> None:
+        """
+        Wait for a message and handle it together with all the messages already received.
+
+        Parameters:
+            timeout: max seconds to wait for the first message, None to wait forever
+        """
 
-            if self.s == State.ELABORATION:
-                self.t, self.r = self.__execute_operation(self.ex_time)
-                if self.t is not None:
-                    self.s = self.t
+        try:
+            message, sender_id = self.receive_buffer.get(timeout=timeout)
+        except Empty:
+            return
+
+        while True:
+            self.__handle(message, sender_id)
+
+            if self.s == State.CLOSING or self.execution_deadline is not None:
+                return
+            try:
+                message, sender_id = self.receive_buffer.get_nowait()
+            except Empty:
+                return
+
+    async def __handle_messages_async(self, arrived: asyncio.Event, timeout: float) -> None:
+        """
+        Wait for a message and handle it together with all the messages already received, letting the other
+        coroutines of the event loop run between two messages.
+
+        Parameters:
+            arrived: event set when a message is put in the receive buffer
+            timeout: max seconds to wait for the first message, None to wait forever
+        """
+
+        if self.receive_buffer.empty():
+            try:
+                await asyncio.wait_for(arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+        arrived.clear()
+
+        while True:
+            try:
+                message, sender_id = self.receive_buffer.get_nowait()
+            except Empty:
+                return
+
+            self.__handle(message, sender_id)
+            await asyncio.sleep(0)
+
+            if self.s == State.CLOSING or self.execution_deadline is not None:
+                return
+
+    def __advance(self) -> None:
+        """
+        Apply the state transitions that don't need a message, until the state doesn't change. The leader opens a slot
+        for each batch of buffered operations while the window has room, executing them one at a time.
+        """
+
+        while True:
+            state, queued, executing = self.s, len(self.buffer_queue), self.__executing()
+
+            if self.s == State.S0:
+                if self.B and self.buffer_queue and not self.slots.is_full() and executing is None and \
+                        self.__batch_ready():
+                    pids = self.buffer_queue[:max(1, BATCH_SIZE)]
+                    del self.buffer_queue[:len(pids)]
+                    self.__request_execution(pids)
+
+            if self.__executing() is not None:
+                if self.execution_deadline is not None:
+                    return
+                execution_time = self.__execution_time(self.ex_time)
+                if execution_time:
+                    self.execution_deadline = monotonic() + execution_time
+                    self.timers.arm("execution", self.execution_deadline, self.__end_execution)
+                    return
+                self.__end_execution()
 
             if self.s == State.NEW_CONFIG:
-                if self.new_sieve_config_start is not None and time() > self.new_sieve_config_start + NEW_SIEVE_CONFIG_THRESHOLD:
+                deadline = None if self.new_sieve_config_start is None else (
+                        self.new_sieve_config_start + NEW_SIEVE_CONFIG_THRESHOLD)
+                if deadline is not None and monotonic() >= deadline:
                     self.new_sieve_config_start = None
                     self.msg_buffer = {}
                 if self.new_sieve_config_start is None:
                     self.__choose_new_leader()
-                    self.new_sieve_config_start = time()
+                    self.new_sieve_config_start = monotonic()
+                    # The timer only wakes the process up, the retry is started here if it is still needed
+                    self.timers.arm("new_sieve_config", self.new_sieve_config_start + NEW_SIEVE_CONFIG_THRESHOLD)
                     self.__start_new_sieve_config(self.next_epoch, self.next_leader, True)
 
-            sleep(0.01)
+            if self.s == state and len(self.buffer_queue) == queued and self.__executing() is executing:
+                return
 
-        self.close()
+    def __batch_ready(self) -> bool:
+        """
+        Check if the leader can execute the buffered operations: they fill a batch, or the leader waited the linger
+        time for them to fill it.
 
-    def run_listener(self) -> None:
+        Returns:
+            True if the operations can be executed, False if the leader waits for more operations
         """
-        Run the listener.
+
+        if len(self.buffer_queue) < BATCH_SIZE and BATCH_LINGER:
+            if self.batch_deadline is None:
+                self.batch_deadline = monotonic() + BATCH_LINGER
+                # The timer only wakes the process up, the batch is executed here once it is due
+                self.timers.arm("batch", self.batch_deadline)
+            if monotonic() < self.batch_deadline:
+                return False
+
+        self.batch_deadline = None
+        self.timers.cancel("batch")
+        return True
+
+    def __next_timeout(self) -> float:
         """
+        Get the seconds until the next timer is due.
 
-        while self.s != State.CLOSING:
-            message, sender_id = self.communication.receive()
-            if message is not None:
-                self.receive_buffer.put((message, sender_id))
+        Returns:
+            the seconds until the next timer, None if no timer is set
+        """
 
-            sleep(0.01)
+        deadlines = [self.timers.next_deadline(), self.communication.peers.clients.next_expiry()]
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        return max(0.0, min(deadlines) - monotonic()) if deadlines else None
 
-    def run_check_age(self) -> None:
+    def __run_timers(self) -> None:
         """
-        Check the age of the operations.
+        Run the timers that are due.
         """
 
-        while self.s != State.CLOSING:
-            if self.leader != PROCESS_ID and self.s != State.ABORT:
-                self.__check_operations_age()
+        self.timers.run()
+        self.__handle_expired_operations()
 
-            sleep(0.1)
+        client_expiry = self.communication.peers.clients.next_expiry()
+        if client_expiry is not None and monotonic() >= client_expiry:
+            self.communication.peers.clients.expire()
 
     def __route(self, message: Message, sender_id: int) -> None:
         """
@@ -141,17 +398,20 @@ class Process:
         """
 
         msg_type = message.type
+        if message.op_id is not None:
+            message.op_id = tuple(message.op_id)  # the operation ids are compared and used as keys as tuples
 
         match msg_type:
             case MsgType.CLIENT_INVOKE.value:
-                self.__rsm_execute(message.o, sender_id)
+                self.__rsm_execute(message.o, self.__client_op_id(message, sender_id))
             case MsgType.INVOKE.value:
                 self.__receive_invoke(message, sender_id)
             case MsgType.EXECUTE.value:
                 self.__receive_execute(message, sender_id)
             case MsgType.APPROVE.value:
-                if self.s == State.WAITING_APPROVAL and self.leader == PROCESS_ID:
-                    self.__receive_approve(message, sender_id)
+                slot = self.slots.get(message.op_id)
+                if slot is not None and slot.s == State.WAITING_APPROVAL and self.leader == self.pid:
+                    self.__receive_approve(slot, message, sender_id)
             case MsgType.COMPLAIN.value:
                 self.__receive_complain(message)
             case MsgType.NEW_SIEVE_CONFIG.value:
@@ -159,12 +419,13 @@ class Process:
             case MsgType.ORDER.value:
                 self.__receive_order(message)
             case MsgType.VALIDATION.value:
-                if self.s == State.WAITING_VALIDATION:
-                    self.__receive_validation(message, sender_id)
+                slot = self.slots.get(message.op_id)
+                if slot is not None and slot.s == State.WAITING_VALIDATION:
+                    self.__receive_validation(slot, message, sender_id)
             case MsgType.COMMIT.value:
-                self.__receive_commit()
+                self.__receive_commit(message)
             case MsgType.ABORT.value:
-                self.__receive_abort()
+                self.__receive_abort(message)
             case MsgType.CLOSE.value:
                 self.s = State.CLOSING
             case MsgType.REQUEST_VALUE.value:
@@ -176,23 +437,95 @@ class Process:
             case _:
                 raise Exception("Unknown message type:", msg_type)
 
-    def __check_operations_age(self) -> None:
+    @staticmethod
+    def __client_op_id(message: Message, client_id: int) -> tuple:
+        """
+        Get the id of an operation invoked by a client. The client numbers its operations, the client id is the one the
+        replica knows the client by, so a client can't use the ids of another one.
+
+        Parameters:
+            message: CLIENT_INVOKE message received
+            client_id: id of the client that sent the message
+
+        Returns:
+            the (client id, sequence number) of the operation
+
+        Raises:
+            ValueError: if the client didn't number the operation
+        """
+
+        if not message.op_id or len(message.op_id) != 2 or not isinstance(message.op_id[1], int):
+            raise ValueError(f"Operation {message.o} invoked by {client_id} without sequence number")
+        return client_id, message.op_id[1]
+
+    def __arm_age(self, op_id: tuple, deadline: float) -> None:
+        """
+        Arm the timer of the max age of an operation.
+
+        Parameters:
+            op_id: id of the operation queued
+            deadline: monotonic time at which the operation expires
+        """
+
+        self.timers.arm(("age", op_id), deadline, lambda: self.expired.setdefault(op_id))
+
+    def __remove_operation(self, op_id: tuple) -> None:
         """
-        Check the age of the operations and act accordingly.
+        Remove an operation from the queue and from the request table, with its age timer.
+
+        Parameters:
+            op_id: id of the operation to remove
         """
 
-        for o, age in self.I.get_ages().copy().items():
-            if time() > age + OP_MAX_AGE:
-                if self.cur is not None:
-                    self.I.remove(o)
-                    if o == tuple(self.cur):
-                        self.__send_complain()
-                    else:
-                        self.__rsm_output(MsgType.OPERATION_NOT_QUEUED.value, self.config, o, self.clients_ids[o])
-                    break
-            elif self.cur is None:
-                client_id = self.I.get_client_id(o)
-                self.communication.send(MessageComposer.compose_invoke(self.config, o, client_id), self.leader)
+        self.I.remove(op_id)
+        self.timers.cancel(("age", op_id))
+        self.expired.pop(op_id, None)
+        self.requests.pop(op_id, None)
+
+    def __forget_request(self, op_id: tuple) -> None:
+        """
+        Remove an operation no longer in progress from the request table (leader), unless it is still queued by the
+        process, which invokes it again on the next leader.
+
+        Parameters:
+            op_id: id of the operation
+        """
+
+        if not self.I.check_presence(op_id):
+            self.requests.pop(op_id, None)
+
+    def __handle_expired_operations(self) -> None:
+        """
+        Act on the operations past their max age, once the process executes an operation: complain if an operation in
+        progress is expired, notify the clients of the other ones.
+        """
+
+        if not self.expired or not self.slots or self.leader == self.pid or self.s == State.ABORT:
+            return
+
+        for op_id in list(self.expired):
+            o = self.requests.get(op_id)
+            self.__remove_operation(op_id)
+            if op_id in self.slots:
+                self.__send_complain(op_id)
+            else:
+                self.__rsm_reply(MsgType.OPERATION_NOT_QUEUED.value, op_id, o)
+
+    def __invoke_operations(self) -> None:
+        """
+        Invoke again on the leader the oldest queued operation that is neither expired nor in progress, if the process
+        can take part in another slot. The leader buffers one operation for each replica, so the next ones are invoked
+        once it is executed.
+        """
+
+        if self.slots.is_full() or self.leader == self.pid or self.s == State.ABORT:
+            return
+
+        for op_id in self.I.get_ages():
+            if op_id not in self.expired and op_id not in self.slots and op_id in self.requests:
+                self.communication.send(MessageComposer.compose_invoke(self.config, self.requests[op_id], op_id),
+                                        self.leader)
+                return
 
     ##########################################
     #   Receive functions
@@ -219,30 +552,81 @@ class Process:
             message: complain message received
         """
 
-        if message.c == self.config and message.o == self.cur:
-            # Notifies the client of the complaint
-            self.__rsm_output(MsgType.COMPLAIN.value, self.config, self.cur, self.clients_ids[tuple(self.cur)])
+        slot = self.slots.get(message.op_id)
+        if message.c == self.config and slot is not None:
+            # Notifies the clients of the complaint
+            self.__rsm_reply_slot(MsgType.COMPLAIN.value, slot)
 
-            self.__abort(True)
+            self.__abort(slot, True)
 
-    def __rsm_execute(self, o: object, sender_id: int) -> None:
+    def __rsm_execute(self, o: object, op_id: tuple) -> None:
         """
         Logics for the receiving of a gui operation proposal. Add the operation to the queue.
 
         Parameters:
             o: operation to execute
-            sender_id: id of the client that sent the message
+            op_id: (client id, sequence number) of the operation
         """
 
-        if self.leader != PROCESS_ID:
-            self.I.add(o, sender_id)
-            self.clients_ids[tuple(o)] = sender_id
-            self.communication.send(MessageComposer.compose_invoke(self.config, o, sender_id), self.leader)
+        if not self.__admit(o, op_id):
+            return
+
+        if self.leader != self.pid:
+            self.I.add(op_id)
+            self.requests[op_id] = o
+            self.__arm_age(op_id, monotonic() + OP_MAX_AGE)
+            self.communication.send(MessageComposer.compose_invoke(self.config, o, op_id), self.leader)
         else:
-            self.__receive_invoke(MessageComposer.compose_invoke(self.config, o, sender_id),
-                                  PROCESS_ID)  # Treats the client invoke as a normal invoke
+            self.__receive_invoke(MessageComposer.compose_invoke(self.config, o, op_id),
+                                  self.pid)  # Treats the client invoke as a normal invoke
 
-    def __rsm_output(self, res: object, config: int, data: object, client_id: int = None) -> None:
+    def __admit(self, o: object, op_id: tuple) -> bool:
+        """
+        Check if an operation invoked by a client can be queued, rejecting it if the replica or the client have too
+        many operations pending, or if the leader is already executing an operation invoked through it.
+
+        Parameters:
+            o: operation invoked
+            op_id: (client id, sequence number) of the operation
+
+        Returns:
+            True if the operation can be queued, False if it has been rejected
+        """
+
+        if self.leader == self.pid:
+            if self.pid in self.B.keys():
+                self.__reject(o, op_id, "leader_busy", RETRY_AFTER)
+                return False
+            return True
+
+        if MAX_PENDING_OPS and self.I.size() >= MAX_PENDING_OPS:
+            reason = "replica_pending"
+        elif MAX_CLIENT_PENDING_OPS and self.I.count_client(op_id[0]) >= MAX_CLIENT_PENDING_OPS:
+            reason = "client_pending"
+        else:
+            return True
+
+        # A pending operation is committed or expired at the latest when it reaches the max age
+        self.__reject(o, op_id, reason, max(RETRY_AFTER, self.I.get_oldest_age() + OP_MAX_AGE - time()))
+        return False
+
+    def __reject(self, o: object, op_id: tuple, reason: str, retry_after: float) -> None:
+        """
+        Reject an operation invoked by a client, telling it when to invoke it again.
+
+        Parameters:
+            o: operation rejected
+            op_id: (client id, sequence number) of the operation, the sequence number is None if it is unknown
+            reason: name of the counter to increment
+            retry_after: seconds the client should wait before invoking the operation again
+        """
+
+        with self.rejected_lock:
+            self.rejected[reason] += 1
+        self.communication.send(MessageComposer.compose_operation_not_queued(self.config, o, retry_after, op_id),
+                                op_id[0])
+
+    def __rsm_output(self, res: object, config: int, data: object, client_id: int = None, op_id: tuple = None) -> None:
         """
         Output of the operation result to the client.
 
@@ -251,13 +635,43 @@ class Process:
             config: epoch number
             data: data to output
             client_id: id of the client to output the message to
+            op_id: id of the operation the output refers to
         """
 
         if client_id is not None:
-            self.communication.send(MessageComposer.compose_output(res, config, data), client_id)
+            self.communication.send(MessageComposer.compose_output(res, config, data, op_id), client_id)
         else:
             self.communication.broadcast_to_clients(MessageComposer.compose_output(res, config, data))
 
+    def __rsm_reply(self, res: object, op_id: tuple, o: object) -> None:
+        """
+        Output of the operation result to the client that invoked it, if the client is still known.
+
+        Parameters:
+            res: result status of the process to output
+            op_id: (client id, sequence number) of the operation the result refers to
+            o: operation the result refers to
+        """
+
+        client_id = op_id[0]
+        if not self.communication.peers.is_known(client_id):
+            print(f"Unknown client for the operation {op_id}, result {res} not sent")
+            return
+
+        self.__rsm_output(res, self.config, o, client_id, op_id)
+
+    def __rsm_reply_slot(self, res: object, slot: Slot) -> None:
+        """
+        Output of the result of a slot to the clients that invoked its operations.
+
+        Parameters:
+            res: result status of the process to output
+            slot: slot the result refers to
+        """
+
+        for op_id, o in zip(slot.op_ids, slot.ops):
+            self.__rsm_reply(res, op_id, o)
+
     def __receive_request_value(self, message: Message, client_id: int) -> None:
         """
         Logics for the receiving of the REQUEST_VALUE message.
@@ -283,62 +697,92 @@ class Process:
             sender_id: id of the process that sent the message
         """
 
-        if self.leader == PROCESS_ID and message.c == self.config and sender_id not in self.B.keys():
+        # An operation invoked through two replicas is buffered once
+        if (self.leader == self.pid and message.c == self.config and sender_id not in self.B.keys()
+                and message.op_id not in self.requests):
             self.buffer_queue.append(sender_id)
-            self.B[sender_id] = message.o
-            self.clients_ids[tuple(message.o)] = message.pid
+            self.B[sender_id] = message.op_id
+            self.requests[message.op_id] = message.o
 
     def __receive_execute(self, message: Message, sender_id: int) -> None:
         """
-        Logics for the receiving of the EXECUTE message.
+        Logics for the receiving of the EXECUTE message, opening a slot if the window has room.
 
         Parameters:
             message: message received
             sender_id: id of the process that sent the message
         """
 
-        if message.c == self.config and self.t is None:
-            self.cur = message.o
-            self.t, self.r = self.__execute_operation(self.ex_time)
-            self.s = self.t
-            signature = signp(self.r)
-            self.communication.send(MessageComposer.compose_approve(self.config, message.o, signature),
-                                    sender_id)
+        ops = [message.o] if message.batch is None else message.o
+        op_ids = [message.op_id] if message.batch is None else [tuple(op_id) for op_id in message.batch]
+
+        if (message.c == self.config and len(ops) == len(op_ids) and not self.slots.is_full()
+                and not any(op_id in self.slots for op_id in op_ids)):
+            slot = Slot(message.slot or 0, ops, op_ids)
+            self.slots.add(slot)
+            slot.t, slot.r = self.__execute_operation(slot)
+            slot.s = self.s = slot.t
+            self.communication.send(MessageComposer.compose_approve(self.config, slot.op_id, slot.sign()), sender_id)
 
-    def __receive_approve(self, message: Message, sender_id: int) -> None:
+    def __receive_approve(self, slot: Slot, message: Message, sender_id: int) -> None:
         """
-        Logics for the receiving of all APPROVE messages (leader).
+        Logics for the receiving of all APPROVE messages of a slot (leader).
 
         Parameters:
+            slot: slot the message refers to
             message: message received
             sender_id: id of the process that sent the message
         """
 
-        self.msg_buffer = remove_unwanted_messages(self.msg_buffer, MsgType.NEW_SIEVE_CONFIG.value)
-        self.msg_buffer[sender_id] = message
+        slot.msg_buffer[sender_id] = message
 
-        if len(self.msg_buffer) >= 2 * N_FAULTY_PROCESSES:
-            temp_buffer = self.msg_buffer.copy()  # copy the buffer that contains also the leader's message
-            temp_buffer[PROCESS_ID] = MessageComposer.compose_approve(self.config, self.cur, signp(self.r))
-            correct_messages = check_approve(temp_buffer, self.config, self.cur)
+        if len(slot.msg_buffer) >= 2 * N_FAULTY_PROCESSES:
+            temp_buffer = slot.msg_buffer.copy()  # copy the buffer that contains also the leader's message
+            temp_buffer[self.pid] = MessageComposer.compose_approve(self.config, slot.op_id, slot.sign())
+            slot.msg_buffer = {}
 
-            self.msg_buffer = remove_unwanted_messages(temp_buffer, MsgType.APPROVE.value)
+            if slot.is_batch():
+                self.__order_batch(slot, temp_buffer)
+                slot.s = State.WAITING_VALIDATION
+                return
 
+            correct_messages = check_approve(temp_buffer, self.config, slot.op_id)
             if len(correct_messages) > N_FAULTY_PROCESSES:
                 # Propose COMMIT
-                self.t = State.COMMIT
-                r = self.r if PROCESS_ID in correct_messages.keys() else compute_correct_rs(self.cur)
+                slot.t = State.COMMIT
+                r = slot.r[0] if self.pid in correct_messages.keys() else compute_correct_rs(slot.ops[0])
                 message_to_send = MessageComposer.compose_order(
-                    MsgType.CONFIRM.value, self.config, self.cur, self.t.value, r, correct_messages)
-                self.last_order = message_to_send
+                    MsgType.CONFIRM.value, self.config, slot.op_id, slot.t.value, r, correct_messages)
+                slot.last_order = message_to_send
                 self.communication.broadcast(message_to_send)
             else:
                 # Propose ABORT
-                self.t = State.ABORT
+                slot.t = State.ABORT
                 self.communication.broadcast(MessageComposer.compose_order(
-                    MsgType.ABORT.value, self.config, self.cur, self.t.value, self.r, temp_buffer))
+                    MsgType.ABORT.value, self.config, slot.op_id, slot.t.value, slot.r[0], temp_buffer))
 
-            self.s = State.WAITING_VALIDATION
+            slot.s = State.WAITING_VALIDATION
+
+    def __order_batch(self, slot: Slot, approves: dict) -> None:
+        """
+        Propose the decision on a batch (leader), operation by operation: an operation approved by more than f
+        processes is committed with the approved response, the other ones are aborted. The batch is aborted if none
+        of its operations can be committed.
+
+        Parameters:
+            slot: slot of the batch
+            approves: approve messages received, including the leader's one
+        """
+
+        slot.signs = check_approve_batch(approves, self.config, slot.op_id, len(slot.ops), N_FAULTY_PROCESSES)
+        commit = any(sign is not None for sign in slot.signs)
+        slot.t = State.COMMIT if commit else State.ABORT
+        rc = [None if sign is None else r if verifyp(r, sign) else compute_correct_rs(o)
+              for o, r, sign in zip(slot.ops, slot.r, slot.signs)]
+
+        slot.last_order = MessageComposer.compose_order(MsgType.CONFIRM.value if commit else MsgType.ABORT.value,
+                                                        self.config, slot.op_id, slot.t.value, rc, approves)
+        self.communication.broadcast(slot.last_order)
 
     def __receive_order(self, message: Message) -> None:
         """
@@ -348,50 +792,48 @@ class Process:
             message: message received
         """
 
-        self.last_order = message
+        slot = self.slots.get(message.op_id)
+        if slot is None:
+            return
+        slot.last_order = message
+        if slot.is_batch():
+            slot.signs = check_approve_batch(message.msg_set, self.config, slot.op_id, len(slot.ops),
+                                             N_FAULTY_PROCESSES)
 
         if message.decision == MsgType.CONFIRM.value or message.decision == MsgType.ABORT.value:
             self.communication.send(MessageComposer.compose_validation(
                 MsgType.CONFIRM.value if self.__validation_predicate(message) else MsgType.ABORT.value, self.config,
-                self.cur), self.leader)
+                slot.op_id), self.leader)
 
-    def __receive_validation(self, message: Message, sender_id: int) -> None:
+    def __receive_validation(self, slot: Slot, message: Message, sender_id: int) -> None:
         """
-        Logics for the receiving of VALIDATION messages to reach consensus.
+        Logics for the receiving of VALIDATION messages of a slot to reach consensus (leader). A committed slot is
+        applied once the slots before it are decided.
 
         Parameters:
+            slot: slot the message refers to
             message: message received
             sender_id: id of the process that sent the message
         """
 
-        self.msg_buffer[sender_id] = message
+        slot.msg_buffer[sender_id] = message
 
-        if len(self.msg_buffer) > 2 * N_FAULTY_PROCESSES:
-            res = None
+        if len(slot.msg_buffer) > 2 * N_FAULTY_PROCESSES:
             count_confirm = 0
-            for _, msg in self.msg_buffer.items():
-                if msg.decision == MsgType.CONFIRM.value and msg.c == self.config and msg.o == self.cur:
+            for _, msg in slot.msg_buffer.items():
+                if msg.decision == MsgType.CONFIRM.value and msg.c == self.config and msg.op_id == slot.op_id:
                     count_confirm += 1
-
-            cur_op = self.cur
-            faulty_leader = False
-
-            if self.t == State.COMMIT:
-                if count_confirm > N_FAULTY_PROCESSES:
-                    res = MsgType.COMMIT.value
-                    faulty_leader = PROCESS_ID not in self.last_order.msg_set.keys()
-                    self.__commit_operation(self.last_order)
-                else:
-                    res = MsgType.ABORT.value
-                    self.__abort(True)
-            elif self.t == State.ABORT:
-                res = MsgType.ABORT.value
-                self.__abort(count_confirm > N_FAULTY_PROCESSES)
-
-            self.__rsm_output(res, self.config, cur_op, self.clients_ids[tuple(cur_op)])
-            self.msg_buffer = {}
-            if faulty_leader:
-                self.s = State.NEW_CONFIG
+            slot.msg_buffer = {}
+
+            if slot.t == State.COMMIT and count_confirm > N_FAULTY_PROCESSES:
+                # A faulty leader or an operation of the batch aborted starts a new sieve config
+                slot.new_config = slot.diverged() if slot.is_batch() else (
+                        self.pid not in slot.last_order.msg_set.keys())
+                slot.s = State.COMMIT
+                self.__apply_committed()
+            else:
+                self.__abort(slot, slot.t == State.COMMIT or count_confirm > N_FAULTY_PROCESSES)
+                self.__rsm_reply_slot(MsgType.ABORT.value, slot)
 
     def __receive_new_sieve_config(self, message: Message, sender_id: int) -> None:
         """
@@ -408,100 +850,139 @@ class Process:
             if self.next_leader is not None and new_leader != self.next_leader and new_config == self.next_epoch:
                 self.msg_buffer = {}
             self.next_epoch, self.next_leader = new_config, new_leader
-            if PROCESS_ID == new_leader:
-                self.B, self.buffer_queue, self.clients_ids = message.leader_buffer
-                self.__start_new_sieve_config(new_config, PROCESS_ID)
+            if self.pid == new_leader:
+                self.B, self.buffer_queue, requests = message.leader_buffer
+                self.requests.update(requests)
+                self.__start_new_sieve_config(new_config, self.pid)
         elif self.__validation_predicate(message):
-            self.msg_buffer = remove_unwanted_messages(self.msg_buffer, MsgType.VALIDATION.value)
             self.msg_buffer[sender_id] = message
             if len(self.msg_buffer) > 2 * N_FAULTY_PROCESSES:
                 self.__start_epoch()
                 self.new_sieve_config_start = None
+                self.timers.cancel("new_sieve_config")
             elif sender_id == new_leader:
                 self.__start_new_sieve_config(new_config, new_leader)
 
-    def __receive_commit(self) -> None:
+    def __receive_commit(self, message: Message) -> None:
         """
         Logics for the receiving of the COMMIT message.
+
+        Parameters:
+            message: message received
         """
 
-        self.__commit_operation(self.last_order)
+        slot = self.slots.get(message.op_id)
+        if slot is not None:
+            slot.s = State.COMMIT
+            self.__apply_committed()
         self.msg_buffer = {}
 
-    def __receive_abort(self) -> None:
+    def __receive_abort(self, message: Message) -> None:
         """
-        Logics for the receiving of the ABORT message.
+        Logics for the receiving of the ABORT message, the leader sends one for each slot aborted.
+
+        Parameters:
+            message: message received
         """
 
-        self.__abort()
+        slot = self.slots.get(message.op_id)
+        if slot is not None:
+            self.slots.abort(slot)
+        self.next_epoch, self.next_leader = None, None
+        self.s = State.ABORT
         self.msg_buffer = {}
+        self.__apply_committed()
 
     ##########################################
     #   Commit operation
     ##########################################
 
-    def __commit_operation(self, message: Message) -> None:
+    def __apply_committed(self) -> None:
+        """
+        Commit the committed slots that no slot in progress precedes, in the order of their number.
+        """
+
+        for slot in self.slots.pop_committed():
+            self.__commit_operation(slot)
+
+    def __commit_operation(self, slot: Slot) -> None:
         """
         Logics of operation commit. It is executed when abv-deliver is received and the config in the message is equal
-        to the leader's config.
+        to the leader's config. The operations of a batch aborted by its order are aborted one by one, the other
+        operations of the batch are committed.
 
         Parameters:
-            message: message to deliver
+            slot: slot to commit
         """
 
-        if str(PROCESS_ID) in message.msg_set.keys():
-            self.dictionary[self.r[0]] = self.r[1]
-            self.s = self.t
-        else:
-            # Fix faulty operation value
-            self.dictionary[message.rc[0]] = message.rc[1]
-            self.s = State(message.tc)
-
-        if self.leader == PROCESS_ID:
-            self.B.pop(self.cur_pid)
-            self.communication.broadcast(MessageComposer.compose_commit(self.config, self.cur))
-        if self.I.check_presence(message.o):
-            self.I.remove(message.o)
-
-        self.last_order = None
-        self.cur = None
-        self.cur_pid = None
-        self.r = None
-        self.t = None
-        self.s = State.S0
+        responses = slot.responses(self.pid)
+        for response in responses:
+            if response is not None:
+                self.dictionary[response[0]] = response[1]
+
+        if self.leader == self.pid:
+            self.communication.broadcast(MessageComposer.compose_commit(self.config, slot.op_id))
+            for pid, op_id, o, response in zip(slot.pids, slot.op_ids, slot.ops, responses):
+                self.B.pop(pid)
+                if response is not None:
+                    self.__rsm_reply(MsgType.COMMIT.value, op_id, o)
+                else:
+                    self.__rsm_reply(MsgType.ROLLBACK.value, op_id, o)
+                    self.__rsm_reply(MsgType.ABORT.value, op_id, o)
+                self.__forget_request(op_id)
+            if slot.new_config:
+                self.__abort(None, True)
+        elif not self.slots:
+            self.s = State.S0
+
+        invoked = False
+        for op_id, response in zip(slot.op_ids, responses):
+            if response is not None and self.I.check_presence(op_id):
+                self.__remove_operation(op_id)
+                invoked = True
+        if invoked:
+            # The leader buffers the next operation invoked through the process as soon as it commits this one
+            self.__invoke_operations()
 
     ##########################################
     #   Abort - Rollback - New Sieve Config
     ##########################################
 
-    def __abort(self, new_config: bool = False) -> None:
+    def __abort(self, slot: Slot = None, new_config: bool = False) -> None:
         """
-        Logics for the ABORT status (leader).
+        Logics for the ABORT status (leader). The slot is rolled back with the slots that depend on it, all the slots
+        in progress are rolled back if the process starts a new sieve config.
 
         Parameters:
+            slot: slot to abort, None to only abort the slots in progress when the process starts a new sieve config
             new_config: if True, the process starts a new sieve config
         """
 
-        self.__rollback()
+        for aborted in self.slots.clear() if new_config else self.slots.abort(slot):
+            self.__rollback(aborted)
+            for pid in aborted.pids:
+                self.B.pop(pid)
+            self.communication.broadcast(MessageComposer.compose_abort(self.config, aborted.op_id))
+            for op_id in aborted.op_ids:
+                self.__forget_request(op_id)
         self.next_epoch, self.next_leader = None, None
-        if self.leader == PROCESS_ID:
-            self.B.pop(self.cur_pid)
-            self.communication.broadcast(MessageComposer.compose_abort(self.config, self.cur))
-            if new_config:
-                self.s = State.NEW_CONFIG
-            else:
-                self.s = State.S0
+        if new_config:
+            self.s = State.NEW_CONFIG
+        else:
+            self.s = State.S0
+            self.__apply_committed()
 
-    def __rollback(self) -> None:
+    def __rollback(self, slot: Slot) -> None:
         """
-        Rollback to the previous state.
+        Rollback to the state before the slot (leader).
+
+        Parameters:
+            slot: slot rolled back
         """
 
-        if self.leader == PROCESS_ID:
-            self.__rsm_output(MsgType.ROLLBACK.value, self.config, self.cur, self.clients_ids[tuple(self.cur)])
-        self.cur = None
-        self.t = None
-        self.s = State.ABORT
+        self.__rsm_reply_slot(MsgType.ROLLBACK.value, slot)
+        slot.t = None
+        slot.s = State.ABORT
 
     def __choose_new_leader(self) -> None:
         """
@@ -509,8 +990,8 @@ class Process:
         """
 
         self.next_leader = self.leader
-        while self.next_leader == PROCESS_ID:
-            self.next_leader = randint(1, len(HOST_MAP) - 1)
+        while self.next_leader == self.pid:
+            self.next_leader = randint(1, self.communication.n_processes)
         self.next_epoch = self.config + 1
 
     def __start_new_sieve_config(self, epoch: int, next_leader: int, start: bool = False) -> None:
@@ -525,8 +1006,9 @@ class Process:
 
         if epoch > self.config:
             message = MessageComposer.compose_new_sieve_config(epoch, next_leader)
-            if self.leader == PROCESS_ID:
-                message.leader_buffer = [self.B, self.buffer_queue, dict_to_list(self.clients_ids)]
+            if self.leader == self.pid:
+                message.leader_buffer = [self.B, self.buffer_queue,
+                                         [(op_id, self.requests[op_id]) for op_id in self.B.values()]]
                 if start:
                     message.generic_data = True
             self.communication.broadcast(message)
@@ -538,68 +1020,143 @@ class Process:
 
         self.msg_buffer = {}
         self.config, self.leader = self.next_epoch, self.next_leader
-        self.t = None
+        self.slots.clear()
+        self.batch_deadline = None
+        self.communication.set_config(self.config)
 
-        if self.leader == PROCESS_ID:
+        if self.leader == self.pid:
             self.__rsm_output(MsgType.NEW_SIEVE_CONFIG.value, self.config, (self.leader, self.B, self.buffer_queue))
         else:
-            self.B, self.buffer_queue, self.clients_ids = {}, [], {}
-
+            self.B, self.buffer_queue = {}, []
+            # Only the operations invoked through the process are kept, to invoke them on the new leader
+            self.requests = dict((op_id, self.requests[op_id]) for op_id in self.I.get_ages()
+                                 if op_id in self.requests)
+            # An operation queued without its request can't be invoked again
+            for op_id in [op_id for op_id in self.I.get_ages() if op_id not in self.requests]:
+                self.__remove_operation(op_id)
+
+        # The ages of all the queued operations restart, the expired ones included
         self.I.reset_operations_ages()
+        deadline = monotonic() + OP_MAX_AGE
+        self.timers.reschedule([("age", op_id) for op_id in self.I.get_ages()], deadline)
+        for op_id in self.expired:
+            self.__arm_age(op_id, deadline)
+        self.expired = {}
         self.s = State.S0
 
-    def __send_complain(self) -> None:
+    def __send_complain(self, op_id: tuple) -> None:
         """
         Send a COMPLAIN message to the leader.
+
+        Parameters:
+            op_id: id of the operation in progress to complain about
         """
 
-        self.communication.send(MessageComposer.compose_complain(self.config, self.cur, PROCESS_ID), self.leader)
+        self.communication.send(MessageComposer.compose_complain(self.config, op_id, self.pid), self.leader)
 
     ##########################################
     #   Other operations
     ##########################################
 
-    def __request_execution(self, pid: int) -> None:
+    def __request_execution(self, pids: list) -> None:
         """
-        Request the execution of the operation (leader).
+        Request the execution of the operations (leader), opening the next slot for all of them.
 
         Parameters:
-            pid: process id of the process that invoked the operation
+            pids: ids of the processes that invoked the operations
+        """
+
+        pids = [pid for pid in pids if pid in self.B.keys()]
+        if pids and not self.slots.is_full() and self.leader == self.pid:
+            op_ids = [self.B[pid] for pid in pids]
+            slot = Slot(self.next_slot, [self.requests[op_id] for op_id in op_ids], op_ids, pids)
+            self.next_slot += 1
+            self.slots.add(slot)
+
+            # Broadcast EXECUTE, the only message of the round carrying the operations
+            if slot.is_batch():
+                message = MessageComposer.compose_execute_batch(self.config, slot.ops, op_ids, slot.number)
+            else:
+                message = MessageComposer.compose_execute(self.config, slot.ops[0], slot.op_id, slot.number)
+            self.communication.broadcast(message)
+
+    def __executing(self) -> Slot:
+        """
+        Get the slot the leader is executing, the last one opened: the leader executes the operations one at a time.
+
+        Returns:
+            the slot in ELABORATION, None if there is none
         """
 
-        if pid in self.B.keys() and self.cur is None and self.leader == PROCESS_ID:
-            self.cur = self.B[pid]
-            self.cur_pid = pid
+        slot = self.slots.last()
+        return slot if slot is not None and slot.s == State.ELABORATION else None
+
+    def __end_execution(self) -> None:
+        """
+        End the execution of the last slot opened, computing the speculative state and response.
+        """
 
-            # Broadcast EXECUTE
-            self.communication.broadcast(MessageComposer.compose_execute(self.config, self.cur))
-            self.s = State.ELABORATION
+        self.execution_deadline = None
+        slot = self.__executing()
+        if slot is not None:
+            slot.t, slot.r = self.__execute_operation(slot)
+            slot.s = slot.t
 
-    def __execute_operation(self, random_param: tuple = (1, 100, 20)) -> tuple:
+    def __execution_time(self, random_param: tuple = (1, 100, 20)) -> float:
         """
-        Execute the operation.
+        Get the simulated execution time of the current operation.
 
         Parameters:
             random_param: tuple (min, max, threshold) for the random execution time number generation
 
         Returns:
-            tuple (t, r) where t is the speculative state and r is the speculative response
+            the seconds the leader spends executing the operation
         """
 
-        t = State.WAITING_APPROVAL if self.leader == PROCESS_ID else State.WAITING_ORDER
-        r = self.cur if self.faulty == 0 else (
-            self.cur[0],
-            str(self.cur[1]) + str("FAULTY") + str(PROCESS_ID))  # Add artificial error if process is faulty
+        if randint(random_param[0], random_param[1]) <= random_param[2] and self.leader == self.pid:
+            return COMPLAIN_THRESHOLD + 1
+        return 0
 
-        # Simulate execution time
-        if randint(random_param[0], random_param[1]) <= random_param[2] and self.leader == PROCESS_ID:
-            for _ in range(int((COMPLAIN_THRESHOLD + 1) / 0.01)):
-                if self.s == State.NEW_CONFIG:
-                    return None, None
-                sleep(0.01)
+    def __execute_operation(self, slot: Slot) -> tuple:
+        """
+        Execute the operations of a slot.
+
+        Parameters:
+            slot: slot to execute
+
+        Returns:
+            tuple (t, r) where t is the speculative state and r is the speculative response of each operation
+        """
+
+        t = State.WAITING_APPROVAL if self.leader == self.pid else State.WAITING_ORDER
+        r = [o if self.faulty == 0 else (
+            o[0],
+            str(o[1]) + str("FAULTY") + str(self.pid)) for o in slot.ops]  # Add artificial error if process is faulty
 
         return t, r
 
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the process.
+
+        Returns:
+            dictionary containing the gauges of the inbox lanes, the operations rejected by the admission control, the
+            counters of the slots and the counters of the communication
+        """
+
+        with self.rejected_lock:
+            rejected = dict(self.rejected)
+
+        return {
+            "inbox": self.receive_buffer.get_stats(),
+            "pending_operations": self.I.size(),
+            "requests": len(self.requests),
+            "slots": self.slots.get_stats(),
+            "rejected": rejected,
+            "timers": self.timers.get_stats(),
+            "communication": self.communication.get_stats()
+        }
+
     def close(self) -> None:
         """
         Close the process and the communication.
@@ -619,11 +1176,15 @@ class Process:
             True if the message is valid, False otherwise
         """
 
-        if message.type == MsgType.ORDER.value and message.c == self.config and message.o == self.cur and check_validation_confirm(
-                message.msg_set, self.r, N_FAULTY_PROCESSES):
+        slot = self.slots.get(message.op_id)
+        if message.type == MsgType.ORDER.value and slot is not None and slot.is_batch():
+            return message.c == self.config and check_validation_batch(
+                message.msg_set, slot.signs, slot.r, message.decision == MsgType.CONFIRM.value, N_FAULTY_PROCESSES)
+        if message.type == MsgType.ORDER.value and message.c == self.config and slot is not None and \
+                check_validation_confirm(message.msg_set, slot.r[0], N_FAULTY_PROCESSES):
             return True
         elif message.type == MsgType.ORDER.value and message.decision == MsgType.ABORT.value and check_validation_abort(
-                message.msg_set, N_FAULTY_PROCESSES, self.config, self.cur):
+                message.msg_set, N_FAULTY_PROCESSES, self.config, message.op_id):
             return True
         elif message.type == MsgType.NEW_SIEVE_CONFIG.value and message.c <= self.next_epoch and message.pid == self.next_leader:
             return True
@@ -3,17 +3,20 @@
 import os
 
 
-def get_env_variable(var_name: str) -> str:
+def get_env_variable(var_name: str, default: str = None) -> str:
     """
     Read environment variable.
 
     Parameters:
         var_name: name of the environment variable
+        default: value to return if the variable is not set, if None the variable is required
     """
 
     try:
         return os.environ[var_name]
     except KeyError:
+        if default is not None:
+            return default
         error_msg = "Set the {} environment variable".format(var_name)
         raise EnvironmentError(error_msg)
 
@@ -23,9 +26,35 @@ N_FAULTY_PROCESSES = (N_PROCESSES - 1) // 3
 BUFFER_SIZE = int(get_env_variable("BUFFER_SIZE"))
 PROCESS_ID = int(get_env_variable("PROCESS_ID"))
 FAULTY = int(get_env_variable("FAULTY"))
+CIPHER_MODE = get_env_variable("CIPHER_MODE", "cbc")  # cbc, gcm or chacha20, must be the same for the whole cluster
+WIRE_FORMAT = get_env_variable("WIRE_FORMAT", "json")  # json or binary
+GROUP_KEY = get_env_variable("GROUP_KEY", "")  # secret shared by the replicas for the broadcasts, empty to disable
+COMPRESSION_THRESHOLD = int(get_env_variable("COMPRESSION_THRESHOLD", "0"))  # min bytes to compress, 0 to disable
+MAX_CLIENTS = int(get_env_variable("MAX_CLIENTS", "1024"))  # max client sessions, the least recently seen is evicted
+CLIENT_IDLE_TIMEOUT = float(get_env_variable("CLIENT_IDLE_TIMEOUT", "600"))  # idle seconds before evicting a client
+PROCESS_HOST = get_env_variable("PROCESS_HOST", "process{}")  # host of the processes, {} is replaced by the process id
+RUNTIME = get_env_variable("RUNTIME", "threads")  # threads or asyncio
+DECODE_WORKERS = int(get_env_variable("DECODE_WORKERS", "0"))  # threads decoding the datagrams, 0 for the listener
+RECEIVE_SOCKETS = int(get_env_variable("RECEIVE_SOCKETS", "1"))  # sockets bound to the port with SO_REUSEPORT
+SOCKET_RCVBUF = int(get_env_variable("SOCKET_RCVBUF", "0"))  # kernel receive buffer of each socket, 0 for the default
+SOCKET_SNDBUF = int(get_env_variable("SOCKET_SNDBUF", "0"))  # kernel send buffer of each socket, 0 for the default
+SEND_WORKERS = int(get_env_variable("SEND_WORKERS", "2"))  # threads sending the queued messages, 0 to send directly
+SEND_QUEUE_DEPTH = int(get_env_variable("SEND_QUEUE_DEPTH", "256"))  # max number of messages queued for each peer
+SEND_BATCH_WINDOW = float(get_env_variable("SEND_BATCH_WINDOW", "0"))  # seconds a peer waits to batch its messages
+SEND_BATCH_BYTES = int(get_env_variable("SEND_BATCH_BYTES", "0"))  # max bytes packed in one datagram, 0 to disable
+LANE_BURST = int(get_env_variable("LANE_BURST", "32"))  # max messages taken before a waiting lower lane
+INBOX_DEPTH = int(get_env_variable("INBOX_DEPTH", "1024"))  # max messages in each client lane, 0 for no limit
+CONSENSUS_DEPTH = int(get_env_variable("CONSENSUS_DEPTH", "1024"))  # max queued messages of a replica, 0 for no limit
+MAX_PENDING_OPS = int(get_env_variable("MAX_PENDING_OPS", "1024"))  # max operations queued by a replica, 0 for no limit
+MAX_CLIENT_PENDING_OPS = int(get_env_variable("MAX_CLIENT_PENDING_OPS", "64"))  # max operations queued for a client
+PIPELINE_WINDOW = int(get_env_variable("PIPELINE_WINDOW", "1"))  # max sieve rounds in progress, 1 runs one at a time
+BATCH_SIZE = int(get_env_variable("BATCH_SIZE", "1"))  # max operations executed by one EXECUTE, 1 to disable
+BATCH_LINGER = float(get_env_variable("BATCH_LINGER", "0"))  # seconds the leader waits to fill a batch, 0 to not wait
+CLIENT_BASE_PORT = int(get_env_variable("CLIENT_BASE_PORT", "0"))  # client port - process id, 0 for one port
 CRYPTO_KEYS = {}  # {process_id: key}
 HOST_MAP = {}  # {process_id: host}
 PORT_MAP = {}  # {process_id: port}
+CLIENT_PORT_MAP = {}  # {process_id: port the clients are received on}
 
 # Get crypto key values
 for i in range(1, N_PROCESSES + 1):
@@ -34,4 +63,6 @@ for i in range(1, N_PROCESSES + 1):
 
     # Set port values
     PORT_MAP[str(i)] = 8000 + i
-    HOST_MAP[str(i)] = "process" + str(i)
+    HOST_MAP[str(i)] = PROCESS_HOST.format(i)
+    if CLIENT_BASE_PORT:
+        CLIENT_PORT_MAP[str(i)] = CLIENT_BASE_PORT + i
@@ -1,12 +1,49 @@
 #!/bin/bash
 
+import asyncio
+import importlib
+import json
+import os
 import unittest
+import zlib
+from random import Random
+from gui.client_config import CLIENT_PID
 from gui.common import run_docker_compose, stop_docker_compose, check_containers
-from utils.msg import MessageComposer
+from utils.codec import WireFormat, encode_message, decode_message, encode_batch, decode_messages, write_varint, \
+    write_value, BINARY_VERSION, MAX_DEPTH, MAX_VARINT_SIZE, MSG_SET_TAG, LEADER_BUFFER_TAG, NONE, INT, STR, LIST, \
+    DICT, MESSAGE
+from utils.communication import Communication, CipherMode, KeyManager, WireCipher, NONCE_SIZE, open_socket
+from utils.compression import Compressor, COMPRESSED_V1, DICTIONARY_V1
+from utils.fragmentation import Reassembler, split_datagram
+from utils.inbox import PriorityInbox
+from utils.msg import MessageComposer, Message, marshall_message, unmarshall_message, decode_leader_buffer
+from utils.outbound import Outgoing, SendQueues
 from client import Client
 from utils.msg_variables import MsgType, MsgKey
-from threading import Thread
-from time import sleep
+from utils.peers import PeerDirectory, ClientRegistry
+from utils.pipeline import ReceivePipeline
+from utils.slots import Slot, SlotWindow
+from utils.timers import TimerHeap
+from utils.utils import OpQueue, State, check_approve, check_approve_batch, check_validation_batch, signp
+from threading import Event, Thread
+from queue import Empty
+from time import monotonic, sleep
+
+
+def connect(*communications) -> None:
+    """
+    Register the ports the kernel assigned to the communications bound to port 0 in the directories of the others.
+
+    Parameters:
+        communications: communications to connect to each other
+    """
+
+    for communication in communications:
+        address = (communication.host, communication.socket.getsockname()[1])
+        for other in communications:
+            if other is not communication:
+                peer_id = str(communication.pid)
+                other.peers.register(peer_id, address, other.peers.keys.get(peer_id, str(other.pid)))
 
 
 class SieveTest(unittest.TestCase):
@@ -498,5 +535,1330 @@ class SieveTest(unittest.TestCase):
         thread2.join()
 
 
+class KeyManagerTest(unittest.TestCase):
+    """
+    Class for testing the cache of the derived keys.
+    """
+
+    def test_keys_are_derived_once(self):
+        """
+        Test that a key is derived on first use only, and that the derivation doesn't depend on the cache.
+        """
+        keys = KeyManager(iterations=10)
+
+        key = keys.get("12")
+        self.assertIs(key, keys.get("12"))
+        self.assertEqual(key, KeyManager(iterations=10).get("12"))
+        self.assertNotEqual(key, keys.get("13"))
+        self.assertEqual((1, 2, 0, 2), tuple(keys.get_stats()[name] for name in ("hits", "misses", "evictions",
+                                                                                   "size")))
+
+    def test_least_recently_used_key_is_evicted(self):
+        """
+        Test that the least recently used key is evicted when the cache is full.
+        """
+        keys = KeyManager(iterations=10, max_size=2)
+
+        keys.get("a")
+        keys.get("b")
+        keys.get("a")
+        keys.get("c")
+
+        self.assertEqual(["a", "c"], list(keys.cache.keys()))
+        self.assertEqual(1, keys.get_stats()["evictions"])
+        keys.get("b")
+        self.assertEqual((1, 4), (keys.get_stats()["hits"], keys.get_stats()["misses"]))
+
+    def test_prewarm_derives_the_missing_keys(self):
+        """
+        Test that the prewarm derives only the keys not cached yet, which are then served by the cache.
+        """
+        keys = KeyManager(iterations=10)
+        cached = keys.get("a")
+
+        keys.prewarm(["a", "b", "c", "b"], workers=2)
+
+        self.assertEqual(3, keys.get_stats()["size"])
+        self.assertIs(cached, keys.cache["a"])
+        self.assertEqual(KeyManager(iterations=10).get("c"), keys.get("c"))
+        self.assertEqual((1, 1), (keys.get_stats()["hits"], keys.get_stats()["misses"]))
+
+
+class WireCipherTest(unittest.TestCase):
+    """
+    Class for testing the encryption modes of the wire.
+    """
+
+    AEAD_MODES = (CipherMode.GCM, CipherMode.CHACHA20)
+
+    @staticmethod
+    def cipher_of(mode: CipherMode) -> tuple:
+        """
+        Build a cipher and a key of the right length for a mode.
+
+        Parameters:
+            mode: encryption mode
+
+        Returns:
+            tuple (cipher, key)
+        """
+        cipher = WireCipher(mode)
+        return cipher, KeyManager(iterations=10, key_length=cipher.key_length).get("12")
+
+    def test_round_trip(self):
+        """
+        Test that every mode decrypts what it encrypts, adding the bytes it declares.
+        """
+        for mode in CipherMode:
+            cipher, key = self.cipher_of(mode)
+            for plaintext in (b"", b"x", bytes(range(256)) * 5):
+                data = cipher.encrypt(plaintext, key)
+                self.assertEqual(plaintext, cipher.decrypt(data, key))
+                self.assertEqual(len(plaintext) + cipher.overhead(len(plaintext)), len(data))
+
+    def test_nonces_are_not_reused(self):
+        """
+        Test that two senders sharing the key of a peer don't reuse the nonces of each other.
+        """
+        for mode in self.AEAD_MODES:
+            cipher, key = self.cipher_of(mode)
+            other = WireCipher(mode)
+            nonces = set(data[:NONCE_SIZE] for data in (cipher.encrypt(b"x", key) for _ in range(100)))
+            nonces |= set(data[:NONCE_SIZE] for data in (other.encrypt(b"x", key) for _ in range(100)))
+            self.assertEqual(200, len(nonces))
+
+    def test_tampered_and_truncated_datagrams_are_rejected(self):
+        """
+        Test that the authenticated modes reject a datagram with any flipped byte, a truncated one, or one encrypted
+        with another key.
+        """
+        for mode in self.AEAD_MODES:
+            cipher, key = self.cipher_of(mode)
+            data = cipher.encrypt(b"payload", key)
+
+            for index in range(len(data)):
+                forged = bytearray(data)
+                forged[index] ^= 1
+                self.assertIsNone(cipher.decrypt(bytes(forged), key))
+            for size in (0, NONCE_SIZE, len(data) - 1):
+                self.assertIsNone(cipher.decrypt(data[:size], key))
+            other_key = KeyManager(iterations=10, key_length=cipher.key_length).get("13")
+            self.assertIsNone(cipher.decrypt(data, other_key))
+            self.assertEqual(len(data) + 4, cipher.rejected)
+
+
+class CodecTest(unittest.TestCase):
+    """
+    Class for testing the binary wire format against the json one.
+    """
+
+    def setUp(self):
+        self.random = Random(42)
+
+    def random_value(self, depth: int = 0) -> object:
+        """
+        Generate a random json serializable value.
+
+        Parameters:
+            depth: nesting level of the value
+        """
+
+        kind = self.random.randint(0, 8 if depth < 3 else 5)
+        match kind:
+            case 0:
+                return None
+            case 1:
+                return self.random.choice((True, False))
+            case 2:
+                return self.random.randint(-2 ** 70, 2 ** 70)
+            case 3:
+                return self.random.uniform(-1e6, 1e6)
+            case 4:
+                return "".join(chr(self.random.randint(32, 0x2FF)) for _ in range(self.random.randint(0, 20)))
+            case 5:
+                return self.random.randint(0, 300)
+            case 6:
+                return [self.random_value(depth + 1) for _ in range(self.random.randint(0, 4))]
+            case 7:
+                return tuple(self.random_value(depth + 1) for _ in range(self.random.randint(0, 4)))
+            case _:
+                return dict((self.random.choice((self.random_value(3), str(self.random.randint(0, 9)))),
+                             self.random_value(depth + 1)) for _ in range(self.random.randint(0, 4)))
+
+    def random_message(self, nested: bool = True) -> Message:
+        """
+        Generate a random message, with every field set or not set.
+
+        Parameters:
+            nested: whether to generate the msg_set and leader_buffer fields
+        """
+
+        message = Message(type=self.random.randint(0, 16))
+        for name in ("c", "pid", "decision", "tc", "debug_faulty"):
+            if self.random.random() < 0.5:
+                setattr(message, name, self.random.randint(-5, 2 ** 40))
+        for name in ("rc", "debug_ex_time", "generic_data"):
+            if self.random.random() < 0.5:
+                setattr(message, name, self.random_value())
+        if self.random.random() < 0.5:
+            message.sign = "%064x" % self.random.getrandbits(256)
+        if self.random.random() < 0.5:
+            message.o = (self.random_value(1), self.random_value(1))
+        if nested and self.random.random() < 0.5:
+            message.msg_set = dict((pid, self.random_message(False)) for pid in range(self.random.randint(0, 7)))
+        if nested and self.random.random() < 0.5:
+            operations = [(self.random_value(3), self.random_value(3)) for _ in range(self.random.randint(0, 5))]
+            op_ids = [(self.random.randint(1000, 2000), sequence) for sequence in range(len(operations))]
+            message.leader_buffer = [dict((pid, op_id) for pid, op_id in enumerate(op_ids)),
+                                     list(range(len(operations))),
+                                     list(zip(op_ids, operations))]
+        if self.random.random() < 0.5:
+            message.retry_after = self.random.uniform(0, 10)
+        if self.random.random() < 0.5:
+            message.op_id = [self.random.randint(1000, 2000), self.random.randint(0, 2 ** 40)]
+        return message
+
+    def test_binary_round_trip(self):
+        """
+        Test that a message decoded from the binary format is equal to the same message decoded from json.
+        """
+        for _ in range(500):
+            message = self.random_message()
+            expected = unmarshall_message(json.loads(json.dumps(marshall_message(message))))
+
+            self.assertEqual(expected, decode_message(encode_message(message, WireFormat.BINARY)))
+            self.assertEqual(expected, decode_message(encode_message(message, WireFormat.JSON)))
+
+    def test_binary_rejects_truncated_message(self):
+        """
+        Test that a truncated binary message is not decoded.
+        """
+        data = encode_message(self.random_message(), WireFormat.BINARY)
+
+        with self.assertRaises((ValueError, IndexError)):
+            decode_message(data[:-1])
+
+    def test_batch_round_trip(self):
+        """
+        Test that the messages packed in a batch, in both formats, are decoded in order.
+        """
+        messages = [self.random_message() for _ in range(20)]
+        batch = encode_batch([encode_message(message, self.random.choice(list(WireFormat))) for message in messages])
+
+        self.assertEqual([unmarshall_message(json.loads(json.dumps(marshall_message(message))))
+                          for message in messages], decode_messages(batch))
+        with self.assertRaises((ValueError, IndexError)):
+            decode_messages(batch[:-1])
+
+    @staticmethod
+    def binary_field(value: bytes) -> bytes:
+        """
+        Build a binary message with a single field holding an encoded value.
+
+        Parameters:
+            value: encoded value of the field
+
+        Returns:
+            the binary message
+        """
+        buffer = bytearray((BINARY_VERSION, 0))
+        write_varint(buffer, len(value))
+        return bytes(buffer + value)
+
+    def test_binary_rejects_malformed_values(self):
+        """
+        Test that the values nested too deep, the varints too long and the counts or lengths bigger than the rest of
+        the datagram are rejected before being decoded.
+        """
+        nested = 1
+        for _ in range(MAX_DEPTH):
+            nested = [nested]
+        self.assertEqual(nested, decode_message(encode_message(Message(o=nested), WireFormat.BINARY)).o)
+        with self.assertRaises(ValueError):
+            decode_message(encode_message(Message(o=[nested]), WireFormat.BINARY))
+        with self.assertRaises(ValueError):
+            decode_message(self.binary_field(bytes((LIST, 1)) * 100000 + bytes((NONE,))))
+
+        with self.assertRaises(ValueError):
+            decode_message(self.binary_field(bytes((INT,)) + b"\xff" * MAX_VARINT_SIZE + b"\x01"))
+        for value_type in (LIST, DICT, STR, MESSAGE):
+            huge = bytearray((value_type,))
+            write_varint(huge, 2 ** 40)
+            with self.assertRaises(ValueError):
+                decode_message(self.binary_field(bytes(huge)))
+        with self.assertRaises(ValueError):
+            decode_message(self.binary_field(bytes((DICT, 3, STR, 1)) + b"a" + bytes((NONE,))))
+
+
+class LazyDecodingTest(unittest.TestCase):
+    """
+    Class for testing the lazy decoding of the set of messages and of the leader buffer.
+    """
+
+    def setUp(self):
+        self.approves = dict((str(pid), MessageComposer.compose_approve(1, (1000, pid), "sign" + str(pid)))
+                             for pid in range(1, 4))
+        self.order = MessageComposer.compose_order(MsgType.CONFIRM.value, 1, (1000, 1), State.COMMIT.value,
+                                                   ["a", 1], self.approves)
+        self.new_sieve_config = MessageComposer.compose_new_sieve_config(2, 3)
+        self.leader_buffer = [{2: (1000, 1), 3: (1001, 1)}, [3, 2], [((1000, 1), ["a", 1]), ((1001, 1), ["b", 2])]]
+        self.new_sieve_config.leader_buffer = self.leader_buffer
+
+    @staticmethod
+    def eager(message: Message) -> Message:
+        """
+        Decode a message eagerly, as the json decoding without lazy fields did.
+
+        Parameters:
+            message: message to decode
+
+        Returns:
+            the decoded message
+        """
+        return unmarshall_message(json.loads(json.dumps(marshall_message(message))))
+
+    def test_lazy_fields_are_equal_to_eager_decoding(self):
+        """
+        Test that the messages of the set are decoded on first access only, equal to the ones decoded eagerly, and
+        that the leader buffer is decoded in the shape the leader composed it.
+        """
+        for wire_format in WireFormat:
+            msg_set = decode_message(encode_message(self.order, wire_format)).msg_set
+
+            self.assertEqual(["1", "2", "3"], list(msg_set))
+            self.assertEqual({}, msg_set.messages)
+            self.assertEqual(self.eager(self.approves["2"]), msg_set["2"])
+            self.assertEqual(["2"], list(msg_set.messages))
+            self.assertIs(msg_set["2"], msg_set["2"])
+            self.assertEqual(dict((pid, self.eager(approve)) for pid, approve in self.approves.items()), dict(msg_set))
+
+            leader_buffer = decode_message(encode_message(self.new_sieve_config, wire_format)).leader_buffer
+            self.assertIsNone(leader_buffer.items)
+            self.assertEqual(self.leader_buffer, leader_buffer)
+            self.assertEqual(decode_leader_buffer(json.loads(json.dumps(self.leader_buffer))), list(leader_buffer))
+
+    def test_lazy_fields_are_serialized_again(self):
+        """
+        Test that a decoded message, with its lazy fields accessed or not, is serialized again in both formats.
+        """
+        for first, second in ((first, second) for first in WireFormat for second in WireFormat):
+            for access in (False, True):
+                order = decode_message(encode_message(self.order, first))
+                new_sieve_config = decode_message(encode_message(self.new_sieve_config, first))
+                if access:
+                    order.msg_set["1"]
+                    len(new_sieve_config.leader_buffer)
+
+                self.assertEqual(self.eager(self.approves["3"]),
+                                 decode_message(encode_message(order, second)).msg_set["3"])
+                self.assertEqual(self.leader_buffer,
+                                 decode_message(encode_message(new_sieve_config, second)).leader_buffer)
+
+    def test_malformed_nested_entry_fails_on_access(self):
+        """
+        Test that a malformed message of the set, or a malformed leader buffer, is only rejected when it is accessed.
+        """
+        msg_set = bytearray((DICT,))
+        write_varint(msg_set, 2)
+        write_value(msg_set, "1")
+        write_value(msg_set, self.approves["1"])
+        write_value(msg_set, "2")
+        msg_set += bytes((MESSAGE, 3, 0, 0x7F, 0))
+        data = bytearray((BINARY_VERSION, MSG_SET_TAG))
+        write_varint(data, len(msg_set))
+        order = decode_message(bytes(data + msg_set))
+
+        self.assertIn("2", order.msg_set)
+        self.assertEqual(self.eager(self.approves["1"]), order.msg_set["1"])
+        with self.assertRaises(ValueError):
+            order.msg_set["2"]
+
+        new_sieve_config = decode_message(bytes((BINARY_VERSION, LEADER_BUFFER_TAG, 2, LIST, 5)))
+        with self.assertRaises(ValueError):
+            list(new_sieve_config.leader_buffer)
+
+
+class MessageComposerTest(unittest.TestCase):
+    """
+    Class for testing the messages built directly by the composer against the dictionary path.
+    """
+
+    def test_composers_match_the_dictionary_path(self):
+        """
+        Test that the INVOKE and DEBUG messages built directly are equal, field by field and type by type, to the ones
+        built from a dictionary by dataclasses_json and handled by the process.
+        """
+        for operation in (("a", 1), ["a", 1], None):
+            expected = Message.from_dict({MsgKey.TYPE.value: MsgType.INVOKE.value, MsgKey.CONFIG.value: 3,
+                                          MsgKey.OPERATION.value: operation, MsgKey.OP_ID.value: (1000, 1)})
+            # The operation ids are tuples in the process, the received ones are converted when handled
+            expected.op_id = tuple(expected.op_id)
+            message = MessageComposer.compose_invoke(3, operation, (1000, 1))
+
+            self.assertEqual(expected, message)
+            self.assertEqual((type(expected.o), type(expected.op_id)), (type(message.o), type(message.op_id)))
+            self.assertEqual(marshall_message(expected), marshall_message(message))
+
+        for command in ((MsgKey.DEBUG_EX_TIME.value, (10, 10, 0)), (MsgKey.DEBUG_FAULTY.value, 100)):
+            fields = {MsgKey.TYPE.value: MsgType.DEBUG.value, MsgKey.DEBUG_FAULTY.value: False,
+                      MsgKey.DEBUG_EX_TIME.value: False}
+            fields[command[0]] = command[1]
+            expected = Message.from_dict(fields)
+            message = MessageComposer.compose_debug(command)
+
+            self.assertEqual(expected, message)
+            self.assertEqual(marshall_message(expected), marshall_message(message))
+            self.assertFalse(hasattr(message, "__dict__"))
+
+
+class CompressionTest(unittest.TestCase):
+    """
+    Class for testing the compression of the serialized messages with the shared dictionary.
+    """
+
+    def setUp(self):
+        approve = MessageComposer.compose_approve(1, (1000, 1), "0" * 64)
+        self.message = MessageComposer.compose_order(MsgType.CONFIRM.value, 1, (1000, 1), 8, ("key", "value"),
+                                                     dict((pid, approve) for pid in range(1, 8)))
+
+    def test_round_trip(self):
+        """
+        Test that the messages compressed in both wire formats are decompressed to the same bytes by another
+        compressor, and start with the version of the dictionary.
+        """
+        for wire_format in WireFormat:
+            data = encode_message(self.message, wire_format)
+            compressed = Compressor(threshold=1).compress(data)
+
+            self.assertEqual(COMPRESSED_V1, compressed[0])
+            self.assertLess(len(compressed), len(data) // 2)
+            self.assertEqual(data, Compressor().decompress(compressed))
+
+    def test_threshold(self):
+        """
+        Test that the messages smaller than the threshold, the incompressible ones and all of them when the
+        compression is disabled are sent as they are.
+        """
+        data = encode_message(self.message, WireFormat.JSON)
+        incompressible = Random(4).randbytes(len(data))
+        compressor = Compressor(threshold=len(data))
+
+        self.assertEqual(data, Compressor().compress(data))
+        self.assertEqual(data[:-1], compressor.compress(data[:-1]))
+        self.assertEqual(incompressible, compressor.compress(incompressible))
+        self.assertNotEqual(data, compressor.compress(data))
+        self.assertEqual(1, compressor.get_stats()["compressed"])
+        self.assertEqual(data, compressor.decompress(data))
+
+    def test_dictionary_is_fixed(self):
+        """
+        Test that the dictionary of version 1 never changes, the processes of different builds use it to decompress
+        each other's messages.
+        """
+        self.assertEqual((1658, 3936856218), (len(DICTIONARY_V1), zlib.crc32(DICTIONARY_V1)))
+
+    def test_rejects_truncated_and_corrupted_messages(self):
+        """
+        Test that a truncated or corrupted compressed message is rejected.
+        """
+        compressor = Compressor(threshold=1)
+        compressed = compressor.compress(encode_message(self.message, WireFormat.BINARY))
+
+        with self.assertRaises(ValueError):
+            compressor.decompress(compressed[:-4])
+        with self.assertRaises(ValueError):
+            compressor.decompress(compressed[:1] + bytes(len(compressed) - 1))
+
+
+class FragmentationTest(unittest.TestCase):
+    """
+    Class for testing the fragmentation of the datagrams bigger than the buffer size.
+    """
+
+    def test_reassemble_out_of_order(self):
+        """
+        Test that a datagram is rebuilt from its fragments received in any order and with duplicates.
+        """
+        datagram = bytes(Random(1).getrandbits(8) for _ in range(10000))
+        fragments = split_datagram(datagram, 7, 1024)
+        reassembler = Reassembler()
+
+        self.assertTrue(all(len(fragment) <= 1024 for fragment in fragments))
+
+        results = [reassembler.add(fragment, "2") for fragment in fragments[-1:] + fragments[::-1]]
+
+        self.assertEqual(datagram, results[-1])
+        self.assertFalse(any(results[:-1]))
+        self.assertEqual(1, reassembler.get_stats()["reassembled"])
+        self.assertEqual(0, reassembler.get_stats()["pending"])
+
+    def test_incomplete_messages_are_bounded(self):
+        """
+        Test that the incomplete messages are evicted when too many and dropped after the timeout.
+        """
+        reassembler = Reassembler(timeout=0.05, max_messages=2)
+
+        for msg_id in range(3):
+            reassembler.add(split_datagram(bytes(3000), msg_id, 1024)[0], "2")
+
+        self.assertEqual(2, reassembler.get_stats()["pending"])
+        self.assertEqual(1, reassembler.get_stats()["evicted"])
+
+        sleep(0.1)
+        reassembler.add(split_datagram(bytes(3000), 3, 1024)[0], "2")
+
+        self.assertEqual(1, reassembler.get_stats()["pending"])
+        self.assertEqual(2, reassembler.get_stats()["expired"])
+
+    def test_flooding_sender_only_evicts_its_own_messages(self):
+        """
+        Test that the bounds apply to each sender and that past the total bound the sender keeping the most bytes is
+        evicted first.
+        """
+        datagram = Random(3).randbytes(3000)
+        fragments = split_datagram(datagram, 1, 1024)
+        reassembler = Reassembler(max_messages=2)
+
+        reassembler.add(fragments[0], "2")
+        for msg_id in range(10):
+            reassembler.add(split_datagram(bytes(3000), msg_id, 1024)[0], "3")
+
+        self.assertEqual({"pending": 3, "pending_senders": 2, "evicted": 8},
+                         dict((name, reassembler.get_stats()[name]) for name in ("pending", "pending_senders",
+                                                                                 "evicted")))
+        self.assertEqual(datagram, [reassembler.add(fragment, "2") for fragment in fragments[1:]][-1])
+
+        reassembler = Reassembler(max_total_bytes=2500)
+        for msg_id, sender_id in enumerate(["2", "3", "3"]):
+            reassembler.add(split_datagram(bytes(3000), msg_id, 1024)[0], sender_id)
+
+        self.assertEqual([("2", 0), ("3", 2)], list(reassembler.pending))
+        self.assertEqual(1, reassembler.get_stats()["evicted"])
+
+    def test_reassemble_from_reused_buffer(self):
+        """
+        Test that a datagram is rebuilt from fragments received one after the other into the same buffer.
+        """
+        datagram = Random(2).randbytes(5000)
+        reassembler = Reassembler()
+        buffer = bytearray(1024)
+        result = None
+
+        for fragment in split_datagram(datagram, 8, 1024):
+            buffer[:len(fragment)] = fragment
+            result = reassembler.add(memoryview(buffer)[:len(fragment)], "2")
+
+        self.assertEqual(datagram, result)
+
+
+class PeerDirectoryTest(unittest.TestCase):
+    """
+    Class for testing the directory of the processes, it doesn't need the docker containers.
+    """
+
+    def test_lookup_registers_unknown_clients(self):
+        """
+        Test that the senders are identified from their address and that the unknown clients are registered once.
+        """
+        peers = PeerDirectory({"1": "127.0.0.1", "2": "127.0.0.1"}, {"1": 8001, "2": 8002}, {"2": "12"}, 1)
+
+        self.assertEqual("2", peers.lookup(("127.0.0.1", 8002)))
+        self.assertEqual("1000", peers.lookup(("10.0.0.5", 9000)))
+        self.assertEqual("1001", peers.lookup(("10.0.0.6", 40000)))
+        self.assertEqual("1001", peers.lookup(("10.0.0.6", 40000)))
+        self.assertEqual("1", peers.get_key(1001))
+        self.assertEqual(("10.0.0.6", 40000), peers.get_address(1001))
+        self.assertEqual([2, 1000, 1001], peers.get_ids())
+
+
+    def test_client_sessions_are_bounded(self):
+        """
+        Test that the least recently seen and the idle clients are evicted and forgotten by the directory.
+        """
+        peers = PeerDirectory({"1": "127.0.0.1"}, {"1": 8001}, {}, 1,
+                              clients=ClientRegistry(max_clients=2, idle_timeout=0.05))
+        evicted = []
+        peers.clients.add_listener(evicted.append)
+
+        for port in (9000, 9001, 9000, 9002):
+            peers.lookup(("10.0.0.5", port))
+
+        self.assertEqual(["1001"], evicted)
+        self.assertFalse(peers.is_known(1001))
+        self.assertEqual([1000, 1002], peers.get_ids())
+
+        sleep(0.1)
+        peers.clients.expire()
+
+        self.assertEqual([], peers.get_ids())
+        self.assertEqual({"registered": 3, "evicted_lru": 1, "evicted_idle": 2, "live": 0, "memory": 0},
+                         peers.clients.get_stats())
+        self.assertEqual("1001", peers.lookup(("10.0.0.5", 9001)))
+
+    def test_planes_identify_their_senders(self):
+        """
+        Test that the replica port only accepts the known replicas and that the client port never gives a replica id.
+        """
+        peers = PeerDirectory({"1": "127.0.0.1", "2": "127.0.0.1"}, {"1": 8001, "2": 8002}, {"2": "12"}, 1)
+
+        self.assertEqual("2", peers.lookup_replica(("127.0.0.1", 8002)))
+        with self.assertRaises(ValueError):
+            peers.lookup_replica(("10.0.0.5", 9000))
+        self.assertEqual("1000", peers.lookup_client(("10.0.0.5", 9000)))
+        self.assertEqual("1001", peers.lookup_client(("10.0.0.6", 8002)))
+        self.assertEqual("1000", peers.lookup_client(("10.0.0.5", 9000)))
+        with self.assertRaises(ValueError):
+            peers.lookup_replica(("10.0.0.5", 9000))
+        self.assertEqual([2, 1000, 1001], peers.get_ids())
+
+    def test_clients_are_served_on_their_own_port(self):
+        """
+        Test that a replica receives the clients on the client port and answers them from it.
+        """
+        replica = Communication({"1": "127.0.0.1", "1000": "127.0.0.1"}, {"1": 0}, {}, 1, 8192, client_port=0)
+        client = Communication({"1": "127.0.0.1", "1000": "127.0.0.1"}, {"1": replica.client_port, "1000": 0},
+                               {"1": "1"}, 1000, 8192)
+
+        client.send(MessageComposer.compose_request_value("k"), 1)
+        message, sender_id = replica.receive(replica.client_sockets[0])
+        replica.send(MessageComposer.compose_output(MsgType.REQUEST_VALUE.value, 0, ("k", None)), sender_id)
+        answer, answer_sender = client.receive()
+        replica.close()
+        client.close()
+
+        self.assertEqual((MsgType.REQUEST_VALUE.value, "1000"), (message.type, sender_id))
+        self.assertEqual((MsgType.REQUEST_VALUE.value, "1"), (answer.type, answer_sender))
+        self.assertEqual(1, replica.get_stats()["client_buffers"]["allocated"])
+
+
+class AsyncCommunicationTest(unittest.TestCase):
+    """
+    Class for testing the asyncio transport of the communication on the local host.
+    """
+
+    def test_exchange_messages(self):
+        """
+        Test that two communications running in the same event loop exchange messages.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+        ports = {"1": 0, "2": 0}
+
+        async def exchange() -> list:
+            received = asyncio.Queue()
+            first = Communication(dict(hosts), dict(ports), {"2": "12"}, 1)
+            second = Communication(dict(hosts), dict(ports), {"1": "12"}, 2)
+            connect(first, second)
+            await first.start_async(lambda message, sender_id: received.put_nowait((message.o, sender_id)))
+            await second.start_async(lambda message, sender_id: second.send(message, int(sender_id)))
+
+            first.send(MessageComposer.compose_execute(1, ("a", 1)), 2)
+            result = await asyncio.wait_for(received.get(), 5)
+            first.close()
+            second.close()
+            return result
+
+        self.assertEqual((["a", 1], "2"), asyncio.run(exchange()))
+
+
+class ReceivePipelineTest(unittest.TestCase):
+    """
+    Class for testing the receive pipeline on the local host.
+    """
+
+    def test_messages_are_handed_off_in_order(self):
+        """
+        Test that the messages decoded by many threads are handed off in the order they were sent.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+        ports = {"1": 0, "2": 0}
+        sender = Communication(dict(hosts), dict(ports), {"2": "12"}, 1, 8192)
+        receiver = Communication(dict(hosts), dict(ports), {"1": "12"}, 2, 8192)
+        connect(sender, receiver)
+        received = []
+        pipeline = ReceivePipeline(receiver, lambda message, sender_id: received.append((message.c, sender_id)), 4)
+        thread = Thread(target=pipeline.run)
+        thread.start()
+
+        for config in range(100):
+            sender.send(MessageComposer.compose_execute(config, ("a", config)), 2)
+        for _ in range(500):
+            if len(received) == 100:
+                break
+            sleep(0.01)
+        receiver.close()
+        thread.join()
+        sender.close()
+
+        self.assertEqual([(config, "1") for config in range(100)], received)
+        self.assertEqual(100, receiver.get_stats()["pipeline"]["handed_off"])
+
+    def test_reuse_port_sockets_keep_the_order_of_each_sender(self):
+        """
+        Test that the messages of each sender are handed off in order when the port is drained by many sockets.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1", "3": "127.0.0.1"}
+        ports = {"1": 0, "2": 0, "3": 0}
+        senders = [Communication(dict(hosts), dict(ports), {"3": str(pid) + "3"}, pid, 8192) for pid in (1, 2)]
+        receiver = Communication(dict(hosts), dict(ports), {"1": "13", "2": "23"}, 3, 8192, receive_sockets=3,
+                                 receive_buffer_bytes=1 << 20)
+        connect(receiver, *senders)
+        bound = set(sock.getsockname()[1] for sock in receiver.sockets)
+        received = []
+        pipeline = ReceivePipeline(receiver, lambda message, sender_id: received.append((message.c, sender_id)), 2)
+        thread = Thread(target=pipeline.run)
+        thread.start()
+
+        for config in range(50):
+            for sender in senders:
+                sender.send(MessageComposer.compose_execute(config, ("a", config)), 3)
+        for _ in range(500):
+            if len(received) == 100:
+                break
+            sleep(0.01)
+        receiver.close()
+        thread.join()
+        for sender in senders:
+            sender.close()
+
+        for sender_id in ("1", "2"):
+            self.assertEqual(list(range(50)), [config for config, pid in received if pid == sender_id])
+        self.assertEqual(3, receiver.get_stats()["sockets"]["count"])
+        self.assertEqual({receiver.port}, bound)
+
+
+class SendQueuesTest(unittest.TestCase):
+    """
+    Class for testing the send queues of each peer.
+    """
+
+    def test_stale_messages_are_dropped_and_coalesced(self):
+        """
+        Test that the messages of a past sieve-config are dropped, that a NEW_SIEVE_CONFIG message replaces the older
+        ones and that a message is dropped when the queue of its peer is full.
+        """
+        gate = Event()
+        delivered = []
+
+        def deliver(outgoings: list, peer_id: int) -> None:
+            gate.wait()
+            delivered.extend((outgoing.message.type, outgoing.message.c) for outgoing in outgoings)
+
+        queues = SendQueues(deliver, 1, 3)
+
+        queues.put(Outgoing(MessageComposer.compose_execute(0, ("a", 0)), [2]))
+        for _ in range(500):
+            if not queues.get_stats()[2]["depth"]:
+                break
+            sleep(0.01)
+
+        queues.put(Outgoing(MessageComposer.compose_execute(0, ("a", 1)), [2]))
+        queues.put(Outgoing(MessageComposer.compose_new_sieve_config(1, 2), [2]))
+        queues.put(Outgoing(MessageComposer.compose_new_sieve_config(2, 3), [2]))
+        queues.set_config(1)
+        queues.put(Outgoing(MessageComposer.compose_approve(1, (1000, 2), "sign"), [2]))
+        queues.put(Outgoing(MessageComposer.compose_commit(1, (1000, 2)), [2]))
+        queues.put(Outgoing(MessageComposer.compose_request_value("a"), [2]))
+        gate.set()
+        queues.close()
+
+        self.assertEqual([(MsgType.EXECUTE.value, 0), (MsgType.NEW_SIEVE_CONFIG.value, 2),
+                          (MsgType.APPROVE.value, 1), (MsgType.COMMIT.value, 1)], delivered)
+        stats = queues.get_stats()[2]
+        self.assertEqual((4, 1, 1, 1), (stats["sent"], stats["coalesced"], stats["dropped_stale"],
+                                        stats["dropped_full"]))
+
+    def test_consensus_messages_survive_a_full_queue(self):
+        """
+        Test that a consensus message for a replica whose queue is full takes the place of the oldest message that is
+        not a consensus one, or is queued beyond the depth, while the other messages are dropped.
+        """
+        gate = Event()
+        delivered = []
+
+        def deliver(outgoings: list, peer_id: int) -> None:
+            gate.wait()
+            delivered.extend((peer_id, outgoing.message.type) for outgoing in outgoings)
+
+        queues = SendQueues(deliver, 1, 2)
+
+        queues.put(Outgoing(MessageComposer.compose_request_value("a"), [2]))
+        for _ in range(500):
+            if not queues.get_stats()[2]["depth"]:
+                break
+            sleep(0.01)
+
+        queues.put(Outgoing(MessageComposer.compose_request_value("b"), [2]))
+        queues.put(Outgoing(MessageComposer.compose_request_value("c"), [2]))
+        queues.put(Outgoing(MessageComposer.compose_execute(0, ("a", 0)), [2, CLIENT_PID]))
+        queues.put(Outgoing(MessageComposer.compose_approve(0, (1000, 1), "sign"), [2]))
+        queues.put(Outgoing(MessageComposer.compose_new_sieve_config(1, 3), [2]))
+        queues.put(Outgoing(MessageComposer.compose_request_value("d"), [2, CLIENT_PID]))
+        queues.put(Outgoing(MessageComposer.compose_commit(0, (1000, 1)), [CLIENT_PID]))
+        gate.set()
+        queues.close()
+
+        self.assertEqual([(2, MsgType.REQUEST_VALUE.value), (2, MsgType.EXECUTE.value), (2, MsgType.APPROVE.value),
+                          (2, MsgType.NEW_SIEVE_CONFIG.value)], [item for item in delivered if item[0] == 2])
+        self.assertEqual([(CLIENT_PID, MsgType.EXECUTE.value), (CLIENT_PID, MsgType.REQUEST_VALUE.value)],
+                         [item for item in delivered if item[0] == CLIENT_PID])
+        stats = queues.get_stats()
+        self.assertEqual((3, 1, 3), (stats[2]["dropped_full"], stats[2]["overflows"], stats[2]["max_depth"]))
+        self.assertEqual((1, 0), (stats[CLIENT_PID]["dropped_full"], stats[CLIENT_PID]["overflows"]))
+
+    def test_forgotten_peer_drops_its_messages(self):
+        """
+        Test that the messages queued for a forgotten peer are dropped for it and counted, the other receivers still
+        waiting for them.
+        """
+        gate = Event()
+        delivered = []
+        queues = SendQueues(lambda outgoing, peer_id: gate.wait() and delivered.append(peer_id), 1, 8)
+        broadcast = Outgoing(MessageComposer.compose_execute(0, ("a", 0)), [2, CLIENT_PID + 1], True)
+
+        # The worker waits on the first message, the next ones stay queued
+        queues.put(Outgoing(MessageComposer.compose_execute(0, ("a", 0)), [3]))
+        for _ in range(500):
+            if not queues.get_stats()[3]["depth"]:
+                break
+            sleep(0.01)
+        queues.put(broadcast)
+        queues.put(Outgoing(MessageComposer.compose_commit(0, (CLIENT_PID + 1, 0)), [CLIENT_PID + 1]))
+        queues.forget(str(CLIENT_PID + 1))
+        self.assertEqual(1, broadcast.remaining)
+        gate.set()
+        queues.close()
+
+        self.assertEqual([3, 2], delivered)
+        self.assertEqual({"peers": 1, "dropped": 2}, queues.get_evicted_stats())
+        self.assertEqual([2, 3], sorted(queues.get_stats().keys()))
+
+    def test_queued_messages_arrive_in_order(self):
+        """
+        Test that the messages queued by the send method are sent in order by the workers.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+        ports = {"1": 0, "2": 0}
+        sender = Communication(dict(hosts), dict(ports), {"2": "12"}, 1, 8192)
+        receiver = Communication(dict(hosts), dict(ports), {"1": "12"}, 2, 8192)
+        connect(sender, receiver)
+        sender.start_senders(2)
+        received = []
+
+        for config in range(50):
+            sender.send(MessageComposer.compose_execute(config, ("a", config)), 2)
+        while len(received) < 50:
+            message, sender_id = receiver.receive()
+            received.append((message.c, sender_id))
+        sender.close()
+        receiver.close()
+
+        self.assertEqual([(config, "1") for config in range(50)], received)
+        self.assertEqual(50, sender.get_stats()["outbound"][2]["sent"])
+
+    def test_batched_messages_arrive_in_order(self):
+        """
+        Test that the messages queued within the batch window are packed in a few datagrams and received in order.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+        ports = {"1": 0, "2": 0}
+        sender = Communication(dict(hosts), dict(ports), {"2": "12"}, 1, 8192)
+        receiver = Communication(dict(hosts), dict(ports), {"1": "12"}, 2, 8192)
+        connect(sender, receiver)
+        sender.start_senders(1, batch_window=0.05, batch_bytes=4096)
+        received = []
+
+        for config in range(40):
+            sender.send(MessageComposer.compose_execute(config, ("a", config)), 2)
+        while len(received) < 40:
+            message, sender_id = receiver.receive()
+            received.append((message.c, sender_id))
+        sender.close()
+        receiver.close()
+
+        self.assertEqual([(config, "1") for config in range(40)], received)
+        self.assertEqual(40, sender.get_stats()["batches_sent"]["messages"])
+        self.assertLess(sender.get_stats()["batches_sent"]["batches"], 10)
+
+    def test_group_key_broadcast_restarts_the_batch(self):
+        """
+        Test that a broadcast sealed with the group key flushes the batch and the next batch starts empty.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+        ports = {"1": 0, "2": 0}
+        sender = Communication(dict(hosts), dict(ports), {"2": "12"}, 1, 8192, group_key="g")
+        receiver = Communication(dict(hosts), dict(ports), {"1": "12"}, 2, 8192, group_key="g")
+        connect(sender, receiver)
+        # Five messages of 36 bytes and their length prefixes fill a batch
+        sender.start_senders(1, batch_window=0.05, batch_bytes=200)
+        outgoings = [Outgoing(MessageComposer.compose_execute(config, ("a", config)), [2])
+                     for config in range(10, 15)]
+        outgoings.append(Outgoing(MessageComposer.compose_execute(15, ("a", 15)), [2], broadcast=True))
+        outgoings += [Outgoing(MessageComposer.compose_execute(config, ("a", config)), [2])
+                      for config in range(16, 21)]
+        received = []
+
+        sender._Communication__deliver(outgoings, 2)
+        while len(received) < 11:
+            message, sender_id = receiver.receive()
+            received.append(message.c)
+        sender.close()
+        receiver.close()
+
+        self.assertEqual(list(range(10, 21)), received)
+        self.assertEqual({"batches": 2, "messages": 10}, sender.get_stats()["batches_sent"])
+
+    def test_lagging_replica_catches_up_over_pairwise_frames(self):
+        """
+        Test that a replica too many epochs behind to open the group broadcasts still receives the NEW_SIEVE_CONFIG
+        message, sent with the pairwise key, and opens the group broadcasts again once it moved to the new epoch.
+        """
+        hosts = {"1": "127.0.0.1", "2": "127.0.0.1"}
+        ports = {"1": 0, "2": 0}
+        sender = Communication(dict(hosts), dict(ports), {"2": "12"}, 1, 8192, group_key="g")
+        receiver = Communication(dict(hosts), dict(ports), {"1": "12"}, 2, 8192, group_key="g")
+        connect(sender, receiver)
+        sender.set_config(10)
+
+        sender.broadcast(MessageComposer.compose_execute(10, ("a", 10)))
+        dropped, _ = receiver.receive()
+        sender.broadcast(MessageComposer.compose_new_sieve_config(10, 1))
+        new_config, _ = receiver.receive()
+        receiver.set_config(new_config.c)
+        sender.broadcast(MessageComposer.compose_execute(10, ("a", 11)))
+        execute, sender_id = receiver.receive()
+        sender.close()
+        receiver.close()
+
+        self.assertIsNone(dropped)
+        self.assertEqual(MsgType.NEW_SIEVE_CONFIG.value, new_config.type)
+        self.assertEqual(10, receiver.group_epoch)
+        self.assertEqual((MsgType.EXECUTE.value, "1"), (execute.type, sender_id))
+
+
+class PriorityInboxTest(unittest.TestCase):
+    """
+    Class for testing the priority lanes of the inbox.
+    """
+
+    def test_consensus_messages_are_taken_first(self):
+        """
+        Test that the consensus messages are taken before the client ones, in the order they were received.
+        """
+        inbox = PriorityInbox()
+        inbox.put((MessageComposer.compose_request_value("k"), "100"))
+        inbox.put((MessageComposer.compose_client_invoke(("k", 0), (100, 1)), "100"))
+        inbox.put((MessageComposer.compose_execute(0, ("k", 0), (100, 1)), "1"))
+        inbox.put((MessageComposer.compose_commit(0, (100, 1)), "1"))
+
+        types = [inbox.get(timeout=1)[0].type for _ in range(4)]
+
+        self.assertEqual([MsgType.EXECUTE.value, MsgType.COMMIT.value, MsgType.CLIENT_INVOKE.value,
+                          MsgType.REQUEST_VALUE.value], types)
+        self.assertRaises(Empty, inbox.get_nowait)
+        self.assertRaises(Empty, inbox.get, timeout=0.01)
+
+    def test_waiting_lanes_are_not_starved(self):
+        """
+        Test that a lower lane is served after the burst of higher lane messages taken while it waits.
+        """
+        inbox = PriorityInbox(burst=3)
+        inbox.put((MessageComposer.compose_request_value("k"), "100"))
+        for config in range(6):
+            inbox.put((MessageComposer.compose_execute(config, ("k", config)), "1"))
+
+        types = [inbox.get_nowait()[0].type for _ in range(7)]
+
+        self.assertEqual(MsgType.REQUEST_VALUE.value, types[3])
+        stats = inbox.get_stats()
+        self.assertEqual((1, 1, 0), (stats["client_reads"]["handled"], stats["client_reads"]["promoted"],
+                                     stats["client_reads"]["depth"]))
+        self.assertEqual((6, 6), (stats["consensus"]["received"], stats["consensus"]["max_depth"]))
+
+    def test_client_lanes_are_bounded(self):
+        """
+        Test that a message is rejected when its lane is full, except for the consensus lane.
+        """
+        inbox = PriorityInbox(max_depth=2)
+
+        accepted = [inbox.put((MessageComposer.compose_client_invoke(("k", value), (100, value)), "100"))
+                    for value in range(3)]
+        accepted += [inbox.put((MessageComposer.compose_commit(config, (100, 0)), "1")) for config in range(3)]
+
+        self.assertEqual([True, True, False, True, True, True], accepted)
+        stats = inbox.get_stats()
+        self.assertEqual((2, 1), (stats["forwarding"]["depth"], stats["forwarding"]["rejected"]))
+        self.assertEqual((3, 0), (stats["consensus"]["depth"], stats["consensus"]["rejected"]))
+
+    def test_consensus_lane_is_bounded_for_each_replica(self):
+        """
+        Test that a replica flooding the consensus lane evicts its own oldest messages, not the ones of the others.
+        """
+        inbox = PriorityInbox(consensus_depth=2)
+
+        inbox.put((MessageComposer.compose_execute(0, ("k", 0)), "1"))
+        accepted = [inbox.put((MessageComposer.compose_approve(config, (1000, config), "sign"), "3"))
+                    for config in range(5)]
+        inbox.put((MessageComposer.compose_commit(0, (1000, 0)), "1"))
+
+        self.assertEqual([True] * 5, accepted)
+        self.assertEqual([("1", 0), ("3", 3), ("3", 4), ("1", 0)],
+                         [(sender_id, message.c) for message, sender_id in (inbox.get_nowait() for _ in range(4))])
+        stats = inbox.get_stats()["consensus"]
+        self.assertEqual((7, 3, 0, 4), (stats["received"], stats["evicted"], stats["depth"], stats["max_depth"]))
+
+        # The count of a replica starts again once its messages are taken
+        inbox.put((MessageComposer.compose_approve(5, (1000, 5), "sign"), "3"))
+        inbox.put((MessageComposer.compose_approve(6, (1000, 6), "sign"), "3"))
+        self.assertEqual(3, inbox.get_stats()["consensus"]["evicted"])
+
+    def test_client_messages_never_reach_the_consensus_lane(self):
+        """
+        Test that the consensus messages sent by a client are queued in the bounded last lane, after the replica ones.
+        """
+        inbox = PriorityInbox(max_depth=2)
+
+        accepted = [inbox.put((MessageComposer.compose_commit(config, (CLIENT_PID, 0)), str(CLIENT_PID)))
+                    for config in range(3)]
+        accepted.append(inbox.put((MessageComposer.compose_commit(3, (CLIENT_PID, 0)), "1")))
+
+        self.assertEqual([True, True, False, True], accepted)
+        self.assertEqual([3, 0, 1], [inbox.get_nowait()[0].c for _ in range(3)])
+        stats = inbox.get_stats()
+        self.assertEqual((1, 0), (stats["consensus"]["received"], stats["consensus"]["rejected"]))
+        self.assertEqual((2, 1), (stats["client_reads"]["received"], stats["client_reads"]["rejected"]))
+
+
+class TimerHeapTest(unittest.TestCase):
+    """
+    Class for testing the timers of the process.
+    """
+
+    def test_timers_fire_in_deadline_order(self):
+        """
+        Test that the due timers fire in the order of their deadline, skipping the cancelled and re-armed ones.
+        """
+        timers = TimerHeap()
+        fired = []
+        for key, deadline in (("a", 3.0), ("b", 1.0), ("c", 2.0), ("d", 5.0)):
+            timers.arm(key, deadline, lambda key=key: fired.append(key))
+        timers.cancel("c")
+        timers.arm("a", 0.5, lambda: fired.append("a"))
+
+        self.assertEqual(0.5, timers.next_deadline())
+        self.assertEqual(2, timers.run(now=4.0))
+        self.assertEqual(["a", "b"], fired)
+        self.assertEqual(5.0, timers.next_deadline())
+        self.assertFalse(timers.cancel("c"))
+        self.assertEqual((1, 2, 1), (len(timers), timers.get_stats()["fired"], timers.get_stats()["cancelled"]))
+
+    def test_wake_up_timer_and_rearm_from_callback(self):
+        """
+        Test that a timer without callback only fires, and that a callback can arm a timer run in the same call.
+        """
+        timers = TimerHeap()
+        fired = []
+        timers.arm("wake", 1.0)
+        timers.arm("first", 1.0, lambda: timers.arm("second", 1.5, lambda: fired.append("second")))
+
+        self.assertEqual(3, timers.run(now=2.0))
+        self.assertEqual(["second"], fired)
+        self.assertIsNone(timers.next_deadline())
+
+    def test_reschedule_moves_the_timers(self):
+        """
+        Test that rescheduling moves only the armed timers and drops the stale heap entries.
+        """
+        timers = TimerHeap()
+        for value in range(200):
+            timers.arm(("age", value), float(value))
+        timers.cancel(("age", 0))
+
+        timers.reschedule([("age", value) for value in range(201)], 500.0)
+
+        self.assertEqual(500.0, timers.next_deadline())
+        self.assertEqual(0, timers.run(now=499.0))
+        stats = timers.get_stats()
+        self.assertEqual((199, 199, 199), (stats["rescheduled"], stats["live"], stats["entries"]))
+        for value in range(1, 150):
+            timers.cancel(("age", value))
+        self.assertEqual(1, timers.get_stats()["compactions"])
+        self.assertEqual(50, timers.run(now=500.0))
+
+
+class OpQueueTest(unittest.TestCase):
+    """
+    Class for testing the operation queue.
+    """
+
+    def test_operations_keep_their_order(self):
+        """
+        Test that the operations are popped, indexed and aged in the order they were added.
+        """
+        queue = OpQueue()
+        for sequence in range(5):
+            queue.add((100 + sequence % 2, sequence))
+        queue.remove((100, 2))
+
+        self.assertEqual([(100, 0), (101, 1), (101, 3), (100, 4)], queue.get_queue())
+        self.assertEqual(((100, 0), (101, 3), (100, 4)), (queue.get_first(), queue.get(2), queue.get(-1)))
+        self.assertEqual(((100, 0), (101, 1), (101, 3)), (queue.get(-4), queue.get(1), queue.get(-2)))
+        self.assertRaises(IndexError, queue.get, 4)
+        self.assertRaises(IndexError, queue.get, -5)
+        ages = list(queue.get_ages().values())
+        self.assertEqual(sorted(ages), ages)
+        self.assertEqual(ages[0], queue.get_oldest_age())
+
+        self.assertEqual((100, 0), queue.pop_left())
+        self.assertEqual((3, 1, 2), (queue.size(), queue.count_client(100), queue.count_client(101)))
+        queue.reset_operations_ages()
+        self.assertEqual(1, len(set(queue.get_ages().values())))
+
+    def test_operations_are_tracked_by_id(self):
+        """
+        Test that an operation is queued once for each id, and that adding an id again moves it to the end.
+        """
+        queue = OpQueue()
+        queue.add((100, 1))
+        queue.add((101, 1))
+        queue.add((100, 1))
+
+        self.assertEqual((2, 1, 1), (queue.size(), queue.count_client(100), queue.count_client(101)))
+        self.assertEqual([(101, 1), (100, 1)], queue.get_queue())
+
+        queue.remove((100, 1))
+        self.assertFalse(queue.check_presence((100, 1)))
+        self.assertTrue(queue.check_presence((101, 1)))
+        queue.remove((101, 1))
+        self.assertTrue(queue.is_empty())
+        self.assertEqual((0, None), (queue.count_client(101), queue.get_oldest_age()))
+        self.assertRaises(KeyError, queue.remove, (101, 1))
+
+    def test_approves_are_matched_by_operation_id(self):
+        """
+        Test that the approves are counted by operation id, also when it is decoded as a list.
+        """
+        buffer = dict((pid, MessageComposer.compose_approve(1, (100, 1), "sign")) for pid in range(1, 4))
+        buffer[4] = decode_message(encode_message(MessageComposer.compose_approve(1, (100, 1), "sign"),
+                                                  WireFormat.BINARY))
+        buffer[5] = MessageComposer.compose_approve(1, (100, 2), "sign")
+        buffer[6] = MessageComposer.compose_approve(1, (100, 1), "other")
+
+        self.assertEqual([1, 2, 3, 4], list(check_approve(buffer, 1, (100, 1))))
+        self.assertEqual([5], list(check_approve(buffer, 1, (100, 2))))
+        self.assertEqual({}, check_approve(buffer, 2, (100, 1)))
+
+
+class SlotWindowTest(unittest.TestCase):
+    """
+    Class for testing the window of the slots in progress.
+    """
+
+    @staticmethod
+    def window_of(*keys) -> tuple:
+        """
+        Fill a window with a slot for each string of keys, numbered in order.
+
+        Parameters:
+            keys: keys of the operations of each slot, a string with more than one key for a batch
+
+        Returns:
+            tuple (window, slots)
+        """
+        window = SlotWindow(len(keys))
+        slots = [Slot(number, [(key, number) for key in key_set],
+                      [(100 + index, number) for index in range(len(key_set))]) for number, key_set in enumerate(keys)]
+        for slot in slots:
+            window.add(slot)
+        return window, slots
+
+    def test_slots_are_committed_in_order(self):
+        """
+        Test that a committed slot waits for the slots before it to be decided.
+        """
+        window, slots = self.window_of("a", "b", "c")
+        self.assertTrue(window.is_full())
+        self.assertIs(slots[2], window.last())
+
+        slots[1].s = slots[2].s = State.COMMIT
+        self.assertEqual([], window.pop_committed())
+        slots[0].s = State.COMMIT
+        self.assertEqual(slots, window.pop_committed())
+        self.assertEqual(0, len(window))
+        self.assertEqual({"opened": 3, "committed": 3, "aborted": 0, "max_in_flight": 3, "in_flight": 0},
+                         window.get_stats())
+
+    def test_abort_rolls_back_the_dependent_slots(self):
+        """
+        Test that aborting a slot removes the next slots on the same key only, and unblocks the committed ones.
+        """
+        window, slots = self.window_of("a", "b", "a", "c", "a")
+        slots[1].s = slots[3].s = State.COMMIT
+
+        self.assertEqual([slots[2], slots[4]], window.abort(slots[2]))
+        self.assertEqual([slots[0], slots[1], slots[3]], list(window))
+        self.assertNotIn((100, 4), window)
+
+        self.assertEqual([], window.pop_committed())
+        self.assertEqual([slots[0], slots[1], slots[3]], window.abort(slots[0]) + window.pop_committed())
+        self.assertEqual([], window.clear())
+
+    def test_abort_follows_the_keys_of_the_batches(self):
+        """
+        Test that a batch depends on the slots writing any of its keys, and that its operations are indexed.
+        """
+        window, slots = self.window_of("a", "ab", "b", "c")
+
+        self.assertIs(slots[1], window.get((101, 1)))
+        self.assertEqual([slots[0], slots[1], slots[2]], window.abort(slots[0]))
+        self.assertEqual([slots[3]], list(window))
+        self.assertNotIn((101, 1), window)
+
+    def test_batch_operations_are_decided_one_by_one(self):
+        """
+        Test that an operation of a batch is committed when more than f approves agree on it, independently of the
+        other operations, and that a process applies its response only if it is the approved one.
+        """
+        ops, own = [("a", 1), ("b", 2)], [("a", 1), ("b", "FAULTY")]
+        slot = Slot(0, ops, [(100, 1), (100, 2)])
+        slot.r = own
+        buffer = dict((pid, MessageComposer.compose_approve(1, (100, 1), [signp(op) for op in ops]))
+                      for pid in range(1, 4))
+        buffer[4] = MessageComposer.compose_approve(1, (100, 1), slot.sign())
+        buffer[5] = MessageComposer.compose_approve(1, (100, 1), [signp(("a", 1)), signp(("b", "other"))])
+
+        signs = check_approve_batch(buffer, 1, (100, 1), 2, 2)
+        self.assertEqual([signp(op) for op in ops], signs)
+        self.assertEqual([signp(("a", 1)), None], check_approve_batch(buffer, 1, (100, 1), 2, 3))
+        self.assertTrue(check_validation_batch(buffer, signs, ops, True, 2))
+        self.assertFalse(check_validation_batch(buffer, signs, own, True, 2))
+        self.assertFalse(check_validation_batch(buffer, [None, None], ops, True, 2))
+
+        slot.signs = signs
+        slot.last_order = MessageComposer.compose_order(MsgType.CONFIRM.value, 1, (100, 1), State.COMMIT.value,
+                                                        list(ops), buffer)
+        self.assertTrue(slot.diverged())
+        self.assertEqual(ops, slot.responses(4))
+        slot.signs = [signs[0], None]
+        self.assertEqual([("a", 1), None], slot.responses(4))
+
+
+class ProcessTest(unittest.TestCase):
+    """
+    Class for testing the logics of a process on the local host, without the other replicas.
+    """
+
+    @staticmethod
+    def process_class() -> type:
+        """
+        Import the process with the configuration of a replica of a cluster of 4, if the environment doesn't give one.
+
+        Returns:
+            the Process class
+        """
+        n_processes = int(os.environ.setdefault("N_PROCESSES", "4"))
+        for name, value in (("PROCESS_ID", "2"), ("BUFFER_SIZE", "8192"), ("FAULTY", "0")):
+            os.environ.setdefault(name, value)
+        for pid in range(1, n_processes + 1):
+            os.environ.setdefault("KEY" + str(pid), "key")
+        return importlib.import_module("process").Process
+
+    def test_aborted_operation_is_invoked_on_the_next_leader(self):
+        """
+        Test that an operation queued by a replica, aborted while the replica is the leader, is still invoked when
+        the replica is a follower again.
+        """
+        hosts = dict((str(pid), "127.0.0.1") for pid in range(1, 5))
+        # The other replicas are sockets bound to ports assigned by the kernel, the messages sent to them are ignored
+        others = dict((str(pid), open_socket(("127.0.0.1", 0))) for pid in (1, 3, 4))
+        ports = dict((pid, sock.getsockname()[1]) for pid, sock in others.items())
+        ports["2"] = 0
+        keys = dict((str(pid), "2" + str(pid)) for pid in (1, 3, 4))
+        process = self.process_class()(2, hosts, ports, keys, 0, client_port=0)
+        op_id = (1000, 1)
+
+        try:
+            process._Process__rsm_execute(["a", 1], op_id)
+
+            # The replica is the leader of the next epoch and executes the operation from the inherited buffer
+            process.next_epoch, process.next_leader = 1, 2
+            process.B, process.buffer_queue = {2: op_id}, [2]
+            process._Process__start_epoch()
+            process._Process__advance()
+            slot = process.slots.get(op_id)
+            self.assertIsNotNone(slot)
+
+            # The operation is aborted by a complaint, then the replica is a follower again
+            process._Process__abort(slot, True)
+            process.next_epoch, process.next_leader = 2, 3
+            process._Process__start_epoch()
+
+            self.assertEqual((2, 3, State.S0), (process.config, process.leader, process.s))
+            self.assertTrue(process.I.check_presence(op_id))
+            self.assertEqual(["a", 1], process.requests[op_id])
+            process._Process__invoke_operations()
+            process.timers.run(float("inf"))
+        finally:
+            process.close()
+            for sock in others.values():
+                sock.close()
+
+
+    def test_new_leader_is_any_other_replica(self):
+        """
+        Test that a leader starting a new sieve-config chooses any other replica as the next leader, the last one
+        included, and never itself or a client.
+        """
+        hosts = dict((str(pid), "127.0.0.1") for pid in range(1, 5))
+        ports = dict((str(pid), 0) for pid in range(1, 5))
+        keys = dict((str(pid), "2" + str(pid)) for pid in (1, 3, 4))
+        process = self.process_class()(2, hosts, ports, keys, 0, client_port=0)
+        process.communication.peers.register(str(CLIENT_PID), ("127.0.0.1", 0), "2")
+        leaders = set()
+
+        try:
+            for _ in range(200):
+                process.leader = process.pid
+                process._Process__choose_new_leader()
+                leaders.add(process.next_leader)
+        finally:
+            process.close()
+
+        self.assertEqual({1, 3, 4}, leaders)
+        self.assertEqual(process.config + 1, process.next_epoch)
+
+    def test_event_loop_wakes_up_on_timers_and_messages(self):
+        """
+        Test that the loop of the process, blocked without messages, wakes up when a timer is due and when a message
+        arrives before the next timer.
+        """
+        hosts = dict((str(pid), "127.0.0.1") for pid in range(1, 5))
+        ports = dict((str(pid), 0) for pid in range(1, 5))
+        keys = dict((str(pid), "2" + str(pid)) for pid in (1, 3, 4))
+        process = self.process_class()(2, hosts, ports, keys, 0, client_port=0)
+        fired = []
+        start = monotonic()
+        process.timers.arm("first", start + 0.1, lambda: fired.append(monotonic()))
+        process.timers.arm("second", start + 30, lambda: fired.append(monotonic()))
+        runner = Thread(target=process.run, daemon=True)
+        runner.start()
+
+        try:
+            sleep(0.5)
+            self.assertEqual(1, len(fired))
+            self.assertGreaterEqual(fired[0], start + 0.1)
+            self.assertTrue(runner.is_alive())
+
+            # The loop waits for the second timer, the message wakes it up before
+            process._Process__queue(Message(type=MsgType.CLOSE.value), "1")
+            runner.join(2)
+
+            self.assertFalse(runner.is_alive())
+            self.assertEqual(1, len(fired))
+            self.assertEqual((False, True), ("first" in process.timers, "second" in process.timers))
+        finally:
+            if runner.is_alive():
+                process._Process__queue(Message(type=MsgType.CLOSE.value), "1")
+                runner.join(2)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+#!/bin/bash
+
+from threading import Lock
+
+MAX_FREE_BUFFERS = 64  # max number of released receive buffers kept for reuse
+
+
+class BufferPool:
+    """
+    Class keeping preallocated buffers the datagrams are received into, so that receiving a datagram doesn't allocate
+    a new bytes object. A buffer must be released once the message it contains has been parsed, the views of it are
+    not valid anymore after that.
+
+    Attributes:
+        buffer_size (int): size of each buffer
+        max_free (int): max number of released buffers kept for reuse, the others are left to the garbage collector
+        free (list): released buffers ready to be reused
+        stats (dict): counters of the buffers allocated and reused, of the buffers in use and the max number reached
+    """
+
+    def __init__(self, buffer_size: int, max_free: int = MAX_FREE_BUFFERS):
+        """
+        Initialize the buffer pool.
+
+        Parameters:
+            buffer_size: size of each buffer
+            max_free: max number of released buffers kept for reuse
+        """
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self.free = []
+        self.stats = {
+            "allocated": 0,
+            "reused": 0,
+            "in_use": 0,
+            "max_in_use": 0
+        }
+        self.lock = Lock()
+
+    def acquire(self) -> bytearray:
+        """
+        Get a free buffer, allocating it if none is free.
+
+        Returns:
+            the buffer
+        """
+
+        with self.lock:
+            self.stats["in_use"] += 1
+            self.stats["max_in_use"] = max(self.stats["max_in_use"], self.stats["in_use"])
+            if self.free:
+                self.stats["reused"] += 1
+                return self.free.pop()
+            self.stats["allocated"] += 1
+
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray) -> None:
+        """
+        Give a buffer back to the pool.
+
+        Parameters:
+            buffer: buffer got from acquire
+        """
+
+        with self.lock:
+            self.stats["in_use"] -= 1
+            if len(self.free) < self.max_free:
+                self.free.append(buffer)
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the buffer pool.
+
+        Returns:
+            dictionary containing the counters and the number of free buffers
+        """
+
+        with self.lock:
+            return dict(self.stats, free=len(self.free))
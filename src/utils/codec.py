@@ -0,0 +1,435 @@
+#!/bin/bash
+
+import json
+import struct
+from collections.abc import Mapping, Sequence
+from enum import Enum
+
+from utils.msg import Message, LazyMessageSet, LazyLeaderBuffer, FIELD_NAMES, marshall_message, unmarshall_message, \
+    decode_leader_buffer
+from utils.msg_variables import MsgKey
+
+BINARY_VERSION = 0xB1  # first byte of the binary format, version 1 (a json message always starts with "{")
+BATCH_VERSION = 0xBA  # first byte of a batch of serialized messages, version 1
+JSON_START = ord("{")
+MAX_VARINT_SIZE = 12  # max number of bytes of a varint, enough for the integers of 83 bits and their sign
+MAX_DEPTH = 32  # max nesting level of the lists, dictionaries and messages of a value
+
+# The field tag is the position of the message key in MsgKey
+FIELD_TAGS = tuple((tag, FIELD_NAMES[key]) for tag, key in enumerate(MsgKey))
+TAG_FIELDS = dict(FIELD_TAGS)
+MSG_SET_TAG = list(MsgKey).index(MsgKey.MSG_SET)
+LEADER_BUFFER_TAG = list(MsgKey).index(MsgKey.LEADER_BUFFER)
+
+# Value types
+NONE = 0
+FALSE = 1
+TRUE = 2
+INT = 3  # zigzag varint
+FLOAT = 4  # 8 bytes double
+STR = 5  # varint length + utf-8 bytes
+LIST = 6  # varint count + values
+DICT = 7  # varint count + (key, value) pairs, keys are converted to str as in json
+MESSAGE = 8  # varint length + binary message without version byte
+
+DOUBLE = struct.Struct(">d")
+
+
+class WireFormat(Enum):
+    """
+    Enum representing the format used to serialize the messages on the wire.
+    """
+
+    JSON = "json"  # human-readable, useful for debugging
+    BINARY = "binary"  # compact tagged format
+
+
+def json_key(key) -> str:
+    """
+    Convert a dictionary key as json does.
+
+    Parameters:
+        key: key to convert
+
+    Returns:
+        the key converted to str
+    """
+
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, (int, float)):
+        return json.dumps(key)
+    raise TypeError(f"Keys must be str, int, float, bool or None, not {type(key).__name__}")
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    """
+    Write a non-negative integer as varint.
+
+    Parameters:
+        buffer: buffer to write into
+        value: value to write
+    """
+
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, index: int) -> tuple:
+    """
+    Read a varint.
+
+    Parameters:
+        data: buffer to read from
+        index: position of the varint
+
+    Returns:
+        tuple (value, index) where index is the position after the varint
+
+    Raises:
+        ValueError: if the varint is longer than MAX_VARINT_SIZE bytes
+    """
+
+    value = 0
+    for shift in range(0, 7 * MAX_VARINT_SIZE, 7):
+        byte = data[index]
+        index += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, index
+    raise ValueError("Varint too long")
+
+
+def read_size(data, index: int, item_size: int = 1) -> tuple:
+    """
+    Read the varint length or count of a value, checking that the rest of the buffer can hold it.
+
+    Parameters:
+        data: buffer to read from
+        index: position of the varint
+        item_size: min number of bytes of each item counted
+
+    Returns:
+        tuple (size, index) where index is the position after the varint
+
+    Raises:
+        ValueError: if the buffer is too short for the size read
+    """
+
+    size, index = read_varint(data, index)
+    if size * item_size > len(data) - index:
+        raise ValueError("Truncated value")
+    return size, index
+
+
+def write_value(buffer: bytearray, value) -> None:
+    """
+    Write a value with its type.
+
+    Parameters:
+        buffer: buffer to write into
+        value: value to write
+    """
+
+    if value is None:
+        buffer.append(NONE)
+    elif value is True:
+        buffer.append(TRUE)
+    elif value is False:
+        buffer.append(FALSE)
+    elif isinstance(value, int):
+        buffer.append(INT)
+        write_varint(buffer, value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif isinstance(value, str):
+        encoded = value.encode()
+        buffer.append(STR)
+        write_varint(buffer, len(encoded))
+        buffer += encoded
+    elif isinstance(value, (list, tuple)):
+        buffer.append(LIST)
+        write_varint(buffer, len(value))
+        for item in value:
+            write_value(buffer, item)
+    elif isinstance(value, dict):
+        buffer.append(DICT)
+        write_varint(buffer, len(value))
+        for key, item in value.items():
+            write_value(buffer, json_key(key))
+            write_value(buffer, item)
+    elif isinstance(value, Message):
+        encoded = bytearray()
+        write_fields(encoded, value)
+        buffer.append(MESSAGE)
+        write_varint(buffer, len(encoded))
+        buffer += encoded
+    elif isinstance(value, float):
+        buffer.append(FLOAT)
+        buffer += DOUBLE.pack(value)
+    elif isinstance(value, Mapping):
+        write_value(buffer, dict(value.items()))
+    elif isinstance(value, Sequence):
+        write_value(buffer, list(value))
+    else:
+        raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def read_value(data, index: int, depth: int = 0) -> tuple:
+    """
+    Read a value with its type.
+
+    Parameters:
+        data: buffer to read from
+        index: position of the value
+        depth: nesting level of the value
+
+    Returns:
+        tuple (value, index) where index is the position after the value
+
+    Raises:
+        ValueError: if the value is malformed, truncated or nested deeper than MAX_DEPTH
+    """
+
+    if depth > MAX_DEPTH:
+        raise ValueError("Value nested too deep")
+
+    value_type = data[index]
+    index += 1
+
+    if value_type == STR:
+        length, index = read_size(data, index)
+        return str(data[index:index + length], "utf-8"), index + length
+    if value_type == INT:
+        value, index = read_varint(data, index)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), index
+    if value_type == LIST:
+        count, index = read_size(data, index)
+        items = []
+        for _ in range(count):
+            item, index = read_value(data, index, depth + 1)
+            items.append(item)
+        return items, index
+    if value_type == NONE:
+        return None, index
+    if value_type == TRUE:
+        return True, index
+    if value_type == FALSE:
+        return False, index
+    if value_type == DICT:
+        count, index = read_size(data, index, 2)
+        items = {}
+        for _ in range(count):
+            key, index = read_value(data, index, depth + 1)
+            items[key], index = read_value(data, index, depth + 1)
+        return items, index
+    if value_type == MESSAGE:
+        length, index = read_size(data, index)
+        return read_fields(data, index, index + length, depth + 1), index + length
+    if value_type == FLOAT:
+        return DOUBLE.unpack_from(data, index)[0], index + DOUBLE.size
+    raise ValueError(f"Unknown value type {value_type}")
+
+
+def write_fields(buffer: bytearray, message: Message) -> None:
+    """
+    Write the fields of the message that are not None. Each field is written as tag, varint length and value, so that
+    unknown fields can be skipped.
+
+    Parameters:
+        buffer: buffer to write into
+        message: message to write
+    """
+
+    for tag, name in FIELD_TAGS:
+        value = getattr(message, name)
+        if value is None:
+            continue
+        encoded = bytearray()
+        write_value(encoded, value)
+        buffer.append(tag)
+        write_varint(buffer, len(encoded))
+        buffer += encoded
+
+
+def read_fields(data, index: int, end: int, depth: int = 0) -> Message:
+    """
+    Read the fields of a message.
+
+    Parameters:
+        data: buffer to read from
+        index: position of the first field
+        end: position after the last field
+        depth: nesting level of the message
+
+    Returns:
+        the message
+
+    Raises:
+        ValueError: if the message is malformed or truncated
+    """
+
+    message = Message()
+
+    while index < end:
+        tag = data[index]
+        length, index = read_size(data, index + 1)
+        name = TAG_FIELDS.get(tag)
+        if tag == MSG_SET_TAG:
+            message.msg_set = read_msg_set(data, index)
+        elif tag == LEADER_BUFFER_TAG:
+            message.leader_buffer = LazyLeaderBuffer(data[index:index + length], decode_raw_leader_buffer)
+        elif name is not None:
+            setattr(message, name, read_value(data, index, depth)[0])
+        index += length
+
+    if index != end:
+        raise ValueError("Truncated message")
+
+    return message
+
+
+def read_msg_set(data, index: int) -> LazyMessageSet:
+    """
+    Read a set of messages without decoding the messages it contains.
+
+    Parameters:
+        data: buffer to read from
+        index: position of the set
+
+    Returns:
+        the lazy message set
+    """
+
+    if data[index] != DICT:
+        raise ValueError(f"Unexpected value type {data[index]} for the set of messages")
+
+    count, index = read_size(data, index + 1, 2)
+    raw_messages = {}
+    messages = {}
+    for _ in range(count):
+        pid, index = read_value(data, index)
+        if data[index] == MESSAGE:
+            length, index = read_size(data, index + 1)
+            raw_messages[pid] = data[index:index + length]
+            index += length
+        else:
+            raw_messages[pid] = None
+            messages[pid], index = read_value(data, index)
+
+    return LazyMessageSet(raw_messages, decode_raw_message, messages)
+
+
+def decode_raw_message(data) -> Message:
+    """
+    Decode a nested message, encoded without version byte.
+
+    Parameters:
+        data: encoded message
+
+    Returns:
+        the message
+    """
+
+    return read_fields(data, 0, len(data))
+
+
+def decode_raw_leader_buffer(data) -> list:
+    """
+    Decode an encoded leader buffer.
+
+    Parameters:
+        data: encoded leader buffer
+
+    Returns:
+        the leader buffer
+    """
+
+    return decode_leader_buffer(read_value(data, 0)[0])
+
+
+def encode_message(message: Message, wire_format: WireFormat = WireFormat.JSON) -> bytes:
+    """
+    Serialize the message.
+
+    Parameters:
+        message: message to serialize
+        wire_format: format to use
+
+    Returns:
+        the serialized message
+    """
+
+    if wire_format == WireFormat.JSON:
+        return json.dumps(marshall_message(message)).encode()
+
+    buffer = bytearray((BINARY_VERSION,))
+    write_fields(buffer, message)
+    return bytes(buffer)
+
+
+def decode_message(data) -> Message:
+    """
+    Deserialize the message, detecting its format from the first byte.
+
+    Parameters:
+        data: serialized message
+
+    Returns:
+        the message
+    """
+
+    if not data:
+        raise ValueError("Empty message")
+    if data[0] == JSON_START:
+        return unmarshall_message(json.loads(data))
+    if data[0] == BINARY_VERSION:
+        return read_fields(data, 1, len(data))
+    raise ValueError(f"Unknown message format {data[0]}")
+
+
+def encode_batch(parts: list) -> bytes:
+    """
+    Pack many serialized messages in a single batch, each one prefixed by its varint length.
+
+    Parameters:
+        parts: serialized messages, in any wire format
+
+    Returns:
+        the serialized batch
+    """
+
+    buffer = bytearray((BATCH_VERSION,))
+    for part in parts:
+        write_varint(buffer, len(part))
+        buffer += part
+    return bytes(buffer)
+
+
+def decode_messages(data) -> list:
+    """
+    Deserialize a message, or all the messages of a batch.
+
+    Parameters:
+        data: serialized message or batch
+
+    Returns:
+        the list of messages, in the order they were packed
+    """
+
+    if not data or data[0] != BATCH_VERSION:
+        return [decode_message(data)]
+
+    messages = []
+    index = 1
+    while index < len(data):
+        length, index = read_size(data, index)
+        messages.append(decode_message(data[index:index + length]))
+        index += length
+    return messages
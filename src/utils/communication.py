@@ -1,14 +1,337 @@
 #!/bin/bash
 
+import asyncio
 import json
+import os
 import socket
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from queue import Queue
+from threading import Lock, Thread
+from time import perf_counter
 
-from Crypto.Cipher import AES
+from Crypto.Cipher import AES, ChaCha20_Poly1305
 from Crypto.Protocol.KDF import PBKDF2
 from Crypto.Util.Padding import pad, unpad
 
 from gui.client_config import CLIENT_PID
-from utils.msg import Message, marshall_message, unmarshall_message
+from utils.buffers import BufferPool
+from utils.codec import WireFormat, encode_message, decode_messages, encode_batch, read_varint, write_varint
+from utils.compression import Compressor
+from utils.fragmentation import Reassembler, split_datagram, MAX_UDP_PAYLOAD
+from utils.msg import Message
+from utils.msg_variables import FrameKind, MsgType
+from utils.outbound import Outgoing, SendQueues, SEND_WORKERS, SEND_QUEUE_DEPTH, SEND_BATCH_WINDOW
+from utils.peers import PeerDirectory, ClientRegistry, MAX_CLIENTS, CLIENT_IDLE_TIMEOUT
+
+KEY_CACHE_SIZE = 256  # max number of derived keys kept in memory
+KEY_PREWARM_WORKERS = 8  # max number of threads used to derive the keys at startup
+NONCE_SIZE = 12  # size of the random AEAD nonce of each datagram
+TAG_SIZE = 16  # size of the AEAD authentication tag
+GROUP_EPOCH_WINDOW = 4  # max distance between the local epoch and the epoch of an accepted group key
+PAIRWISE_TYPES = {MsgType.NEW_SIEVE_CONFIG.value}  # broadcasts changing the epoch, never sent with the group key
+UDP_STATS_PATH = "/proc/net/udp"  # kernel counters of the IPv4 UDP sockets, only on Linux
+
+
+class CipherMode(Enum):
+    """
+    Enum representing the encryption mode used on the wire.
+    """
+
+    CBC = "cbc"  # AES-CBC with PKCS7 padding, no authentication
+    GCM = "gcm"  # AES-GCM authenticated encryption
+    CHACHA20 = "chacha20"  # ChaCha20-Poly1305 authenticated encryption
+
+
+class WireCipher:
+    """
+    Class encrypting and decrypting the datagrams with the selected cipher mode.
+
+    In the authenticated modes each datagram has its own random nonce of 96 bits. A key is shared by all the processes
+    sending to the same peer, the clients included, so a nonce made of a counter would be reused by two senders with
+    the same key, while the chance that two random nonces collide stays negligible below 2^32 datagrams under a key.
+    Forged or corrupted datagrams are rejected when the tag is verified, before the payload is parsed.
+
+    Attributes:
+        mode (CipherMode): encryption mode
+        key_length (int): length of the keys required by the cipher
+        rejected (int): number of datagrams that failed decryption or authentication
+    """
+
+    def __init__(self, mode: CipherMode = CipherMode.CBC):
+        """
+        Initialize the cipher.
+
+        Parameters:
+            mode: encryption mode
+        """
+        self.mode = mode
+        self.key_length = 32 if mode == CipherMode.CHACHA20 else 16
+        self.rejected = 0
+        self.lock = Lock()
+
+    def __new_aead(self, key: bytes, nonce: bytes):
+        """
+        Create the authenticated cipher for the given key and nonce.
+
+        Parameters:
+            key: key to use
+            nonce: nonce to use
+
+        Returns:
+            the cipher object
+        """
+
+        if self.mode == CipherMode.GCM:
+            return AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+        return ChaCha20_Poly1305.new(key=key, nonce=nonce)
+
+    def encrypt(self, plaintext: bytes, key: bytes) -> bytes:
+        """
+        Encrypt the plaintext with the key.
+
+        Parameters:
+            plaintext: data to encrypt
+            key: derived key to use for the encryption
+
+        Returns:
+            the encrypted data, prefixed by the iv or nonce
+        """
+
+        if self.mode == CipherMode.CBC:
+            cipher = AES.new(key, AES.MODE_CBC)
+            return cipher.iv + cipher.encrypt(pad(plaintext, AES.block_size))
+
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext, tag = self.__new_aead(key, nonce).encrypt_and_digest(plaintext)
+        return nonce + ciphertext + tag
+
+    def decrypt(self, data: bytes, key: bytes) -> bytes:
+        """
+        Decrypt the data with the key.
+
+        Parameters:
+            data: data to decrypt
+            key: derived key to use for the decryption
+
+        Returns:
+            the plaintext, or None if the data is corrupted or forged
+        """
+
+        try:
+            if self.mode == CipherMode.CBC:
+                cipher = AES.new(key, AES.MODE_CBC, data[:AES.block_size])
+                return unpad(cipher.decrypt(data[AES.block_size:]), AES.block_size)
+
+            if len(data) < NONCE_SIZE + TAG_SIZE:
+                raise ValueError("Datagram too short")
+            return self.__new_aead(key, data[:NONCE_SIZE]).decrypt_and_verify(data[NONCE_SIZE:-TAG_SIZE],
+                                                                                data[-TAG_SIZE:])
+        except ValueError:
+            with self.lock:
+                self.rejected += 1
+            return None
+
+    def overhead(self, plaintext_size: int) -> int:
+        """
+        Get the number of bytes added by the encryption to a plaintext.
+
+        Parameters:
+            plaintext_size: size of the plaintext
+
+        Returns:
+            the number of bytes added
+        """
+
+        if self.mode == CipherMode.CBC:
+            return AES.block_size + (AES.block_size - plaintext_size % AES.block_size)
+        return NONCE_SIZE + TAG_SIZE
+
+
+class KeyManager:
+    """
+    Class deriving the crypto keys from the base keys and caching them, so that the PBKDF2 derivation is executed only
+    once for each peer instead of once for each message.
+
+    Attributes:
+        salt (bytes): salt used for the derivation
+        iterations (int): number of iterations used for the derivation
+        key_length (int): length of the derived keys
+        max_size (int): max number of derived keys kept in the cache
+        cache (OrderedDict): derived keys indexed by base key, in least recently used order
+        hits (int): number of lookups served by the cache
+        misses (int): number of lookups that required a derivation
+        evictions (int): number of keys removed from the cache because it was full
+        derivation_time (float): total time spent deriving keys, in seconds
+    """
+
+    def __init__(self, salt: bytes = b"12345678", iterations: int = 100000, key_length: int = 16,
+                 max_size: int = KEY_CACHE_SIZE):
+        """
+        Initialize the key manager.
+
+        Parameters:
+            salt: salt to use for the derivation
+            iterations: number of iterations to use for the derivation
+            key_length: length of the key to derive
+            max_size: max number of derived keys kept in the cache
+        """
+        self.salt = salt
+        self.iterations = iterations
+        self.key_length = key_length
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.derivation_time = 0.0
+        self.lock = Lock()
+
+    def __derive_key(self, base_key: str) -> bytes:
+        """
+        Derive the key from the given base key.
+
+        Parameters:
+            base_key: base key to derive the key from
+
+        Returns:
+            new key derived from the base key
+        """
+
+        start = perf_counter()
+        key = PBKDF2(base_key, self.salt, self.key_length, self.iterations)
+        elapsed = perf_counter() - start
+
+        with self.lock:
+            self.derivation_time += elapsed
+
+        return key
+
+    def __store(self, base_key: str, key: bytes) -> None:
+        """
+        Store a derived key in the cache, evicting the least recently used one if the cache is full.
+
+        Parameters:
+            base_key: base key the key was derived from
+            key: derived key
+        """
+
+        with self.lock:
+            self.cache[base_key] = key
+            self.cache.move_to_end(base_key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, base_key: str) -> bytes:
+        """
+        Get the key derived from the base key, deriving it on first use.
+
+        Parameters:
+            base_key: base key to derive the key from
+
+        Returns:
+            the derived key
+        """
+
+        with self.lock:
+            key = self.cache.get(base_key)
+            if key is not None:
+                self.cache.move_to_end(base_key)
+                self.hits += 1
+                return key
+            self.misses += 1
+
+        key = self.__derive_key(base_key)
+        self.__store(base_key, key)
+        return key
+
+    def prewarm(self, base_keys, workers: int = KEY_PREWARM_WORKERS) -> None:
+        """
+        Derive in parallel all the given base keys that are not cached yet.
+
+        Parameters:
+            base_keys: iterable of base keys to derive
+            workers: max number of threads to use
+        """
+
+        with self.lock:
+            missing = [base_key for base_key in set(base_keys) if base_key not in self.cache]
+
+        if not missing:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            for base_key, key in zip(missing, executor.map(self.__derive_key, missing)):
+                self.__store(base_key, key)
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the key manager.
+
+        Returns:
+            dictionary containing the cache hits, misses, evictions, size and the total derivation time
+        """
+
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.cache),
+                "derivation_time": self.derivation_time
+            }
+
+
+def open_socket(address: tuple, reuse_port: bool = False, receive_buffer_bytes: int = 0,
+                send_buffer_bytes: int = 0) -> socket.socket:
+    """
+    Open a datagram socket bound to the address.
+
+    Parameters:
+        address: (host, port) to bind
+        reuse_port: whether other sockets can be bound to the same port, the kernel spreads the senders over them
+        receive_buffer_bytes: size of the kernel receive buffer, 0 for the system default
+        send_buffer_bytes: size of the kernel send buffer, 0 for the system default
+
+    Returns:
+        the bound socket
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if receive_buffer_bytes:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_bytes)
+    if send_buffer_bytes:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer_bytes)
+    sock.bind(address)
+    return sock
+
+
+def kernel_drops(sockets: list) -> int:
+    """
+    Get the number of datagrams dropped by the kernel because the receive buffers of the sockets were full. The
+    counters are read from /proc/net/udp, matching the sockets by inode.
+
+    Parameters:
+        sockets: sockets to check
+
+    Returns:
+        the number of dropped datagrams, None if the platform doesn't expose the counters
+    """
+
+    try:
+        inodes = set(os.fstat(sock.fileno()).st_ino for sock in sockets)
+        with open(UDP_STATS_PATH) as stats:
+            lines = stats.readlines()[1:]
+    except (OSError, ValueError):
+        return None
+
+    # The inode is the 10th column and the drops the 13th, each socket of the port has its own line
+    return sum(int(columns[12]) for columns in (line.split() for line in lines)
+               if len(columns) > 12 and int(columns[9]) in inodes)
 
 
 class Communication:
@@ -19,16 +342,44 @@ class Communication:
     Attributes:
         pid (int): process id of the current process
         host (str): ip address of the current process
-        port (int): port of the current process
+        port (int): port of the current process, the one assigned by the system if 0 was given
         buffer_size (int): size of the communication buffer
-        hosts_dict : dictionary that contains the process id as key and the ip address as value
-        ports_dict: dictionary that contains the process id as key and the port as value
-        keys_dict: dictionary that contains the process id as key and the crypto key as value
+        peers: directory of the addresses and of the crypto keys of the known processes
         n_processes: number of processes
+        key_manager: cache of the keys derived from the crypto keys
+        cipher: cipher used to encrypt and decrypt the datagrams
+        wire_format: format used to serialize the messages
+        group_key: secret shared by the replicas to derive the group keys, None if the group broadcast is disabled
+        group_epoch: epoch of the group key currently used for the broadcasts
+        prewarm_epochs: queue of the epochs whose group keys are derived in background, None stops the prewarm thread
+        prewarm_thread: thread deriving the group keys of the queued epochs, None if the group broadcast is disabled
+        max_datagram_size: max size of a sent datagram, bigger messages are fragmented
+        reassembler: collector of the fragments of the received messages
+        compressor: compressor of the messages bigger than the compression threshold
+        buffers: pool of the buffers the datagrams are received into
         socket: socket used for the communication
+        sockets: sockets bound to the port of the process, the first one is the socket used to send
+        socket_buffers: sizes of the kernel receive and send buffers granted to the sockets
+        client_port: port the replica listens to the clients on, the one assigned by the system if 0 was given, None
+            if the clients use the port of the process
+        client_sockets: sockets bound to the client port, empty if the clients use the port of the process
+        client_buffers: pool of the buffers the datagrams of the clients are received into
+        transport: asyncio transport wrapping the socket, None if the asyncio runtime is not used
+        transports: asyncio transports wrapping each socket
+        client_transport: asyncio transport wrapping the client socket, None if there is no client socket
+        pipeline: receive pipeline draining the sockets, None if the messages are decoded by the receive method
+        outbound: queues of the messages to send for each peer, None if the messages are sent by the send methods
+        batch_bytes: max size of the serialized messages packed by the send workers in a single datagram, 0 if the
+            messages are not packed
+        backlogs: messages of the received batches not returned yet by the receive method, for each socket
     """
 
-    def __init__(self, hosts: dict, ports: dict, keys: dict, pid: int, buffer_size: int = 1024, port: int = None):
+    def __init__(self, hosts: dict, ports: dict, keys: dict, pid: int, buffer_size: int = 1024, port: int = None,
+                 cipher_mode: CipherMode = CipherMode.CBC, wire_format: WireFormat = WireFormat.JSON,
+                 group_key: str = None, compression_threshold: int = 0, max_clients: int = MAX_CLIENTS,
+                 client_idle_timeout: float = CLIENT_IDLE_TIMEOUT, key_manager: KeyManager = None,
+                 receive_sockets: int = 1, receive_buffer_bytes: int = 0, send_buffer_bytes: int = 0,
+                 client_port: int = None):
         """
         Initialize the communication class.
 
@@ -38,38 +389,75 @@ class Communication:
             keys: dictionary that contains the process id as key and the crypto key as value
             pid: process id of the current process
             buffer_size: size of the communication buffer
+            port: port to bind, if different from the one in the ports dictionary
+            cipher_mode: encryption mode used on the wire, it must be the same for all the processes
+            wire_format: format used to serialize the sent messages, both formats are always accepted on receive
+            group_key: secret shared by the replicas, if set a broadcast to the replicas is serialized and encrypted
+                once with a group key derived from it and rotated at each sieve-config
+            compression_threshold: min size of a serialized message to be compressed before the encryption, 0 to
+                disable the compression (compressed messages are always accepted on receive)
+            max_clients: max number of clients registered at runtime, the least recently seen is evicted first
+            client_idle_timeout: seconds without datagrams after which a client registered at runtime is evicted
+            key_manager: cache of the derived keys, it can be shared by the processes hosted by the same program
+            receive_sockets: number of sockets bound to the same port with SO_REUSEPORT, the kernel spreads the
+                senders over them and the datagrams of a sender always reach the same socket
+            receive_buffer_bytes: size of the kernel receive buffer of each socket, 0 for the system default
+            send_buffer_bytes: size of the kernel send buffer of each socket, 0 for the system default
+            client_port: port to listen to the clients on, with its own socket and buffers, so that the clients
+                don't share the kernel queue of the replicas and the plane of a datagram tells who sent it; None to
+                receive the clients on the port of the process
         """
         self.pid = pid
         self.host = hosts[str(pid)]
         self.port = ports[str(pid)] if port is None else port
         self.buffer_size = buffer_size
-        self.hosts_dict = hosts
-        self.ports_dict = ports
-        self.keys_dict = keys
+        self.peers = PeerDirectory(hosts, ports, keys, pid,
+                                   clients=ClientRegistry(max_clients, client_idle_timeout))
         self.n_processes = len(hosts)
-        self.n_clients = 0
+        self.cipher = WireCipher(cipher_mode)
+        self.key_manager = KeyManager(key_length=self.cipher.key_length) if key_manager is None else key_manager
+        self.key_manager.prewarm(keys.values())
+        self.wire_format = wire_format
+        self.group_key = group_key or None
+        self.group_epoch = 0
+        self.prewarm_epochs = Queue()
+        self.prewarm_thread = None
+        if self.group_key is not None:
+            self.key_manager.prewarm([self.__group_base_key(0), self.__group_base_key(1)])
+            self.prewarm_thread = Thread(target=self.__prewarm_group_keys, daemon=True, name="group-prewarm")
+            self.prewarm_thread.start()
+        self.max_datagram_size = min(buffer_size, MAX_UDP_PAYLOAD)
+        self.reassembler = Reassembler()
+        self.compressor = Compressor(compression_threshold)
+        self.buffers = BufferPool(buffer_size)
+        self.fragment_id = 0
+        self.send_stats = {"fragmented_messages": 0, "fragments": 0}
+        self.batch_stats = {"batches": 0, "messages": 0}
+        self.batch_bytes = 0
+        self.lock = Lock()
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((self.host, self.port))
+        if receive_sockets > 1 and not hasattr(socket, "SO_REUSEPORT"):
+            print("SO_REUSEPORT is not supported, using a single socket")
+            receive_sockets = 1
+        self.socket = open_socket((self.host, self.port), receive_sockets > 1, receive_buffer_bytes, send_buffer_bytes)
+        # With port 0 the system assigns a free port, the other sockets share it
+        self.port = self.socket.getsockname()[1]
+        self.sockets = [self.socket] + [open_socket((self.host, self.port), True, receive_buffer_bytes,
+                                                    send_buffer_bytes) for _ in range(receive_sockets - 1)]
+        self.socket_buffers = (self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+                               self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF))
+        self.client_sockets = [] if client_port is None else [
+            open_socket((self.host, client_port), False, receive_buffer_bytes, send_buffer_bytes)]
+        self.client_port = self.client_sockets[0].getsockname()[1] if self.client_sockets else None
+        self.client_buffers = BufferPool(buffer_size)
+        self.transport = None
+        self.transports = []
+        self.client_transport = None
+        self.pipeline = None
+        self.outbound = None
+        self.backlogs = {}
 
-    def __derive_key(self, base_key: str, salt: bytes = b"12345678", iterations: int = 100000,
-                     key_length: int = 16) -> bytes:
-        """
-        Derive the key from the given base key.
-
-        Parameters:
-            base_key: base key to derive the key from
-            salt: salt to use for the derivation
-            iterations: number of iterations to use for the derivation
-            key_length: length of the key to derive
-
-        Returns:
-            new key derived from the base key
-        """
-
-        return PBKDF2(base_key, salt, key_length, iterations)
-
-    def __encrypt(self, message: str, key: str) -> bytes:
+    def __encrypt(self, message: bytes, key: str) -> bytes:
         """
         Encrypt the message with the key.
 
@@ -82,16 +470,14 @@ class Communication:
 
         """
 
-        key = self.__derive_key(key)
+        key = self.key_manager.get(key)
 
         try:
-            cipher = AES.new(key, AES.MODE_CBC)
-            ciphertext = cipher.encrypt(pad(message.encode(), AES.block_size))
-            return cipher.iv + ciphertext
+            return self.cipher.encrypt(message, key)
         except Exception as e:
             print(f"Encryption error: {e}")
 
-    def __decrypt(self, message: bytes, key: str) -> str:
+    def __decrypt(self, message: bytes, key: str) -> bytes:
         """
         Decrypt the message with the key.
 
@@ -100,21 +486,373 @@ class Communication:
             key: key to use for the decryption
 
         Returns:
-            decrypted message
+            decrypted message, or None if the message is corrupted or forged
         """
 
-        key = self.__derive_key(key)
+        key = self.key_manager.get(key)
 
         try:
-            iv = message[:AES.block_size]
-            cipher = AES.new(key, AES.MODE_CBC, iv)
-            plaintext = unpad(cipher.decrypt(message[AES.block_size:]), AES.block_size)
-            return plaintext.decode()
-        except ValueError as e:
-            print(f"Unpadding error: {e}")
+            # The ctypes backend of pycryptodome wraps each view in a ctypes array, copying the ciphertext is cheaper
+            plaintext = self.cipher.decrypt(bytes(message), key)
+            if plaintext is None:
+                print(f"Rejected message: decryption or authentication failed ({self.cipher.mode.value})")
+                return None
+            return plaintext
         except Exception as e:
             print(f"Decryption error: {e}")
 
+    def __group_base_key(self, epoch: int) -> str:
+        """
+        Get the base key of the group key for the given epoch.
+
+        Parameters:
+            epoch: sieve-config number
+
+        Returns:
+            the base key to derive the group key from
+        """
+
+        return f"{self.group_key}-{epoch}"
+
+    def __prewarm_group_keys(self) -> None:
+        """
+        Derive the group keys of the queued epochs and of the epochs following them, skipping the epochs already
+        superseded by a newer one, until None is queued.
+        """
+
+        while True:
+            epoch = self.prewarm_epochs.get()
+            while epoch is not None and not self.prewarm_epochs.empty():
+                epoch = self.prewarm_epochs.get()
+            if epoch is None:
+                return
+            self.key_manager.prewarm([self.__group_base_key(epoch), self.__group_base_key(epoch + 1)])
+
+    def set_group_epoch(self, epoch: int) -> None:
+        """
+        Rotate the group key used for the broadcasts to the given epoch. The key of the next epoch is derived in
+        background, so that the next rotation does not wait for the derivation.
+
+        Parameters:
+            epoch: new sieve-config number
+        """
+
+        if self.group_key is None or epoch == self.group_epoch:
+            return
+
+        self.group_epoch = epoch
+        self.prewarm_epochs.put(epoch)
+
+    def __serialize(self, outgoing: Outgoing) -> bytes:
+        """
+        Serialize a message in the wire format, only once for all its receivers.
+
+        Parameters:
+            outgoing: message to serialize
+
+        Returns:
+            the serialized message, or None if it can't be serialized
+        """
+
+        def serialize() -> bytes:
+            try:
+                return encode_message(outgoing.message, self.wire_format)
+            except (TypeError, ValueError) as e:
+                print(f"Encode error: {e}")
+
+        return outgoing.build("serialized", serialize)
+
+    def __encode(self, outgoing: Outgoing) -> bytes:
+        """
+        Serialize a message in the wire format, compressing it if it is bigger than the compression threshold, only
+        once for all its receivers.
+
+        Parameters:
+            outgoing: message to serialize
+
+        Returns:
+            the serialized message, or None if it can't be serialized
+        """
+
+        serialized = self.__serialize(outgoing)
+        return outgoing.build("data", lambda: None if serialized is None else self.compressor.compress(serialized))
+
+    def __seal(self, data: bytes, receiver_id: int) -> bytes:
+        """
+        Build the datagram encrypted with the key shared with the receiver.
+
+        Parameters:
+            data: serialized message
+            receiver_id: id of the process to send the message to
+
+        Returns:
+            the datagram, or None if the encryption failed
+        """
+
+        encrypted = self.__encrypt(data, self.peers.get_key(receiver_id))
+        if encrypted is None:
+            return None
+        return bytes((FrameKind.PAIRWISE.value,)) + encrypted
+
+    def __seal_group(self, data: bytes) -> bytes:
+        """
+        Build the datagram encrypted with the current group key, that every replica can decrypt.
+
+        Parameters:
+            data: serialized message
+
+        Returns:
+            the datagram, or None if the encryption failed
+        """
+
+        epoch = self.group_epoch
+        encrypted = self.__encrypt(data, self.__group_base_key(epoch))
+        if encrypted is None:
+            return None
+        header = bytearray((FrameKind.GROUP.value,))
+        write_varint(header, epoch)
+        return bytes(header) + encrypted
+
+    def __fragment(self, datagram: bytes) -> list:
+        """
+        Split the datagram in fragments if it is bigger than the max datagram size.
+
+        Parameters:
+            datagram: datagram to send
+
+        Returns:
+            the list of datagrams to send
+        """
+
+        if len(datagram) <= self.max_datagram_size:
+            return [datagram]
+
+        with self.lock:
+            self.fragment_id = (self.fragment_id + 1) % 2 ** 32
+            fragment_id = self.fragment_id
+
+        try:
+            fragments = split_datagram(datagram, fragment_id, self.max_datagram_size)
+        except ValueError as e:
+            print(f"Fragmentation error: {e}")
+            return []
+
+        with self.lock:
+            self.send_stats["fragmented_messages"] += 1
+            self.send_stats["fragments"] += len(fragments)
+
+        return fragments
+
+    def __send_datagrams(self, datagrams: list, receiver_id: int) -> None:
+        """
+        Send the datagrams to the socket of a process.
+
+        Parameters:
+            datagrams: datagrams to send
+            receiver_id: id of the process to send the datagrams to
+        """
+
+        try:
+            address = self.peers.get_address(receiver_id)
+            sendto = self.__sendto(receiver_id)
+            for datagram in datagrams:
+                sendto(datagram, address)
+        except socket.error as e:
+            print(f"Send socket error: {e}")
+
+    def __sendto(self, receiver_id: int):
+        """
+        Get the function sending a datagram to a process, through the client socket if the process is a client.
+
+        Parameters:
+            receiver_id: id of the process to send the datagram to
+
+        Returns:
+            the sendto function of the socket, or of the asyncio transport wrapping it
+        """
+
+        if self.client_sockets and int(receiver_id) >= CLIENT_PID:
+            return self.client_sockets[0].sendto if self.client_transport is None else self.client_transport.sendto
+        return self.socket.sendto if self.transport is None else self.transport.sendto
+
+    def __group_datagrams(self, outgoing: Outgoing) -> list:
+        """
+        Build the datagrams of a message encrypted with the current group key.
+
+        Parameters:
+            outgoing: message to send
+
+        Returns:
+            the list of datagrams, empty if the message can't be serialized or encrypted
+        """
+
+        data = self.__encode(outgoing)
+        datagram = None if data is None else self.__seal_group(data)
+        return [] if datagram is None else self.__fragment(datagram)
+
+    def __uses_group_key(self, outgoing: Outgoing, receiver_id: int) -> bool:
+        """
+        Check if a message is sent to a receiver encrypted with the group key.
+
+        Parameters:
+            outgoing: message to send
+            receiver_id: id of the process to send the message to
+
+        Returns:
+            True if the message is a broadcast, the group key is set, the receiver is a replica and the message does
+            not change the epoch, so that a replica lagging too many epochs behind still receives it
+        """
+
+        return (outgoing.broadcast and self.group_key is not None and receiver_id < CLIENT_PID
+                and outgoing.message.type not in PAIRWISE_TYPES)
+
+    def __deliver_one(self, outgoing: Outgoing, receiver_id: int) -> None:
+        """
+        Send a message to one of its receivers, serializing it only once for all of them. If the group key is set,
+        the replicas receive the same datagrams of a broadcast encrypted once with the group key, the clients a
+        datagram encrypted with their key.
+
+        Parameters:
+            outgoing: message to send
+            receiver_id: id of the process to send the message to
+        """
+
+        if self.__uses_group_key(outgoing, receiver_id):
+            self.__send_datagrams(outgoing.build("group", lambda: self.__group_datagrams(outgoing)), receiver_id)
+        else:
+            data = self.__encode(outgoing)
+            datagram = None if data is None else self.__seal(data, receiver_id)
+            if datagram is not None:
+                self.__send_datagrams(self.__fragment(datagram), receiver_id)
+
+        self.__sent(outgoing, receiver_id)
+
+    def __send_batch(self, batch: list, receiver_id: int) -> None:
+        """
+        Send many messages to a receiver packed in a single batch, serialized, compressed and encrypted once.
+
+        Parameters:
+            batch: messages to send
+            receiver_id: id of the process to send the messages to
+        """
+
+        if len(batch) <= 1:
+            for outgoing in batch:
+                self.__deliver_one(outgoing, receiver_id)
+            return
+
+        data = self.compressor.compress(encode_batch([self.__serialize(outgoing) for outgoing in batch]))
+        datagram = self.__seal(data, receiver_id)
+        if datagram is not None:
+            self.__send_datagrams(self.__fragment(datagram), receiver_id)
+
+        with self.lock:
+            self.batch_stats["batches"] += 1
+            self.batch_stats["messages"] += len(batch)
+
+        for outgoing in batch:
+            self.__sent(outgoing, receiver_id)
+
+    def __deliver(self, outgoings: list, receiver_id: int) -> None:
+        """
+        Send messages to one of their receivers, in order. If the batch budget is set, the consecutive messages
+        encrypted with the key of the receiver are packed in batches of at most that many bytes.
+
+        Parameters:
+            outgoings: messages to send
+            receiver_id: id of the process to send the messages to
+        """
+
+        batch = []
+        size = 0
+        for outgoing in outgoings:
+            if not self.batch_bytes or self.__uses_group_key(outgoing, receiver_id):
+                self.__send_batch(batch, receiver_id)
+                batch = []
+                size = 0
+                self.__deliver_one(outgoing, receiver_id)
+                continue
+
+            serialized = self.__serialize(outgoing)
+            if serialized is None:
+                self.__sent(outgoing, receiver_id)
+                continue
+
+            # Each message of a batch is prefixed by its length, a varint of 3 bytes up to 2 MB
+            if batch and size + len(serialized) + 3 > self.batch_bytes:
+                self.__send_batch(batch, receiver_id)
+                batch = []
+                size = 0
+            batch.append(outgoing)
+            size += len(serialized) + 3
+
+        self.__send_batch(batch, receiver_id)
+
+    def __sent(self, outgoing: Outgoing, receiver_id: int) -> None:
+        """
+        Record that a message has been sent to one of its receivers, logging it once sent to the last one.
+
+        Parameters:
+            outgoing: message sent
+            receiver_id: id of the process the message has been sent to
+        """
+
+        if not outgoing.done():
+            return
+        if outgoing.broadcast:
+            print(f"({self.pid}) BROADCAST: Message {outgoing.message} sent to {outgoing.receivers} "
+                  f"from ({self.host}, {self.port})\n")
+        else:
+            print(f"({self.pid}) SEND: Message {outgoing.message} sent to "
+                  f"{self.peers.get_address(receiver_id)} "
+                  f"with key {self.peers.get_key(receiver_id)} "
+                  f"from ({self.host}, {self.port})\n")
+
+    def __post(self, outgoing: Outgoing) -> None:
+        """
+        Queue a message for its receivers if the senders are started, otherwise send it.
+
+        Parameters:
+            outgoing: message to send
+        """
+
+        if self.outbound is not None:
+            self.outbound.put(outgoing)
+            return
+
+        for receiver_id in outgoing.receivers:
+            self.__deliver_one(outgoing, receiver_id)
+
+    def start_senders(self, workers: int = SEND_WORKERS, max_depth: int = SEND_QUEUE_DEPTH,
+                      batch_window: float = SEND_BATCH_WINDOW, batch_bytes: int = 0) -> None:
+        """
+        Send the messages with a pool of threads from now on, the send and broadcast methods only queue them.
+
+        Parameters:
+            workers: number of threads sending the queued messages
+            max_depth: max number of messages queued for a peer
+            batch_window: seconds a peer waits for more messages before its queue is sent
+            batch_bytes: max size of the serialized messages packed in a single datagram, 0 to send each message in
+                its own datagram
+        """
+
+        self.batch_bytes = batch_bytes
+        self.outbound = SendQueues(self.__deliver, workers, max_depth, batch_window)
+        self.peers.clients.add_listener(self.outbound.forget)
+
+    def set_config(self, config: int) -> None:
+        """
+        Set the current sieve-config: the queued messages of the previous ones are not sent to the replicas and the
+        group key is rotated.
+
+        Parameters:
+            config: sieve-config number
+        """
+
+        if self.outbound is not None:
+            self.outbound.set_config(config)
+        self.set_group_epoch(config)
+
     def broadcast(self, message: Message, include_client: bool = False) -> None:
         """
         Broadcast the message to all the sockets.
@@ -124,10 +862,8 @@ class Communication:
             include_client: whether to include the client in the broadcast
         """
 
-        for pid in self.keys_dict.keys():
-            pid = int(pid)
-            if pid != self.pid and (pid < CLIENT_PID or include_client):
-                self.send(message, pid)
+        self.__post(Outgoing(message, [pid for pid in self.peers.get_ids()
+                                       if pid != self.pid and (pid < CLIENT_PID or include_client)], True))
 
     def broadcast_to_clients(self, message: Message) -> None:
         """
@@ -137,10 +873,8 @@ class Communication:
             message: message to broadcast
         """
 
-        for pid in self.keys_dict.keys():
-            pid = int(pid)
-            if pid != self.pid and pid >= CLIENT_PID:
-                self.send(message, pid)
+        self.__post(Outgoing(message, [pid for pid in self.peers.get_ids() if pid != self.pid and pid >= CLIENT_PID],
+                             True))
 
     def send_debug(self, message: Message, receiver_id: int = None) -> None:
         """
@@ -166,72 +900,302 @@ class Communication:
             receiver_id: id of the process to send the message to
         """
 
-        try:
-            message = json.dumps(marshall_message(message))
-        except json.JSONDecodeError as e:
-            print(f"Json decode error: {e}")
+        if not self.peers.is_known(receiver_id):
+            print(f"Send error: unknown process {receiver_id}, message {message} dropped")
+            return
 
-        try:
-            self.socket.sendto(
-                self.__encrypt(message, self.keys_dict[str(receiver_id)]),
-                (self.hosts_dict[str(receiver_id)], self.ports_dict[str(receiver_id)])
-            )
-
-            print(f"({self.pid}) SEND: Message {message} sent to "
-                  f"{(self.hosts_dict[str(receiver_id)], self.ports_dict[str(receiver_id)])} "
-                  f"with key {self.keys_dict[str(receiver_id)]} "
-                  f"from ({self.host}, {self.port})\n")
-        except socket.error as e:
-            print(f"Send socket error: {e}")
+        self.__post(Outgoing(message, [receiver_id]))
 
-    def receive(self) -> (Message, str):
+    def receive(self, sock: socket.socket = None) -> (Message, str):
         """
-        Receive the message from the socket.
+        Receive the message from the socket. The datagram is received into a buffer of the pool and its frame is
+        parsed through views of it, only the ciphertext is copied. The messages of a batch are returned one at a time,
+        before the next datagram is received.
+
+        Parameters:
+            sock: socket to receive from, one of the sockets of the communication or of the client sockets, the first
+                one if None
 
         Returns:
             the message received from the socket and the id of the process that sent the message
         """
 
+        sock = self.socket if sock is None else sock
+        backlog = self.backlogs.get(sock)
+        if backlog:
+            return backlog.popleft()
+
         print("Waiting for message")
-        message = None
-        sender_id = None
+        buffers = self.get_buffers(sock)
+        buffer = buffers.acquire()
         try:
-            data, addr = self.socket.recvfrom(self.buffer_size)
+            size, addr = sock.recvfrom_into(buffer)
+            if addr is None:
+                # The socket has been shut down
+                return None, None
+            messages, sender_id = self.handle_datagram(memoryview(buffer)[:size], addr, sock)
+            if not messages:
+                return None, sender_id
+            if len(messages) > 1:
+                self.backlogs.setdefault(sock, deque()).extend((message, sender_id) for message in messages[1:])
+            return messages[0], sender_id
+        except socket.error as e:
+            # Irrelevant errors when closing the socket, only related to the socket implementation in python
+            if e.errno != 9 and e.errno != 10038:
+                print(f"Receive socket error: {e}")
+            return None, None
+        finally:
+            buffers.release(buffer)
+
+    def get_buffers(self, sock: socket.socket) -> BufferPool:
+        """
+        Get the pool of the buffers the datagrams of a socket are received into.
 
-            if addr[1] > 10000 and addr[1] in self.ports_dict.values():
-                sender_id = list(self.ports_dict.keys())[list(self.ports_dict.values()).index(addr[1])]
-            else:
-                sender_id = str(CLIENT_PID + self.n_clients if addr[1] > 10000 else addr[1] - 8000)
-                self.n_clients = int(sender_id) - CLIENT_PID + 1
+        Parameters:
+            sock: socket receiving the datagrams
 
-            # Save unknown host and port
-            if sender_id not in self.ports_dict.keys():
-                self.hosts_dict[sender_id] = addr[0]
-                self.ports_dict[sender_id] = addr[1]
-                self.keys_dict[sender_id] = str(self.pid)
+        Returns:
+            the pool of the client sockets or the one of the replica sockets
+        """
 
-            json_data = self.__decrypt(data, self.keys_dict[sender_id])
-            json_data = json.loads(json_data)
-            message = unmarshall_message(json_data)
+        return self.client_buffers if sock in self.client_sockets else self.buffers
 
-            print(f"({self.pid}) RECEIVED: message {message} received from {addr}\n")
+    def identify(self, addr: tuple, sock: socket.socket = None) -> str:
+        """
+        Get the id of the process that sent a datagram. If the clients have their own port, the socket that received
+        the datagram tells if the sender is a client or a replica.
+
+        Parameters:
+            addr: address the datagram comes from
+            sock: socket that received the datagram, the first socket if None
+
+        Returns:
+            the id of the sender
+
+        Raises:
+            ValueError: if a datagram received on the replica port doesn't come from a known replica
+        """
+
+        if not self.client_sockets:
+            return self.peers.lookup(addr)
+        if sock in self.client_sockets:
+            return self.peers.lookup_client(addr)
+        return self.peers.lookup_replica(addr)
+
+    def handle_datagram(self, data: bytes, addr: tuple, sock: socket.socket = None) -> (list, str):
+        """
+        Identify the sender of a datagram and decode the messages it contains.
+
+        Parameters:
+            data: datagram received
+            addr: address the datagram comes from
+            sock: socket that received the datagram, the first socket if None
+
+        Returns:
+            the list of messages, empty if the datagram doesn't complete a valid message, and the id of the process
+            that sent the datagram
+        """
+
+        try:
+            sender_id = self.identify(addr, sock)
+        except Exception as e:
+            print(f"Receive error: {e}")
+            return [], None
+
+        return self.decode_datagram(data, sender_id, addr), sender_id
+
+    def decode_datagram(self, data: bytes, sender_id: str, addr: tuple) -> list:
+        """
+        Reassemble, decrypt and decode the message, or the batch of messages, contained in a datagram. It can be
+        called by many threads at the same time.
+
+        Parameters:
+            data: datagram received, a view of a receive buffer is not kept after the call
+            sender_id: id of the process that sent the datagram
+            addr: address the datagram comes from
+
+        Returns:
+            the list of messages, empty if the datagram doesn't complete a valid message
+        """
+
+        messages = []
+        try:
+            if data and data[0] == FrameKind.FRAGMENT.value:
+                data = self.reassembler.add(data, sender_id)
+                if data is None:
+                    return messages
+
+            data = self.__open(data, sender_id)
+            if data is None:
+                return messages
+            messages = decode_messages(self.compressor.decompress(data))
+
+            for message in messages:
+                print(f"({self.pid}) RECEIVED: message {message} received from {addr}\n")
 
-        except socket.error as e:
-            # Irrelevant errors when closing the socket, only related to the socket implementation in python
-            if e.errno == 9 or e.errno == 10038:
-                pass
-            else:
-                print(f"Receive socket error: {e}")
         except json.JSONDecodeError as e:
             print(f"Json decode error: {e}")
+        except (ValueError, IndexError) as e:
+            print(f"Decode error: {e}")
         except Exception as e:
             print(f"Receive error: {e}")
         finally:
-            return message, sender_id
+            return messages
+
+    async def start_async(self, on_message) -> None:
+        """
+        Receive the datagrams with the asyncio event loop instead of the receive method. From now on the datagrams
+        are sent through the asyncio transport.
+
+        Parameters:
+            on_message: function called in the event loop with each message received and the id of its sender
+        """
+
+        loop = asyncio.get_running_loop()
+        self.transports = []
+        for sock in self.sockets + self.client_sockets:
+            sock.setblocking(False)
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda sock=sock: DatagramHandler(self, on_message, sock), sock=sock)
+            self.transports.append(transport)
+        self.transport = self.transports[0]
+        if self.client_sockets:
+            self.client_transport = self.transports[-1]
+
+    def __open(self, datagram: bytes, sender_id: str) -> bytes:
+        """
+        Decrypt a datagram with the key given by its frame kind.
+
+        Parameters:
+            datagram: datagram received
+            sender_id: id of the process that sent the datagram
+
+        Returns:
+            the serialized message, or None if the datagram is rejected
+        """
+
+        kind = datagram[0] if datagram else None
+
+        if kind == FrameKind.PAIRWISE.value:
+            return self.__decrypt(datagram[1:], self.peers.get_key(sender_id))
+
+        if kind == FrameKind.GROUP.value and self.group_key is not None and int(sender_id) < CLIENT_PID:
+            epoch, index = read_varint(datagram, 1)
+            # Only the epochs close to the local one are accepted, a forged epoch can't force many key derivations
+            if self.group_epoch - 1 <= epoch <= self.group_epoch + GROUP_EPOCH_WINDOW:
+                return self.__decrypt(datagram[index:], self.__group_base_key(epoch))
+
+        print(f"Rejected message: unexpected frame kind or group epoch from {sender_id}")
+        return None
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the communication.
+
+        Returns:
+            dictionary containing the counters of the key cache, of the cipher, of the fragmentation, of the
+            compression, of the batches, of the receive buffers, of the client sessions, of the sockets of each plane,
+            of the receive pipeline and of the send queues of each peer
+        """
+
+        with self.lock:
+            sent = dict(self.send_stats)
+            batches = dict(self.batch_stats)
+
+        stats = {
+            "keys": self.key_manager.get_stats(),
+            "rejected": self.cipher.rejected,
+            "fragments_sent": sent,
+            "batches_sent": batches,
+            "fragments_received": self.reassembler.get_stats(),
+            "compression": self.compressor.get_stats(),
+            "buffers": self.buffers.get_stats(),
+            "clients": self.peers.clients.get_stats(),
+            "sockets": {
+                "count": len(self.sockets),
+                "receive_buffer": self.socket_buffers[0],
+                "send_buffer": self.socket_buffers[1],
+                "kernel_drops": kernel_drops(self.sockets)
+            }
+        }
+        if self.client_sockets:
+            stats["client_buffers"] = self.client_buffers.get_stats()
+            stats["client_sockets"] = {
+                "port": self.client_port,
+                "kernel_drops": kernel_drops(self.client_sockets)
+            }
+        if self.pipeline is not None:
+            stats["pipeline"] = self.pipeline.get_stats()
+        if self.outbound is not None:
+            stats["outbound"] = self.outbound.get_stats()
+            stats["outbound_evicted"] = self.outbound.get_evicted_stats()
+        return stats
 
     def close(self) -> None:
         """
-        Close the socket.
+        Close the sockets, waking up the threads waiting on them. The queued messages are sent first.
+        """
+
+        if self.outbound is not None:
+            self.outbound.close()
+        if self.prewarm_thread is not None:
+            self.prewarm_epochs.put(None)
+
+        if self.transport is not None:
+            for transport in self.transports:
+                transport.close()
+            return
+
+        for sock in self.sockets + self.client_sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # A datagram socket is not connected, but the shutdown still wakes up the receivers
+            sock.close()
+
+
+class DatagramHandler(asyncio.DatagramProtocol):
+    """
+    Class passing the datagrams received by the asyncio transport to the communication.
+
+    Attributes:
+        communication (Communication): communication decoding the datagrams
+        on_message: function called with each message received and the id of its sender
+        sock (socket): socket wrapped by the transport
+    """
+
+    def __init__(self, communication: Communication, on_message, sock: socket.socket = None):
+        """
+        Initialize the datagram handler.
+
+        Parameters:
+            communication: communication decoding the datagrams
+            on_message: function called with each message received and the id of its sender
+            sock: socket wrapped by the transport, the first socket of the communication if None
+        """
+        self.communication = communication
+        self.on_message = on_message
+        self.sock = sock
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        """
+        Decode the datagram and pass the messages it contains, if any.
+
+        Parameters:
+            data: datagram received
+            addr: address the datagram comes from
+        """
+
+        messages, sender_id = self.communication.handle_datagram(data, addr, self.sock)
+        for message in messages:
+            self.on_message(message, sender_id)
+
+    def error_received(self, exc: Exception) -> None:
+        """
+        Report an error of the transport.
+
+        Parameters:
+            exc: error raised by the socket
         """
 
-        self.socket.close()
+        print(f"Receive socket error: {exc}")
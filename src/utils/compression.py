@@ -0,0 +1,136 @@
+#!/bin/bash
+
+import zlib
+from threading import Lock
+
+COMPRESSED_V1 = 0x01  # first byte of a compressed message, compressed with DICTIONARY_V1
+COMPRESSED_VERSION = COMPRESSED_V1  # version of the dictionary the messages are compressed with
+COMPRESSION_LEVEL = 6  # zlib compression level
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024  # max size of a decompressed message
+WBITS = -15  # raw deflate stream, the dictionary makes the zlib header useless
+
+# Typical Sieve messages in the json and in the binary wire format, with the most common strings at the end. The
+# dictionary of a version must never change: the processes of different builds decompress each other's messages
+# with the dictionary named by the first byte, a new dictionary gets a new version byte.
+DICTIONARY_V1 = (
+    b'{"type": 4, "c": 1, "p": 2, "leader-buffer": [{"1": [1000, 1], "2": [1001, 1]}, [1, 2], [[[1000, 1], ["key",'
+    b' "value"]], [[1001, 1], ["key", "value"]]]], "generic-data": false}'
+    b'{"type": 10, "c": 1, "decision": 5, "op-id": [1000, 1]}'
+    b'{"type": 1, "c": 1, "o": ["key", "value"], "op-id": [1000, 1]}'
+    b'{"type": 3, "c": 1, "decision": 5, "tc": 8, "rc": ["key", "value"], "msg-set": {"1": {"type": 2, "c": 1, '
+    b'"o": null, "p": null, "sign": "0000000000000000000000000000000000000000000000000000000000000000", '
+    b'"decision": null, "tc": null, "rc": null, "msg-set": null, "leader-buffer": null, "debug-faulty": null, '
+    b'"debug-ex-time": null, "generic-data": null, "retry-after": null, "op-id": [1000, 1], "slot": null, "batch":'
+    b' null}, "2": {"type": 2, "c": 1, "o": null, "p": null, "sign": '
+    b'"0000000000000000000000000000000000000000000000000000000000000000", "decision": null, "tc": null, "rc": '
+    b'null, "msg-set": null, "leader-buffer": null, "debug-faulty": null, "debug-ex-time": null, "generic-data": '
+    b'null, "retry-after": null, "op-id": [1000, 1], "slot": null, "batch": null}}, "op-id": [1000, 1]}'
+    b'{"type": 2, "c": 1, "sign": "0000000000000000000000000000000000000000000000000000000000000000", "op-id": '
+    b'[1000, 1]}'
+    + bytes.fromhex(
+        "b1000203080102030203020304094e06030702050131060203d00f0302050132060203d20f030206020302030406020602060203"
+        "d00f0302060205036b6579050576616c75650602060203d20f0302060205036b6579050576616c75650c0101b100020314010203"
+        "020502030a0e07060203d00f0302b10002030201020302020e060205036b6579050576616c75650e07060203d00f0302b1000203"
+        "06010203020502030a06020310070e060205036b6579050576616c756508b6010702050131085500020304010203020442054030"
+        "30303030303030303030303030303030303030303030303030303030303030303030303030303030303030303030303030303030"
+        "30303030303030303030300e07060203d00f03020501320855000203040102030204420540303030303030303030303030303030"
+        "303030303030303030303030303030303030303030303030303030303030303030303030303030303030303030303030300e0706"
+        "0203d00f03020e07060203d00f0302b1000203040102030204420540303030303030303030303030303030303030303030303030"
+        "303030303030303030303030303030303030303030303030303030303030303030303030303030300e07060203d00f0302")
+)
+
+DICTIONARIES = {COMPRESSED_V1: DICTIONARY_V1}  # dictionaries indexed by the first byte of the compressed messages
+
+
+class Compressor:
+    """
+    Class compressing the serialized messages bigger than a threshold with a shared dictionary. A compressed message
+    starts with the version of its dictionary, the messages compressed with any known version are decompressed.
+
+    Attributes:
+        threshold (int): min size of a message to be compressed, 0 to disable the compression
+        version (int): version of the dictionary the messages are compressed with
+        dictionary (bytes): dictionary the messages are compressed with
+        stats (dict): counters of the compressed messages and of the bytes before and after the compression
+    """
+
+    def __init__(self, threshold: int = 0, version: int = COMPRESSED_VERSION):
+        """
+        Initialize the compressor.
+
+        Parameters:
+            threshold: min size of a message to be compressed, 0 to disable the compression
+            version: version of the dictionary the messages are compressed with
+        """
+        self.threshold = threshold
+        self.version = version
+        self.dictionary = DICTIONARIES[version]
+        self.stats = {
+            "compressed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0
+        }
+        self.lock = Lock()
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress the message if it is bigger than the threshold and the compression makes it smaller.
+
+        Parameters:
+            data: serialized message
+
+        Returns:
+            the compressed message, or the message itself
+        """
+
+        if not self.threshold or len(data) < self.threshold:
+            return data
+
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, WBITS, zdict=self.dictionary)
+        compressed = bytes((self.version,)) + compressor.compress(data) + compressor.flush()
+
+        if len(compressed) >= len(data):
+            return data
+
+        with self.lock:
+            self.stats["compressed"] += 1
+            self.stats["bytes_in"] += len(data)
+            self.stats["bytes_out"] += len(compressed)
+        return compressed
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Decompress the message if it is compressed.
+
+        Parameters:
+            data: message received
+
+        Returns:
+            the serialized message
+        """
+
+        dictionary = DICTIONARIES.get(data[0]) if data else None
+        if dictionary is None:
+            return data
+
+        decompressor = zlib.decompressobj(WBITS, zdict=dictionary)
+        try:
+            decompressed = decompressor.decompress(data[1:], MAX_DECOMPRESSED_SIZE)
+        except zlib.error as e:
+            raise ValueError(f"Decompression error: {e}")
+
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Compressed message too big or truncated")
+
+        return decompressed
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the compressor.
+
+        Returns:
+            dictionary containing the number of compressed messages and the bytes before and after the compression
+        """
+
+        with self.lock:
+            return dict(self.stats)
@@ -0,0 +1,206 @@
+#!/bin/bash
+
+import struct
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from utils.msg_variables import FrameKind
+
+MAX_UDP_PAYLOAD = 65507  # max size of a UDP datagram payload over IPv4
+FRAGMENT_HEADER = struct.Struct(">BIHH")  # frame kind, message id, fragment index, number of fragments
+MAX_FRAGMENTS = 1024  # max number of fragments of a message
+REASSEMBLY_TIMEOUT = 2  # seconds after which an incomplete message is dropped
+MAX_PENDING_MESSAGES = 64  # max number of incomplete messages kept for each sender
+MAX_PENDING_BYTES = 8 * 1024 * 1024  # max number of bytes kept for the incomplete messages of each sender
+MAX_PENDING_TOTAL_BYTES = 64 * 1024 * 1024  # max number of bytes kept for the incomplete messages of all the senders
+
+
+def split_datagram(datagram: bytes, msg_id: int, max_size: int) -> list:
+    """
+    Split a datagram in fragments that fit the given size.
+
+    Parameters:
+        datagram: datagram to split
+        msg_id: id of the message, unique for the sender
+        max_size: max size of a fragment, header included
+
+    Returns:
+        the list of fragments
+    """
+
+    chunk_size = min(max_size, MAX_UDP_PAYLOAD) - FRAGMENT_HEADER.size
+    count = -(-len(datagram) // chunk_size)
+
+    if count > MAX_FRAGMENTS:
+        raise ValueError(f"Message of {len(datagram)} bytes needs more than {MAX_FRAGMENTS} fragments")
+
+    view = memoryview(datagram)
+    return [FRAGMENT_HEADER.pack(FrameKind.FRAGMENT.value, msg_id, index, count)
+            + view[index * chunk_size:(index + 1) * chunk_size] for index in range(count)]
+
+
+class Reassembler:
+    """
+    Class collecting the fragments of the messages until they are complete. The incomplete messages of each sender
+    are bounded in number and size, so that a sender flooding fragments only evicts its own messages, and dropped
+    after a timeout. Past the total bound, the oldest message of the sender keeping the most bytes is evicted.
+
+    Attributes:
+        timeout (float): seconds after which an incomplete message is dropped
+        max_messages (int): max number of incomplete messages kept for each sender
+        max_bytes (int): max number of bytes kept for the incomplete messages of each sender
+        max_total_bytes (int): max number of bytes kept for the incomplete messages of all the senders
+        pending (OrderedDict): incomplete messages indexed by (sender id, message id), oldest first
+        pending_bytes (int): number of bytes kept for the incomplete messages
+        senders (dict): dictionary that contains the sender id as key and, as value, the ids of its incomplete
+            messages, oldest first, and the number of bytes kept for them
+        stats (dict): counters of the received fragments and of the reassembled, expired and evicted messages
+    """
+
+    def __init__(self, timeout: float = REASSEMBLY_TIMEOUT, max_messages: int = MAX_PENDING_MESSAGES,
+                 max_bytes: int = MAX_PENDING_BYTES, max_total_bytes: int = MAX_PENDING_TOTAL_BYTES):
+        """
+        Initialize the reassembler.
+
+        Parameters:
+            timeout: seconds after which an incomplete message is dropped
+            max_messages: max number of incomplete messages kept for each sender
+            max_bytes: max number of bytes kept for the incomplete messages of each sender
+            max_total_bytes: max number of bytes kept for the incomplete messages of all the senders
+        """
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.pending = OrderedDict()
+        self.pending_bytes = 0
+        self.senders = {}
+        self.stats = {
+            "fragments": 0,
+            "reassembled": 0,
+            "expired": 0,
+            "evicted": 0,
+            "rejected": 0
+        }
+        self.lock = Lock()
+
+    def __drop(self, key: tuple, reason: str) -> None:
+        """
+        Drop an incomplete message.
+
+        Parameters:
+            key: (sender id, message id) of the message
+            reason: name of the counter to increment
+        """
+
+        _, _, size, _ = self.pending.pop(key)
+        self.__release(key, size)
+        self.stats[reason] += 1
+
+    def __release(self, key: tuple, size: int) -> None:
+        """
+        Remove a message taken out of the pending ones from the counters of its sender.
+
+        Parameters:
+            key: (sender id, message id) of the message
+            size: number of bytes kept for the message
+        """
+
+        sender_id, msg_id = key
+        messages, sender_bytes = self.senders[sender_id]
+        del messages[msg_id]
+        self.pending_bytes -= size
+        if messages:
+            self.senders[sender_id][1] = sender_bytes - size
+        else:
+            del self.senders[sender_id]
+
+    def __evict(self, sender_id: str) -> None:
+        """
+        Evict the oldest incomplete messages of a sender over its bounds, then the oldest ones of the senders keeping
+        the most bytes while the total bound is exceeded.
+
+        Parameters:
+            sender_id: id of the sender of the last fragment
+        """
+
+        while sender_id in self.senders and (len(self.senders[sender_id][0]) > self.max_messages
+                                             or self.senders[sender_id][1] > self.max_bytes):
+            self.__drop((sender_id, next(iter(self.senders[sender_id][0]))), "evicted")
+
+        while self.pending_bytes > self.max_total_bytes:
+            largest = max(self.senders, key=lambda sender: self.senders[sender][1])
+            self.__drop((largest, next(iter(self.senders[largest][0]))), "evicted")
+
+    def add(self, fragment: bytes, sender_id: str) -> bytes:
+        """
+        Add a fragment.
+
+        Parameters:
+            fragment: fragment received
+            sender_id: id of the process that sent the fragment
+
+        Returns:
+            the whole datagram if the fragment completes it, None otherwise
+        """
+
+        if len(fragment) <= FRAGMENT_HEADER.size:
+            with self.lock:
+                self.stats["rejected"] += 1
+            return None
+
+        _, msg_id, index, count = FRAGMENT_HEADER.unpack_from(fragment)
+        # The fragment can be a view of a receive buffer that is reused, the chunk is copied to be kept
+        chunk = bytes(fragment[FRAGMENT_HEADER.size:])
+        key = (sender_id, msg_id)
+        now = monotonic()
+
+        with self.lock:
+            self.stats["fragments"] += 1
+
+            while self.pending and next(iter(self.pending.values()))[3] + self.timeout < now:
+                self.__drop(next(iter(self.pending)), "expired")
+
+            if not 0 < count <= MAX_FRAGMENTS or index >= count:
+                self.stats["rejected"] += 1
+                return None
+
+            if key not in self.pending:
+                self.pending[key] = [[None] * count, 0, 0, now]
+                self.senders.setdefault(sender_id, [OrderedDict(), 0])[0][msg_id] = None
+            chunks, received, size, start = self.pending[key]
+
+            if len(chunks) != count:
+                self.__drop(key, "rejected")
+                return None
+            if chunks[index] is not None:
+                return None
+
+            chunks[index] = chunk
+            self.pending[key] = [chunks, received + 1, size + len(chunk), start]
+            self.pending_bytes += len(chunk)
+            self.senders[sender_id][1] += len(chunk)
+
+            if received + 1 == count:
+                self.pending.pop(key)
+                self.__release(key, size + len(chunk))
+                self.stats["reassembled"] += 1
+                return b"".join(chunks)
+
+            self.__evict(sender_id)
+
+        return None
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the reassembler.
+
+        Returns:
+            dictionary containing the counters, the number of incomplete messages and bytes kept and the number of
+            senders they come from
+        """
+
+        with self.lock:
+            return dict(self.stats, pending=len(self.pending), pending_bytes=self.pending_bytes,
+                        pending_senders=len(self.senders))
@@ -0,0 +1,274 @@
+#!/bin/bash
+
+from collections import deque
+from enum import Enum
+from queue import Empty
+from threading import Condition, Lock
+from time import monotonic
+
+from gui.client_config import CLIENT_PID
+from utils.msg import Message
+from utils.msg_variables import MsgType
+
+LANE_BURST = 32  # max number of messages taken from the higher lanes while a lower lane waits
+INBOX_DEPTH = 1024  # max number of messages queued in each lane but the consensus one, 0 for no limit
+CONSENSUS_DEPTH = 1024  # max number of messages of each replica queued in the consensus lane, 0 for no limit
+
+
+class Lane(Enum):
+    """
+    Enum representing the lanes of the inbox, in priority order.
+    """
+
+    CONSENSUS = 0  # messages moving the protocol forward and control messages
+    FORWARDING = 1  # operations invoked by the clients or forwarded to the leader
+    CLIENT_READS = 2  # reads of the clients and unknown messages
+
+
+LANES = {
+    MsgType.EXECUTE.value: Lane.CONSENSUS,
+    MsgType.APPROVE.value: Lane.CONSENSUS,
+    MsgType.ORDER.value: Lane.CONSENSUS,
+    MsgType.VALIDATION.value: Lane.CONSENSUS,
+    MsgType.NEW_SIEVE_CONFIG.value: Lane.CONSENSUS,
+    MsgType.COMMIT.value: Lane.CONSENSUS,
+    MsgType.ABORT.value: Lane.CONSENSUS,
+    MsgType.COMPLAIN.value: Lane.CONSENSUS,
+    MsgType.CLOSE.value: Lane.CONSENSUS,
+    MsgType.DEBUG.value: Lane.CONSENSUS,
+    MsgType.INVOKE.value: Lane.FORWARDING,
+    MsgType.CLIENT_INVOKE.value: Lane.FORWARDING,
+    MsgType.START.value: Lane.FORWARDING,
+    MsgType.REQUEST_VALUE.value: Lane.CLIENT_READS
+}  # lane of each message type, the other types go to the last lane
+
+
+def get_lane(message: Message, sender_id: str) -> Lane:
+    """
+    Get the lane of a received message. Only the replicas can reach the consensus lane: a message of a consensus
+    type sent by a client, or arrived on the client-facing socket where the senders always get a client id, goes to
+    the last lane, so that a client can't flood the unbounded lane.
+
+    Parameters:
+        message: message received
+        sender_id: id of the process that sent the message
+
+    Returns:
+        the lane of the message
+    """
+
+    lane = LANES.get(message.type, Lane.CLIENT_READS)
+    if lane == Lane.CONSENSUS and int(sender_id) >= CLIENT_PID:
+        return Lane.CLIENT_READS
+    return lane
+
+
+class PriorityInbox:
+    """
+    Class queuing the received messages in a lane for each class of message type, so that a flood of client traffic
+    doesn't delay the messages that move the protocol forward. The messages are taken from the highest lane that is
+    not empty, in the order they were received within a lane. To avoid starvation, after LANE_BURST messages taken
+    from the higher lanes while a lower lane waits, the next message is taken from the highest waiting lower lane.
+
+    The lanes but the consensus one are bounded, a message is rejected when its lane is full, so that an overload of
+    client traffic doesn't grow the memory of the replica. Only the messages of the replicas are queued in the
+    consensus lane whatever their type, and it is bounded for each replica: a new message is always queued, evicting
+    the oldest queued message of its sender when the sender reached its bound, so that a faulty replica flooding the
+    lane only drops its own messages.
+
+    Attributes:
+        burst (int): max number of messages taken from the higher lanes while a lower lane waits
+        max_depth (int): max number of messages queued in each lane but the consensus one, 0 for no limit
+        consensus_depth (int): max number of messages of each replica queued in the consensus lane, 0 for no limit
+        senders (dict): dictionary that contains the replica id as key and the number of its messages queued in the
+            consensus lane as value
+        lanes (dict): dictionary that contains the lane as key and the deque of (message, sender id, time it was
+            queued) as value
+        skipped (dict): dictionary that contains the lane as key and the number of messages taken from the higher
+            lanes since the lane started waiting as value
+        stats (dict): dictionary that contains the lane as key and the counters of its messages as value
+    """
+
+    def __init__(self, burst: int = LANE_BURST, max_depth: int = INBOX_DEPTH, consensus_depth: int = CONSENSUS_DEPTH):
+        """
+        Initialize the inbox.
+
+        Parameters:
+            burst: max number of messages taken from the higher lanes while a lower lane waits
+            max_depth: max number of messages queued in each lane but the consensus one, 0 for no limit
+            consensus_depth: max number of messages of each replica queued in the consensus lane, 0 for no limit
+        """
+        self.burst = burst
+        self.max_depth = max_depth
+        self.consensus_depth = consensus_depth
+        self.lanes = dict((lane, deque()) for lane in Lane)
+        self.skipped = dict((lane, 0) for lane in Lane)
+        self.senders = {}
+        self.stats = dict((lane, {"received": 0, "handled": 0, "promoted": 0, "rejected": 0, "evicted": 0,
+                                  "max_depth": 0, "wait": 0.0, "max_wait": 0.0}) for lane in Lane)
+        self.lock = Lock()
+        self.not_empty = Condition(self.lock)
+
+    def put(self, item: tuple) -> bool:
+        """
+        Queue a received message in its lane.
+
+        Parameters:
+            item: tuple (message, sender id)
+
+        Returns:
+            True if the message has been queued, False if it has been rejected because its lane is full
+        """
+
+        message, sender_id = item
+        lane = get_lane(message, sender_id)
+
+        with self.lock:
+            queue = self.lanes[lane]
+            stats = self.stats[lane]
+            if self.max_depth and lane != Lane.CONSENSUS and len(queue) >= self.max_depth:
+                stats["rejected"] += 1
+                return False
+            if lane == Lane.CONSENSUS:
+                self.__make_room(sender_id)
+
+            queue.append((message, sender_id, monotonic()))
+            stats["received"] += 1
+            stats["max_depth"] = max(stats["max_depth"], len(queue))
+            self.not_empty.notify()
+            return True
+
+    def __make_room(self, sender_id: str) -> None:
+        """
+        Count a new message of a replica in the consensus lane, evicting the oldest queued message of the replica if
+        it reached its bound. It must be called holding the lock.
+
+        Parameters:
+            sender_id: id of the replica that sent the message
+        """
+
+        count = self.senders.get(sender_id, 0)
+        if self.consensus_depth and count >= self.consensus_depth:
+            queue = self.lanes[Lane.CONSENSUS]
+            index = next(index for index, (_, queued_sender, _) in enumerate(queue) if queued_sender == sender_id)
+            del queue[index]
+            self.stats[Lane.CONSENSUS]["evicted"] += 1
+            count -= 1
+        self.senders[sender_id] = count + 1
+
+    def __take(self) -> tuple:
+        """
+        Take the next message. It must be called holding the lock.
+
+        Returns:
+            tuple (message, sender id), None if the inbox is empty
+        """
+
+        waiting = [lane for lane in Lane if self.lanes[lane]]
+        if not waiting:
+            return None
+
+        lane = waiting[0]
+        for lower in waiting[1:]:
+            if self.skipped[lower] >= self.burst:
+                lane = lower
+                self.stats[lane]["promoted"] += 1
+                break
+
+        for other in Lane:
+            # Only the lanes waiting behind the lane served are skipped, the others start counting when they wait
+            self.skipped[other] = self.skipped[other] + 1 if other in waiting[1:] and other != lane else 0
+
+        message, sender_id, queued = self.lanes[lane].popleft()
+        if lane == Lane.CONSENSUS:
+            if self.senders[sender_id] == 1:
+                del self.senders[sender_id]
+            else:
+                self.senders[sender_id] -= 1
+        wait = monotonic() - queued
+        stats = self.stats[lane]
+        stats["handled"] += 1
+        stats["wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        return message, sender_id
+
+    def get(self, timeout: float = None) -> tuple:
+        """
+        Wait for a message and take it.
+
+        Parameters:
+            timeout: max seconds to wait, None to wait forever
+
+        Returns:
+            tuple (message, sender id)
+
+        Raises:
+            Empty: if no message arrives before the timeout
+        """
+
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: any(self.lanes.values()), timeout):
+                raise Empty
+            return self.__take()
+
+    def get_nowait(self) -> tuple:
+        """
+        Take a message without waiting.
+
+        Returns:
+            tuple (message, sender id)
+
+        Raises:
+            Empty: if the inbox is empty
+        """
+
+        with self.lock:
+            item = self.__take()
+        if item is None:
+            raise Empty
+        return item
+
+    def qsize(self) -> int:
+        """
+        Get the number of messages queued.
+
+        Returns:
+            the number of messages in all the lanes
+        """
+
+        with self.lock:
+            return sum(len(queue) for queue in self.lanes.values())
+
+    def empty(self) -> bool:
+        """
+        Check if the inbox is empty.
+
+        Returns:
+            True if no lane contains messages
+        """
+
+        return self.qsize() == 0
+
+    def get_stats(self) -> dict:
+        """
+        Get the gauges of the lanes.
+
+        Returns:
+            dictionary that contains the lane name as key and, as value, the number of messages queued, the max
+            number reached, the counters of the messages received, handled, taken by the starvation protection,
+            rejected because the lane was full and evicted by a newer message of the same replica and the mean and max
+            time in milliseconds a message waited in the lane
+        """
+
+        with self.lock:
+            return dict((lane.name.lower(), {
+                "depth": len(self.lanes[lane]),
+                "max_depth": stats["max_depth"],
+                "received": stats["received"],
+                "handled": stats["handled"],
+                "promoted": stats["promoted"],
+                "rejected": stats["rejected"],
+                "evicted": stats["evicted"],
+                "wait_ms": stats["wait"] / stats["handled"] * 1000 if stats["handled"] else 0.0,
+                "max_wait_ms": stats["max_wait"] * 1000
+            }) for lane, stats in self.stats.items())
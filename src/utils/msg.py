@@ -1,5 +1,6 @@
 #!/bin/bash
 
+from collections.abc import Mapping, Sequence
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -9,17 +10,17 @@ from utils.msg_variables import MsgKey, MsgType
 
 
 @dataclass_json
-@dataclass
+@dataclass(slots=True)
 class Message:
     """
-    Class representing a message.
+    Class representing a message. It uses slots, so it has no per-instance dictionary.
 
     Attributes:
         type (int): type of the message
         c (Optional[int]): config (epoch)
         o (Optional[list]): operation
         pid (Optional[int]): process id
-        sign (Optional[str]): signature of the result
+        sign (Optional[object]): signature of the result, a list with a signature for each operation of a batch
         decision (Optional[int]): decision of the validation
         tc (Optional[State]): speculative state
         rc (Optional[object]): speculative response
@@ -28,33 +29,148 @@ class Message:
         debug_faulty (Optional[int]): debug option for faulty process simulation
         debug_ex_time (Optional[object]): debug option for execution time simulation
         generic_data (Optional[object]): generic data to be sent
+        retry_after (Optional[float]): seconds a client should wait before invoking a rejected operation again
+        op_id (Optional[list]): (client id, sequence number) identifying the operation
+        slot (Optional[int]): position of the operation in the order of execution given by the leader
+        batch (Optional[list]): ids of the operations executed together, in the order they are executed
     """
 
     type: int = field(default=None, metadata=config(field_name=MsgKey.TYPE.value))
     c: Optional[int] = field(default=None, metadata=config(field_name=MsgKey.CONFIG.value))
     o: Optional[list] = field(default=None, metadata=config(field_name=MsgKey.OPERATION.value))
     pid: Optional[int] = field(default=None, metadata=config(field_name=MsgKey.PID.value))
-    sign: Optional[str] = field(default=None, metadata=config(field_name=MsgKey.SIGN.value))
+    sign: Optional[object] = field(default=None, metadata=config(field_name=MsgKey.SIGN.value))
     decision: Optional[int] = field(default=None, metadata=config(field_name=MsgKey.DECISION.value))
     tc: Optional[object] = field(default=None, metadata=config(field_name=MsgKey.S_STATE.value))
     rc: Optional[object] = field(default=None, metadata=config(field_name=MsgKey.S_RES.value))
     msg_set: Optional[dict] = field(default=None, metadata=config(field_name=MsgKey.MSG_SET.value,
-                                                                  decoder=lambda messages: dict(
-                                                                      (pid, unmarshall_message(msg)) for pid, msg in
-                                                                      messages.items())))
+                                                                  decoder=lambda messages: LazyMessageSet(
+                                                                      messages, unmarshall_message)))
     leader_buffer: Optional[list] = field(default=None, metadata=config(field_name=MsgKey.LEADER_BUFFER.value,
-                                                                        decoder=lambda items: [dict(
-                                                                            (int(pid), op) for pid, op
-                                                                            in
-                                                                            items[0].items()),
-                                                                            items[1],
-                                                                            dict(
-                                                                            (tuple(item[0]), item[1]) for item
-                                                                            in
-                                                                            items[2])]))
+                                                                        decoder=lambda items: LazyLeaderBuffer(
+                                                                            items, decode_leader_buffer)))
     debug_faulty: Optional[int] = field(default=None, metadata=config(field_name=MsgKey.DEBUG_FAULTY.value))
     debug_ex_time: Optional[object] = field(default=None, metadata=config(field_name=MsgKey.DEBUG_EX_TIME.value))
     generic_data: Optional[object] = field(default=None, metadata=config(field_name=MsgKey.DATA.value))
+    retry_after: Optional[float] = field(default=None, metadata=config(field_name=MsgKey.RETRY_AFTER.value))
+    op_id: Optional[list] = field(default=None, metadata=config(field_name=MsgKey.OP_ID.value))
+    slot: Optional[int] = field(default=None, metadata=config(field_name=MsgKey.SLOT.value))
+    batch: Optional[list] = field(default=None, metadata=config(field_name=MsgKey.BATCH.value))
+
+
+# Message attribute for each message key
+FIELD_NAMES = {
+    MsgKey.TYPE: "type",
+    MsgKey.CONFIG: "c",
+    MsgKey.OPERATION: "o",
+    MsgKey.PID: "pid",
+    MsgKey.SIGN: "sign",
+    MsgKey.DECISION: "decision",
+    MsgKey.S_STATE: "tc",
+    MsgKey.S_RES: "rc",
+    MsgKey.MSG_SET: "msg_set",
+    MsgKey.LEADER_BUFFER: "leader_buffer",
+    MsgKey.DEBUG_FAULTY: "debug_faulty",
+    MsgKey.DEBUG_EX_TIME: "debug_ex_time",
+    MsgKey.DATA: "generic_data",
+    MsgKey.RETRY_AFTER: "retry_after",
+    MsgKey.OP_ID: "op_id",
+    MsgKey.SLOT: "slot",
+    MsgKey.BATCH: "batch"
+}
+
+
+class LazyMessageSet(Mapping):
+    """
+    Class representing the set of messages contained in a message (e.g. the APPROVE messages of an ORDER).
+    Each message is decoded only when it is accessed, so a message that is discarded does not pay the decoding of its
+    whole set.
+
+    Attributes:
+        raw_messages (dict): dictionary that contains the process id as key and the encoded message as value
+        decoder (function): function decoding an encoded message
+        messages (dict): dictionary that contains the process id as key and the decoded message as value
+    """
+
+    def __init__(self, raw_messages: dict, decoder, messages: dict = None):
+        """
+        Initialize the lazy message set.
+
+        Parameters:
+            raw_messages: dictionary that contains the process id as key and the encoded message as value
+            decoder: function decoding an encoded message
+            messages: dictionary that contains the process id as key and the already decoded message as value
+        """
+        self.raw_messages = raw_messages
+        self.decoder = decoder
+        self.messages = {} if messages is None else messages
+
+    def __getitem__(self, pid) -> Message:
+        message = self.messages.get(pid)
+        if message is None:
+            message = self.decoder(self.raw_messages[pid])
+            self.messages[pid] = message
+        return message
+
+    def __contains__(self, pid) -> bool:
+        return pid in self.raw_messages
+
+    def __iter__(self):
+        return iter(self.raw_messages)
+
+    def __len__(self) -> int:
+        return len(self.raw_messages)
+
+    def __repr__(self) -> str:
+        return "{" + ", ".join(f"{pid!r}: {self.messages[pid] if pid in self.messages else '<encoded>'}"
+                               for pid in self.raw_messages) + "}"
+
+
+class LazyLeaderBuffer(Sequence):
+    """
+    Class representing the leader buffer contained in a NEW_SIEVE_CONFIG message, decoded only when it is accessed
+    (i.e. only by the process that becomes the new leader).
+
+    Attributes:
+        raw_items (object): encoded leader buffer, None once decoded
+        decoder (function): function decoding the encoded leader buffer
+        items (list): decoded leader buffer, None until it is accessed
+    """
+
+    def __init__(self, raw_items, decoder):
+        """
+        Initialize the lazy leader buffer.
+
+        Parameters:
+            raw_items: encoded leader buffer
+            decoder: function decoding the encoded leader buffer
+        """
+        self.raw_items = raw_items
+        self.decoder = decoder
+        self.items = None
+
+    def __decoded(self) -> list:
+        if self.items is None:
+            self.items = self.decoder(self.raw_items)
+            self.raw_items = None
+        return self.items
+
+    def __getitem__(self, index):
+        return self.__decoded()[index]
+
+    def __len__(self) -> int:
+        return len(self.__decoded())
+
+    def __iter__(self):
+        return iter(self.__decoded())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "<encoded>" if self.items is None else repr(self.items)
 
 
 class MessageComposer:
@@ -78,18 +194,20 @@ class MessageComposer:
         return index, value
 
     @staticmethod
-    def compose_client_invoke(operation) -> Message:
+    def compose_client_invoke(operation, op_id=None) -> Message:
         """
         Compose a CLIENT_INVOKE message.
 
         Parameters:
             operation: the operation to be invoked
+            op_id: (client id, sequence number) given by the client, the replica replaces the client id with the one
+                it knows the client by
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.CLIENT_INVOKE.value, o=operation)
+        return Message(type=MsgType.CLIENT_INVOKE.value, o=operation, op_id=op_id)
 
     @staticmethod
     def compose_debug(command: tuple) -> Message:
@@ -103,15 +221,10 @@ class MessageComposer:
             the message composed
         """
 
-        message = {
-            MsgKey.TYPE.value: MsgType.DEBUG.value,
-            MsgKey.DEBUG_FAULTY.value: False,
-            MsgKey.DEBUG_EX_TIME.value: False
-        }
-
-        message[command[0]] = command[1]
+        message = Message(type=MsgType.DEBUG.value, debug_faulty=False, debug_ex_time=False)
+        setattr(message, FIELD_NAMES[MsgKey(command[0])], command[1])
 
-        return unmarshall_message(message)
+        return message
 
     @staticmethod
     def compose_close() -> Message:
@@ -136,20 +249,20 @@ class MessageComposer:
         return Message(type=MsgType.START.value)
 
     @staticmethod
-    def compose_validation(decision: MsgType, c: int, operation) -> Message:
+    def compose_validation(decision: MsgType, c: int, op_id) -> Message:
         """
         Compose a VALIDATION message.
 
         Parameters:
             decision: decision of the validation
             c: current config (current turn)
-            operation: operation to validate
+            op_id: id of the operation to validate
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.VALIDATION.value, decision=decision, c=c, o=operation)
+        return Message(type=MsgType.VALIDATION.value, decision=decision, c=c, op_id=op_id)
 
     @staticmethod
     def compose_request_value(key: object) -> Message:
@@ -166,7 +279,7 @@ class MessageComposer:
         return Message(type=MsgType.REQUEST_VALUE.value, generic_data=key)
 
     @staticmethod
-    def compose_output(msg_type: MsgType, c: int, data) -> Message:
+    def compose_output(msg_type: MsgType, c: int, data, op_id=None) -> Message:
         """
         Compose an OUTPUT message.
 
@@ -174,134 +287,168 @@ class MessageComposer:
             msg_type: type of the message
             c: current config (current turn)
             data: generic data to be sent
+            op_id: id of the operation the output refers to, None if it doesn't refer to an operation
 
         Returns:
             the message composed
         """
 
-        return Message(type=msg_type, c=c, generic_data=data)
+        return Message(type=msg_type, c=c, generic_data=data, op_id=op_id)
 
     @staticmethod
-    def compose_commit(c: int, operation) -> Message:
+    def compose_operation_not_queued(c: int, operation, retry_after: float = None, op_id=None) -> Message:
+        """
+        Compose an OPERATION_NOT_QUEUED message for an operation rejected by the admission control or expired.
+
+        Parameters:
+            c: current config (current turn)
+            operation: the operation not queued
+            retry_after: seconds the client should wait before invoking the operation again, None if it is expired
+            op_id: id of the operation
+
+        Returns:
+            the message composed
+        """
+
+        return Message(type=MsgType.OPERATION_NOT_QUEUED.value, c=c, generic_data=operation, retry_after=retry_after,
+                       op_id=op_id)
+
+    @staticmethod
+    def compose_commit(c: int, op_id) -> Message:
         """
         Compose a COMMIT message.
 
         Parameters:
             c: current config (current turn)
-            operation: the operation to commit
+            op_id: id of the operation to commit
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.COMMIT.value, c=c, o=operation)
+        return Message(type=MsgType.COMMIT.value, c=c, op_id=op_id)
 
     @staticmethod
-    def compose_abort(c: int, operation) -> Message:
+    def compose_abort(c: int, op_id) -> Message:
         """
         Compose an ABORT message.
 
         Parameters:
             c: current config (current turn)
-            operation: the operation to abort
+            op_id: id of the operation to abort
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.ABORT.value, c=c, o=operation)
+        return Message(type=MsgType.ABORT.value, c=c, op_id=op_id)
 
     @staticmethod
-    def compose_complain(c: int, operation, pid: int) -> Message:
+    def compose_complain(c: int, op_id, pid: int) -> Message:
         """
         Compose a COMPLAIN message.
 
         Parameters:
             c: current config (current turn)
-            operation: the operation to complain about
+            op_id: id of the operation to complain about
             pid: process id of the process that sent the complaint
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.COMPLAIN.value, c=c, o=operation, pid=pid)
+        return Message(type=MsgType.COMPLAIN.value, c=c, op_id=op_id, pid=pid)
 
     @staticmethod
-    def compose_invoke(c: int, operation, pid=None) -> Message:
+    def compose_invoke(c: int, operation, op_id) -> Message:
         """
         Compose an INVOKE message.
 
         Parameters:
             c: current config (current turn)
             operation: the operation to invoke
-            pid: process id of the process that sent the message invoke
+            op_id: (client id, sequence number) of the operation
 
         Returns:
             the message composed
         """
 
-        message = {
-            MsgKey.TYPE.value: MsgType.INVOKE.value,
-            MsgKey.CONFIG.value: c,
-            MsgKey.OPERATION.value: operation
-        }
-
-        if pid is not None:
-            message[MsgKey.PID.value] = pid
+        if operation is not None and not isinstance(operation, list):
+            operation = list(operation)  # same type the operation has when received
 
-        return unmarshall_message(message)
+        return Message(type=MsgType.INVOKE.value, c=c, o=operation, op_id=op_id)
 
     @staticmethod
-    def compose_execute(c: int, operation):
+    def compose_execute(c: int, operation, op_id=None, slot: int = None):
         """
-        Compose an EXECUTE message.
+        Compose an EXECUTE message, the only message of a round carrying the operation besides the INVOKE.
 
         Parameters:
             c: current config (current turn)
             operation: the operation to execute
+            op_id: id of the operation, the next messages of the round refer to the operation by it
+            slot: position of the operation in the order of execution, the operations are committed in this order
+
+        Returns:
+            the message composed
+        """
+
+        return Message(type=MsgType.EXECUTE.value, c=c, o=operation, op_id=op_id, slot=slot)
+
+    @staticmethod
+    def compose_execute_batch(c: int, operations: list, op_ids: list, slot: int = None):
+        """
+        Compose an EXECUTE message for a batch of operations, executed, approved and validated together.
+
+        Parameters:
+            c: current config (current turn)
+            operations: the operations to execute, in order
+            op_ids: ids of the operations, the next messages of the round refer to the batch by the first one
+            slot: position of the batch in the order of execution, the operations are committed in this order
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.EXECUTE.value, c=c, o=operation)
+        return Message(type=MsgType.EXECUTE.value, c=c, o=list(operations), op_id=op_ids[0], slot=slot,
+                       batch=list(op_ids))
 
     @staticmethod
-    def compose_approve(c: int, operation, sign: str) -> Message:
+    def compose_approve(c: int, op_id, sign) -> Message:
         """
         Compose an APPROVAL message.
 
         Parameters:
             c: current config (current turn)
-            operation: the operation to approve
-            sign: signature of the result
+            op_id: id of the operation to approve
+            sign: signature of the result, a list with a signature for each operation of a batch
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.APPROVE.value, c=c, o=operation, sign=sign)
+        return Message(type=MsgType.APPROVE.value, c=c, op_id=op_id, sign=sign)
 
     @staticmethod
-    def compose_order(decision, c: int, operation, tc: int, rc, msg_set: dict) -> Message:
+    def compose_order(decision, c: int, op_id, tc: int, rc, msg_set: dict) -> Message:
         """
         Compose an ORDER message.
 
         Parameters:
             decision: decision to sign
             c: current config (current turn)
-            operation: the operation to order
+            op_id: id of the operation to order
             tc: speculative state
-            rc: speculative response
+            rc: speculative response, a list with the response of each operation of a batch, None for the
+                operations aborted
             msg_set: if the decision value is CONFIRM, it contains a set of correct APPROVAL messages
-                else it must contain a set of all replies
+                else it must contain a set of all replies, it always contains all the replies for a batch
 
         Returns:
             the message composed
         """
 
-        return Message(type=MsgType.ORDER.value, decision=decision, c=c, o=operation, tc=tc, rc=rc, msg_set=msg_set)
+        return Message(type=MsgType.ORDER.value, decision=decision, c=c, op_id=op_id, tc=tc, rc=rc, msg_set=msg_set)
 
     @staticmethod
     def compose_new_sieve_config(c: int, pid: int) -> Message:
@@ -319,6 +466,24 @@ class MessageComposer:
         return Message(type=MsgType.NEW_SIEVE_CONFIG.value, c=c, pid=pid, generic_data=False)
 
 
+def decode_leader_buffer(items: list) -> list:
+    """
+    Decode the leader buffer contained in a message, restoring the key types lost in json format.
+
+    Parameters:
+        items: list containing the leader's buffer of operation ids, the buffer queue and the list of
+            (operation id, operation) pairs
+
+    Returns:
+        list containing the leader's buffer, the buffer queue and the list of (operation id, operation) pairs, in the
+        shape the leader composed it so that the message can be serialized again
+    """
+
+    return [dict((int(pid), tuple(op_id)) for pid, op_id in items[0].items()),
+            items[1],
+            [(tuple(item[0]), item[1]) for item in items[2]]]
+
+
 def marshall_message(message: Message) -> dict:
     """
     Marshall the message into json format.
@@ -45,3 +45,17 @@ class MsgKey(Enum):
     DEBUG_FAULTY = "debug-faulty"
     DEBUG_EX_TIME = "debug-ex-time"  # debug option for execution time simulation
     DATA = "generic-data"
+    RETRY_AFTER = "retry-after"  # seconds a client should wait before invoking a rejected operation again
+    OP_ID = "op-id"  # (client id, sequence number) identifying an operation
+    SLOT = "slot"  # position of an operation in the order of execution given by the leader
+    BATCH = "batch"  # ids of the operations executed together by an EXECUTE
+
+
+class FrameKind(Enum):
+    """
+    Enum representing the kind of datagram, written in its first byte.
+    """
+
+    PAIRWISE = 0  # encrypted with the key shared by the sender and the receiver
+    GROUP = 1  # encrypted with the group key of the replicas, followed by the varint epoch of the key
+    FRAGMENT = 2  # fragment of a datagram bigger than the buffer size
@@ -0,0 +1,436 @@
+#!/bin/bash
+
+from collections import deque
+from heapq import heappop, heappush
+from threading import Condition, Lock, RLock, Thread
+from time import monotonic
+
+from gui.client_config import CLIENT_PID
+from utils.msg import Message
+from utils.msg_variables import MsgType
+
+SEND_WORKERS = 2  # number of threads sending the queued messages
+SEND_QUEUE_DEPTH = 256  # max number of messages queued for a peer, only the consensus messages are queued beyond it
+SEND_BATCH = 16  # max number of messages sent to a peer before the worker moves to the next peer
+SEND_BATCH_WINDOW = 0  # seconds a peer waits for more messages before its queue is sent, unless SEND_BATCH are queued
+SEND_FLUSH_TIMEOUT = 1  # max seconds waited on close for the queued messages to be sent
+STALE_TYPES = {MsgType.EXECUTE.value, MsgType.APPROVE.value, MsgType.ORDER.value, MsgType.VALIDATION.value,
+               MsgType.COMPLAIN.value}  # messages ignored by the replicas once their sieve-config is over
+COALESCED_TYPES = {MsgType.NEW_SIEVE_CONFIG.value}  # messages superseded by a newer one of the same type
+# Consensus and config messages, never dropped for a full queue of a replica since the protocol doesn't send them again
+RELIABLE_TYPES = STALE_TYPES | COALESCED_TYPES | {MsgType.COMMIT.value, MsgType.ABORT.value}
+
+
+class Outgoing:
+    """
+    Class representing a message to send to some receivers, with the datagrams built only once for all of them.
+
+    Attributes:
+        message (Message): message to send
+        receivers (list): ids of the processes to send the message to
+        broadcast (bool): whether the message is broadcast to the receivers
+        remaining (int): number of receivers the message has not been sent to or dropped for yet
+        built (dict): data built from the message, indexed by name
+    """
+
+    def __init__(self, message: Message, receivers: list, broadcast: bool = False):
+        """
+        Initialize the outgoing message.
+
+        Parameters:
+            message: message to send
+            receivers: ids of the processes to send the message to
+            broadcast: whether the message is broadcast to the receivers
+        """
+        self.message = message
+        self.receivers = receivers
+        self.broadcast = broadcast
+        self.remaining = len(receivers)
+        self.built = {}
+        self.lock = RLock()
+
+    def build(self, name: str, function):
+        """
+        Get the data built from the message, building it on first use.
+
+        Parameters:
+            name: name of the data
+            function: function without parameters building the data
+
+        Returns:
+            the data
+        """
+
+        with self.lock:
+            if name not in self.built:
+                self.built[name] = function()
+            return self.built[name]
+
+    def done(self) -> bool:
+        """
+        Record that the message has been sent to one more receiver, or dropped for it.
+
+        Returns:
+            True if it was the last receiver
+        """
+
+        with self.lock:
+            self.remaining -= 1
+            return self.remaining == 0
+
+
+class SendQueues:
+    """
+    Class queuing the messages for each peer, so that the thread sending a message only enqueues it. A pool of
+    workers sends the queued messages, each peer drained by one worker at a time in the order the messages were
+    queued, so that a slow peer only delays its own messages.
+
+    With a batch window, the first message queued for an idle peer waits for the window to end or for SEND_BATCH
+    messages to be queued, so that the worker can pack them in a single datagram.
+
+    The messages of a past sieve-config are dropped before being sent to a replica, and a NEW_SIEVE_CONFIG message
+    replaces the older ones still queued for the same peer. When the queue of a peer is full of messages that are not
+    stale, a new message is dropped, unless it is a consensus message for a replica: the oldest queued message that
+    is not a consensus one is dropped in its place, or the queue overflows its depth if there is none.
+
+    Attributes:
+        deliver: function sending a list of outgoing messages to one of their receivers
+        max_depth (int): max number of messages queued for a peer
+        window (float): seconds a peer waits for more messages before its queue is sent
+        config (int): current sieve-config number, the messages of the previous ones are stale
+        queues (dict): dictionary that contains the peer id as key and the deque of (outgoing message, time it was
+            queued) as value
+        scheduled (set): ids of the peers waiting for a worker or being drained by one
+        due (list): heap of the (time the queue is due, peer id) of the peers waiting for a worker
+        draining (set): ids of the peers being drained by a worker
+        stopped (bool): whether the workers must stop
+        workers (list): threads sending the queued messages
+        stats (dict): dictionary that contains the peer id as key and the counters of its messages as value
+        evicted (dict): counters of the peers forgotten and of the messages dropped because their peer was forgotten
+    """
+
+    def __init__(self, deliver, workers: int = SEND_WORKERS, max_depth: int = SEND_QUEUE_DEPTH,
+                 window: float = SEND_BATCH_WINDOW):
+        """
+        Initialize the send queues and start the workers.
+
+        Parameters:
+            deliver: function sending a list of outgoing messages to one of their receivers
+            workers: number of threads sending the queued messages
+            max_depth: max number of messages queued for a peer
+            window: seconds a peer waits for more messages before its queue is sent
+        """
+        self.deliver = deliver
+        self.max_depth = max_depth
+        self.window = window
+        self.config = 0
+        self.queues = {}
+        self.scheduled = set()
+        self.due = []
+        self.draining = set()
+        self.stopped = False
+        self.stats = {}
+        self.evicted = {"peers": 0, "dropped": 0}
+        self.lock = Lock()
+        self.changed = Condition(self.lock)
+        self.workers = [Thread(target=self.__work, daemon=True, name="sender") for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def __peer_stats(self, peer_id: int) -> dict:
+        """
+        Get the counters of a peer, creating them on first use. It must be called holding the lock.
+
+        Parameters:
+            peer_id: id of the peer
+
+        Returns:
+            the counters of the peer
+        """
+
+        stats = self.stats.get(peer_id)
+        if stats is None:
+            stats = self.stats[peer_id] = {"sent": 0, "dropped_stale": 0, "dropped_full": 0, "coalesced": 0,
+                                           "overflows": 0, "max_depth": 0, "latency": 0.0, "max_latency": 0.0}
+        return stats
+
+    def __is_stale(self, outgoing: Outgoing, peer_id: int) -> bool:
+        """
+        Check if a message is stale for a peer.
+
+        Parameters:
+            outgoing: queued message
+            peer_id: id of the peer
+
+        Returns:
+            True if the message belongs to a past sieve-config and the peer is a replica
+        """
+
+        message = outgoing.message
+        return (peer_id < CLIENT_PID and message.type in STALE_TYPES and message.c is not None
+                and message.c < self.config)
+
+    @staticmethod
+    def __is_reliable(outgoing: Outgoing, peer_id: int) -> bool:
+        """
+        Check if a message must never be dropped for a full queue.
+
+        Parameters:
+            outgoing: message to send
+            peer_id: id of the peer
+
+        Returns:
+            True if the message is a consensus message and the peer is a replica
+        """
+
+        return peer_id < CLIENT_PID and outgoing.message.type in RELIABLE_TYPES
+
+    def __make_room(self, queue: deque, outgoing: Outgoing, peer_id: int) -> bool:
+        """
+        Make room in a full queue for a message, dropping the oldest queued message that is not a consensus one if
+        the new message is a consensus one. It must be called holding the lock.
+
+        Parameters:
+            queue: queue of the peer
+            outgoing: message to queue
+            peer_id: id of the peer
+
+        Returns:
+            True if the message must be queued, False if it must be dropped
+        """
+
+        if not self.__is_reliable(outgoing, peer_id):
+            return False
+
+        for index, (queued, _) in enumerate(queue):
+            if not self.__is_reliable(queued, peer_id):
+                del queue[index]
+                self.__discard(queued, peer_id, "dropped_full")
+                return True
+
+        self.__peer_stats(peer_id)["overflows"] += 1
+        return True
+
+    def __discard(self, outgoing: Outgoing, peer_id: int, reason: str) -> None:
+        """
+        Drop a message for a peer, so that it is not waited for by its other receivers. It must be called holding the
+        lock.
+
+        Parameters:
+            outgoing: message to drop
+            peer_id: id of the peer
+            reason: name of the counter to increment
+        """
+
+        outgoing.done()
+        self.__peer_stats(peer_id)[reason] += 1
+
+    def __drop(self, queue: deque, peer_id: int, reason: str, condition) -> None:
+        """
+        Drop the queued messages matching a condition. It must be called holding the lock.
+
+        Parameters:
+            queue: queue of the peer
+            peer_id: id of the peer
+            reason: name of the counter to increment
+            condition: function taking the outgoing message and returning True if it must be dropped
+        """
+
+        kept = [item for item in queue if not condition(item[0])]
+        if len(kept) == len(queue):
+            return
+
+        for outgoing, _ in queue:
+            if condition(outgoing):
+                self.__discard(outgoing, peer_id, reason)
+        queue.clear()
+        queue.extend(kept)
+
+    def put(self, outgoing: Outgoing) -> None:
+        """
+        Queue a message for each of its receivers.
+
+        Parameters:
+            outgoing: message to send
+        """
+
+        message = outgoing.message
+        now = monotonic()
+
+        with self.lock:
+            for peer_id in outgoing.receivers:
+                queue = self.queues.get(peer_id)
+                if queue is None:
+                    queue = self.queues[peer_id] = deque()
+
+                if message.type in COALESCED_TYPES:
+                    self.__drop(queue, peer_id, "coalesced",
+                                lambda queued: queued.message.type == message.type and queued.message.c < message.c)
+                if len(queue) >= self.max_depth:
+                    self.__drop(queue, peer_id, "dropped_stale", lambda queued: self.__is_stale(queued, peer_id))
+
+                if len(queue) >= self.max_depth and not self.__make_room(queue, outgoing, peer_id):
+                    self.__discard(outgoing, peer_id, "dropped_full")
+                    continue
+
+                queue.append((outgoing, now))
+                stats = self.__peer_stats(peer_id)
+                stats["max_depth"] = max(stats["max_depth"], len(queue))
+                if peer_id not in self.scheduled:
+                    self.scheduled.add(peer_id)
+                    heappush(self.due, (now + self.window, peer_id))
+                    self.changed.notify()
+                elif self.window and len(queue) == SEND_BATCH:
+                    # The batch is full, the peer doesn't wait for the end of the window
+                    heappush(self.due, (now, peer_id))
+                    self.changed.notify()
+
+    def set_config(self, config: int) -> None:
+        """
+        Set the current sieve-config, the messages of the previous ones still queued are not sent to the replicas.
+
+        Parameters:
+            config: sieve-config number
+        """
+
+        with self.lock:
+            self.config = max(self.config, config)
+
+    def forget(self, peer_id) -> None:
+        """
+        Drop the messages queued for a peer and its counters, the messages dropped are counted in the evicted
+        counters.
+
+        Parameters:
+            peer_id: id of the peer
+        """
+
+        peer_id = int(peer_id)
+        with self.lock:
+            queue = self.queues.pop(peer_id, ())
+            for outgoing, _ in queue:
+                outgoing.done()
+            if self.stats.pop(peer_id, None) is not None:
+                self.evicted["peers"] += 1
+            self.evicted["dropped"] += len(queue)
+
+    def __next_peer(self) -> int:
+        """
+        Wait for the queue of a peer to be due and take it. It must be called holding the lock.
+
+        Returns:
+            the id of the peer, None if the workers must stop
+        """
+
+        while not self.stopped:
+            if not self.due:
+                self.changed.wait()
+                continue
+
+            due, peer_id = self.due[0]
+            wait = due - monotonic()
+            if wait > 0:
+                self.changed.wait(wait)
+                continue
+
+            heappop(self.due)
+            if peer_id in self.scheduled and peer_id not in self.draining:
+                self.draining.add(peer_id)
+                return peer_id
+
+        return None
+
+    def __work(self) -> None:
+        """
+        Send the queued messages, taking the peers in the order their queues became due.
+        """
+
+        while True:
+            with self.lock:
+                peer_id = self.__next_peer()
+                if peer_id is None:
+                    return
+
+                items = []
+                queue = self.queues.get(peer_id, ())
+                while queue and len(items) < SEND_BATCH:
+                    outgoing, queued = queue.popleft()
+                    if self.__is_stale(outgoing, peer_id):
+                        self.__discard(outgoing, peer_id, "dropped_stale")
+                    else:
+                        items.append((outgoing, queued))
+
+            if items:
+                try:
+                    self.deliver([outgoing for outgoing, _ in items], peer_id)
+                except Exception as e:
+                    print(f"Send error: {e}")
+
+            now = monotonic()
+            with self.lock:
+                # The counters of a peer forgotten while its messages were sent are not created again
+                stats = self.stats.get(peer_id, {"sent": 0, "latency": 0.0, "max_latency": 0.0})
+                for _, queued in items:
+                    stats["sent"] += 1
+                    stats["latency"] += now - queued
+                    stats["max_latency"] = max(stats["max_latency"], now - queued)
+
+                self.draining.discard(peer_id)
+                if self.queues.get(peer_id):
+                    heappush(self.due, (now, peer_id))
+                else:
+                    self.queues.pop(peer_id, None)
+                    self.scheduled.discard(peer_id)
+                self.changed.notify_all()
+
+    def close(self, timeout: float = SEND_FLUSH_TIMEOUT) -> None:
+        """
+        Wait for the queued messages to be sent and stop the workers.
+
+        Parameters:
+            timeout: max seconds to wait for the queued messages to be sent
+        """
+
+        with self.changed:
+            self.changed.wait_for(lambda: not self.scheduled, timeout)
+            self.stopped = True
+            self.changed.notify_all()
+
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def get_stats(self) -> dict:
+        """
+        Get the gauges of the send queues.
+
+        Returns:
+            dictionary that contains the peer id as key and, as value, the number of messages queued, the max number
+            reached, the counters of the messages sent, dropped and coalesced, the number of consensus messages
+            queued beyond the depth and the mean and max time in milliseconds between the queuing and the sending of
+            a message
+        """
+
+        with self.lock:
+            return dict((peer_id, {
+                "depth": len(self.queues.get(peer_id, ())),
+                "max_depth": stats["max_depth"],
+                "sent": stats["sent"],
+                "dropped_stale": stats["dropped_stale"],
+                "dropped_full": stats["dropped_full"],
+                "coalesced": stats["coalesced"],
+                "overflows": stats["overflows"],
+                "latency_ms": stats["latency"] / stats["sent"] * 1000 if stats["sent"] else 0.0,
+                "max_latency_ms": stats["max_latency"] * 1000
+            }) for peer_id, stats in self.stats.items())
+
+    def get_evicted_stats(self) -> dict:
+        """
+        Get the counters of the forgotten peers.
+
+        Returns:
+            dictionary containing the number of peers forgotten and of the messages dropped because their peer was
+            forgotten
+        """
+
+        with self.lock:
+            return dict(self.evicted)
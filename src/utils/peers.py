@@ -0,0 +1,429 @@
+#!/bin/bash
+
+import socket
+import sys
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from gui.client_config import CLIENT_PID
+
+BASE_PORT = 8000  # the port of a process is BASE_PORT + process id
+CLIENT_BASE_PORT = 7000  # usual base of the client ports when enabled, the client port is then it + process id
+CLIENT_PORT_THRESHOLD = 10000  # datagrams from ports above this one come from clients behind a port mapping
+RESOLVE_REFRESH = 30  # seconds after which a resolved host name is resolved again
+MAX_CLIENTS = 1024  # max number of client sessions kept, the least recently seen client is evicted first
+CLIENT_IDLE_TIMEOUT = 600  # seconds without datagrams after which a client session is evicted
+
+
+class ClientRegistry:
+    """
+    Class containing the sessions of the clients registered at runtime, bounded in number and in idle time. The
+    listeners are notified of each evicted client, so that the transport and the replica forget it together.
+
+    Attributes:
+        max_clients (int): max number of sessions kept, 0 for no limit
+        idle_timeout (float): seconds without activity after which a session is evicted, 0 to never expire
+        sessions (OrderedDict): dictionary that contains the client id as key and the (time of the last activity,
+            estimated bytes of the session) as value, least recently seen first
+        memory (int): estimated bytes of all the sessions
+        listeners (list): functions called with the id of each evicted client
+        stats (dict): counters of the registered and evicted sessions
+    """
+
+    def __init__(self, max_clients: int = MAX_CLIENTS, idle_timeout: float = CLIENT_IDLE_TIMEOUT):
+        """
+        Initialize the client registry.
+
+        Parameters:
+            max_clients: max number of sessions kept, 0 for no limit
+            idle_timeout: seconds without activity after which a session is evicted, 0 to never expire
+        """
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.memory = 0
+        self.listeners = []
+        self.stats = {
+            "registered": 0,
+            "evicted_lru": 0,
+            "evicted_idle": 0
+        }
+        self.lock = Lock()
+
+    def add_listener(self, listener) -> None:
+        """
+        Add a function to call with the id of each evicted client.
+
+        Parameters:
+            listener: function taking the client id as parameter
+        """
+
+        self.listeners.append(listener)
+
+    def __contains__(self, client_id) -> bool:
+        """
+        Check if a client has a session.
+
+        Parameters:
+            client_id: id of the client
+
+        Returns:
+            True if the client has a session, False otherwise
+        """
+
+        return str(client_id) in self.sessions
+
+    def touch(self, client_id, size: int = 0) -> None:
+        """
+        Register the activity of a client, creating its session if it is new, and evict the sessions over the limits.
+
+        Parameters:
+            client_id: id of the client
+            size: estimated bytes of the session, only used when the session is created
+        """
+
+        client_id = str(client_id)
+        with self.lock:
+            if client_id in self.sessions:
+                size = self.sessions[client_id][1]
+                self.sessions.move_to_end(client_id)
+            else:
+                self.stats["registered"] += 1
+                self.memory += size
+            self.sessions[client_id] = (monotonic(), size)
+
+        self.expire()
+
+    def remove(self, client_id) -> bool:
+        """
+        Remove the session of a client without notifying the listeners.
+
+        Parameters:
+            client_id: id of the client
+
+        Returns:
+            True if the client had a session, False otherwise
+        """
+
+        with self.lock:
+            session = self.sessions.pop(str(client_id), None)
+            if session is not None:
+                self.memory -= session[1]
+        return session is not None
+
+    def expire(self) -> list:
+        """
+        Evict the idle sessions and the least recently seen ones over the max number of sessions.
+
+        Returns:
+            the ids of the evicted clients
+        """
+
+        evicted = []
+        now = monotonic()
+        with self.lock:
+            while self.sessions:
+                client_id, (last_seen, size) = next(iter(self.sessions.items()))
+                if self.idle_timeout and last_seen + self.idle_timeout < now:
+                    self.stats["evicted_idle"] += 1
+                elif self.max_clients and len(self.sessions) > self.max_clients:
+                    self.stats["evicted_lru"] += 1
+                else:
+                    break
+                self.sessions.popitem(last=False)
+                self.memory -= size
+                evicted.append(client_id)
+
+        for client_id in evicted:
+            for listener in self.listeners:
+                listener(client_id)
+
+        return evicted
+
+    def next_expiry(self) -> float:
+        """
+        Get the time at which the least recently seen session becomes idle.
+
+        Returns:
+            the monotonic time of the next idle eviction, None if no session can become idle
+        """
+
+        with self.lock:
+            if not self.idle_timeout or not self.sessions:
+                return None
+            return next(iter(self.sessions.values()))[0] + self.idle_timeout
+
+    def get_stats(self) -> dict:
+        """
+        Get the gauges of the registry.
+
+        Returns:
+            dictionary containing the number of live sessions, their estimated bytes and the counters of the
+            registered and evicted sessions
+        """
+
+        with self.lock:
+            return dict(self.stats, live=len(self.sessions), memory=self.memory)
+
+
+class PeerDirectory:
+    """
+    Class containing the address and the crypto key of each known process, with a reverse index from the socket
+    address to the process id and a cache of the resolved host names, so that the cost of identifying the sender of a
+    datagram and of sending a datagram does not depend on the number of processes.
+
+    Attributes:
+        pid (int): process id of the current process
+        hosts (dict): dictionary that contains the process id as key and the host as value
+        ports (dict): dictionary that contains the process id as key and the port as value
+        keys (dict): dictionary that contains the process id as key and the crypto key as value
+        by_address (dict): dictionary that contains the (ip address, port) as key and the process id as value
+        by_port (dict): dictionary that contains the port as key and the process id as value
+        resolved (dict): dictionary that contains the process id as key and the (resolved socket address, time of
+            the resolution) as value
+        n_clients (int): number of clients registered from a mapped port
+        refresh (float): seconds after which a resolved host name is resolved again
+        clients (ClientRegistry): sessions of the clients registered at runtime
+    """
+
+    def __init__(self, hosts: dict, ports: dict, keys: dict, pid: int, refresh: float = RESOLVE_REFRESH,
+                 clients: ClientRegistry = None):
+        """
+        Initialize the peer directory.
+
+        Parameters:
+            hosts: dictionary that contains the process id as key and the host as value
+            ports: dictionary that contains the process id as key and the port as value
+            keys: dictionary that contains the process id as key and the crypto key as value
+            pid: process id of the current process
+            refresh: seconds after which a resolved host name is resolved again
+            clients: registry of the client sessions, a default one if None
+        """
+        self.pid = pid
+        self.hosts = hosts
+        self.ports = ports
+        self.keys = keys
+        self.by_address = {}
+        self.by_port = dict((port, peer_id) for peer_id, port in ports.items())
+        self.resolved = {}
+        self.n_clients = 0
+        self.refresh = refresh
+        self.lock = Lock()
+        self.clients = ClientRegistry() if clients is None else clients
+        self.clients.add_listener(self.forget)
+
+    def register(self, peer_id: str, address: tuple, key: str) -> None:
+        """
+        Register a process, or update its address.
+
+        Parameters:
+            peer_id: id of the process
+            address: (host, port) of the process
+            key: crypto key shared with the process
+        """
+
+        with self.lock:
+            self.hosts[peer_id] = address[0]
+            self.ports[peer_id] = address[1]
+            self.keys[peer_id] = key
+            self.by_port[address[1]] = peer_id
+            self.by_address[address] = peer_id
+            self.resolved[peer_id] = (address, monotonic())
+
+    def lookup(self, address: tuple) -> str:
+        """
+        Get the id of the process that sent a datagram, registering it as a new client if it is unknown.
+
+        Parameters:
+            address: (ip address, port) the datagram comes from
+
+        Returns:
+            the id of the sender
+        """
+
+        peer_id = self.by_address.get(address)
+        if peer_id is not None:
+            if peer_id in self.clients:
+                self.clients.touch(peer_id)
+            return peer_id
+
+        port = address[1]
+        peer_id = self.by_port.get(port)
+        if peer_id is None:
+            peer_id = self.__port_id(port)
+
+        return self.__register_sender(peer_id, address)
+
+    def lookup_replica(self, address: tuple) -> str:
+        """
+        Get the id of the replica that sent a datagram to the replica-facing socket.
+
+        Parameters:
+            address: (ip address, port) the datagram comes from
+
+        Returns:
+            the id of the sender
+
+        Raises:
+            ValueError: if the address is not the one of a known replica
+        """
+
+        peer_id = self.by_address.get(address)
+        if peer_id is None:
+            peer_id = self.by_port.get(address[1])
+        if peer_id is None or int(peer_id) >= CLIENT_PID:
+            raise ValueError(f"Datagram from {address} on the replica port, it is not a known replica")
+
+        self.by_address[address] = peer_id
+        return peer_id
+
+    def lookup_client(self, address: tuple) -> str:
+        """
+        Get the id of the client that sent a datagram to the client-facing socket, registering it if it is unknown.
+        The replica ids are never returned, a client can't impersonate a replica.
+
+        Parameters:
+            address: (ip address, port) the datagram comes from
+
+        Returns:
+            the id of the sender
+        """
+
+        peer_id = self.by_address.get(address)
+        if peer_id is None or int(peer_id) < CLIENT_PID:
+            peer_id = self.by_port.get(address[1])
+        if peer_id is None or int(peer_id) < CLIENT_PID:
+            peer_id = self.__port_id(address[1], True)
+
+        return self.__register_sender(peer_id, address)
+
+    def __port_id(self, port: int, client: bool = False) -> str:
+        """
+        Get the id of an unknown process from the port it sends from: a client behind a port mapping gets the next
+        free client id, the others the id their port is derived from.
+
+        Parameters:
+            port: port the datagram comes from
+            client: whether the process is a client, a port deriving the id of a replica then gets a new client id
+
+        Returns:
+            the id of the process
+        """
+
+        with self.lock:
+            if port > CLIENT_PORT_THRESHOLD or (client and port - BASE_PORT < CLIENT_PID):
+                peer_id = str(CLIENT_PID + self.n_clients)
+                self.n_clients += 1
+            else:
+                peer_id = str(port - BASE_PORT)
+                if int(peer_id) >= CLIENT_PID:
+                    self.n_clients = max(self.n_clients, int(peer_id) - CLIENT_PID + 1)
+        return peer_id
+
+    def __register_sender(self, peer_id: str, address: tuple) -> str:
+        """
+        Register the address of a sender, and its client session if it is a new client.
+
+        Parameters:
+            peer_id: id of the sender
+            address: (ip address, port) the datagram comes from
+
+        Returns:
+            the id of the sender
+        """
+
+        # Save unknown host and port
+        if peer_id not in self.ports:
+            self.register(peer_id, address, str(self.pid))
+            self.clients.touch(peer_id, sum(sys.getsizeof(item) for item in (peer_id, address, str(self.pid))))
+        elif peer_id in self.clients:
+            self.clients.touch(peer_id)
+
+        self.by_address[address] = peer_id
+        return peer_id
+
+    def forget(self, peer_id) -> None:
+        """
+        Remove a process registered at runtime, and all the addresses it is known with.
+
+        Parameters:
+            peer_id: id of the process
+        """
+
+        peer_id = str(peer_id)
+        with self.lock:
+            host, port = self.hosts.pop(peer_id, None), self.ports.pop(peer_id, None)
+            self.keys.pop(peer_id, None)
+            resolved = self.resolved.pop(peer_id, None)
+            for address in ((host, port), resolved[0] if resolved is not None else None):
+                if self.by_address.get(address) == peer_id:
+                    del self.by_address[address]
+            if self.by_port.get(port) == peer_id:
+                del self.by_port[port]
+
+    def is_known(self, peer_id) -> bool:
+        """
+        Check if a process is known.
+
+        Parameters:
+            peer_id: id of the process
+
+        Returns:
+            True if the address and the key of the process are known, False otherwise
+        """
+
+        peer_id = str(peer_id)
+        return peer_id in self.keys and peer_id in self.ports
+
+    def get_address(self, peer_id) -> tuple:
+        """
+        Get the socket address of a process, resolving its host name at most once every refresh period.
+
+        Parameters:
+            peer_id: id of the process
+
+        Returns:
+            the (ip address, port) of the process
+        """
+
+        peer_id = str(peer_id)
+        cached = self.resolved.get(peer_id)
+        if cached is not None and monotonic() < cached[1] + self.refresh:
+            return cached[0]
+
+        host, port = self.hosts[peer_id], self.ports[peer_id]
+        try:
+            address = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        except socket.gaierror:
+            # Keep the last resolved address if the resolution fails, or let the socket resolve the name
+            address = cached[0] if cached is not None else (host, port)
+
+        with self.lock:
+            self.resolved[peer_id] = (address, monotonic())
+            self.by_address[address] = peer_id
+
+        return address
+
+    def get_key(self, peer_id) -> str:
+        """
+        Get the crypto key shared with a process.
+
+        Parameters:
+            peer_id: id of the process
+
+        Returns:
+            the crypto key
+        """
+
+        return self.keys[str(peer_id)]
+
+    def get_ids(self) -> list:
+        """
+        Get the ids of the processes sharing a crypto key with the current process.
+
+        Returns:
+            the list of process ids
+        """
+
+        return [int(peer_id) for peer_id in list(self.keys.keys())]
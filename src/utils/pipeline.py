@@ -0,0 +1,168 @@
+#!/bin/bash
+
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Lock, Thread
+
+from utils.buffers import BufferPool
+from utils.communication import Communication
+
+DECODE_WORKERS = 4  # number of threads decrypting and decoding the datagrams
+MAX_DECODING = 1024  # max number of datagrams being decoded, the socket is not drained while the limit is reached
+
+
+class ReceivePipeline:
+    """
+    Class receiving the messages in three stages: a thread for each socket drains it and identifies the senders, a
+    pool of threads decrypts and decodes the datagrams in parallel, and a thread hands the messages off in the order
+    the datagrams were received.
+
+    Attributes:
+        communication (Communication): communication owning the sockets
+        on_message: function called with each message received and the id of its sender
+        workers (int): number of threads decrypting and decoding the datagrams
+        decoding (Queue): datagrams being decoded, in the order they were received
+        stats (dict): counters of the datagrams drained, decoded and handed off and max depth of each stage
+    """
+
+    def __init__(self, communication: Communication, on_message, workers: int = DECODE_WORKERS,
+                 max_decoding: int = MAX_DECODING):
+        """
+        Initialize the receive pipeline.
+
+        Parameters:
+            communication: communication owning the sockets
+            on_message: function called with each message received and the id of its sender
+            workers: number of threads decrypting and decoding the datagrams
+            max_decoding: max number of datagrams being decoded
+        """
+        self.communication = communication
+        self.on_message = on_message
+        self.workers = workers
+        self.decoding = Queue(max_decoding)
+        self.stats = {
+            "drained": 0,
+            "decoded": 0,
+            "handed_off": 0,
+            "max_decoding": 0
+        }
+        self.lock = Lock()
+        communication.pipeline = self
+
+    def run(self) -> None:
+        """
+        Drain the sockets until they are closed. The decode and hand-off stages run in their own threads.
+        """
+
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix="decode")
+        hand_off = Thread(target=self.__hand_off, daemon=True)
+        hand_off.start()
+
+        drains = [Thread(target=self.__drain, args=(sock, pool), daemon=True)
+                  for sock in self.communication.sockets[1:] + self.communication.client_sockets]
+        for drain in drains:
+            drain.start()
+
+        self.__drain(self.communication.socket, pool)
+
+        for drain in drains:
+            drain.join()
+
+        self.decoding.put(None)
+        hand_off.join()
+        pool.shutdown()
+
+    def __drain(self, sock: socket.socket, pool: ThreadPoolExecutor) -> None:
+        """
+        Drain a socket until it is closed, submitting the datagrams to the decode workers. The datagrams are received
+        into buffers of the pool, released by the workers once decoded.
+
+        Parameters:
+            sock: socket to drain
+            pool: decode workers
+        """
+
+        buffers = self.communication.get_buffers(sock)
+        while True:
+            buffer = buffers.acquire()
+            try:
+                size, addr = sock.recvfrom_into(buffer)
+            except socket.error as e:
+                buffers.release(buffer)
+                # Irrelevant errors when closing the socket, only related to the socket implementation in python
+                if e.errno == 9 or e.errno == 10038:
+                    break
+                print(f"Receive socket error: {e}")
+                continue
+
+            if addr is None:
+                # The socket has been shut down
+                buffers.release(buffer)
+                break
+
+            try:
+                sender_id = self.communication.identify(addr, sock)
+            except Exception as e:
+                buffers.release(buffer)
+                print(f"Receive error: {e}")
+                continue
+
+            # The senders are identified here, in order, because the new clients get their id from the arrival order.
+            # A sender always hits the same socket, so its datagrams are still handed off in order.
+            self.decoding.put((pool.submit(self.__decode, buffers, buffer, size, sender_id, addr), sender_id))
+            with self.lock:
+                self.stats["drained"] += 1
+                self.stats["max_decoding"] = max(self.stats["max_decoding"], self.decoding.qsize())
+
+    def __decode(self, buffers: BufferPool, buffer: bytearray, size: int, sender_id: str, addr: tuple) -> list:
+        """
+        Decode the datagram contained in a receive buffer and release the buffer.
+
+        Parameters:
+            buffers: pool the receive buffer belongs to
+            buffer: receive buffer
+            size: size of the datagram
+            sender_id: id of the process that sent the datagram
+            addr: address the datagram comes from
+
+        Returns:
+            the list of messages, empty if the datagram doesn't complete a valid message
+        """
+
+        try:
+            return self.communication.decode_datagram(memoryview(buffer)[:size], sender_id, addr)
+        finally:
+            buffers.release(buffer)
+
+    def __hand_off(self) -> None:
+        """
+        Pass the decoded messages on, in the order the datagrams were received.
+        """
+
+        while True:
+            item = self.decoding.get()
+            if item is None:
+                return
+
+            future, sender_id = item
+            messages = future.result()
+            with self.lock:
+                self.stats["decoded"] += 1
+
+            for message in messages:
+                self.on_message(message, sender_id)
+            with self.lock:
+                self.stats["handed_off"] += len(messages)
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the pipeline.
+
+        Returns:
+            dictionary containing the counters of the datagrams drained, decoded and handed off, the number of
+            datagrams being decoded and the max number reached
+        """
+
+        with self.lock:
+            return dict(self.stats, decoding=self.decoding.qsize())
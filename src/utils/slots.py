@@ -0,0 +1,281 @@
+#!/bin/bash
+
+from utils.utils import State, signp, verifyp
+
+
+class Slot:
+    """
+    Class representing an instance of the sieve protocol in progress, for one operation or for a batch of operations
+    executed, approved and validated together. Each slot has its own speculative state and responses and its own
+    approve and validation messages.
+
+    Attributes:
+        number (int): position of the slot in the order of execution given by the leader
+        ops (list): operations, in the order they are executed
+        op_ids (list): (client id, sequence number) of each operation
+        pids (list): id of the process that invoked each operation on the leader, None on the other processes
+        s (State): state of the slot, COMMIT once the slot is committed and waits for the slots before it
+        t (State): speculative state
+        r (list): speculative response of each operation
+        signs (list): signature approved for each operation of a batch, None for the operations that can't be
+            committed, None until the order of the batch is known
+        msg_buffer (dict): approve and validation messages received for the slot
+        last_order (Message): order sent or received for the slot
+        new_config (bool): whether the leader starts a new sieve config once the slot is committed
+    """
+
+    def __init__(self, number: int, ops: list, op_ids: list, pids: list = None):
+        """
+        Initialize the slot.
+
+        Parameters:
+            number: position of the slot in the order of execution
+            ops: operations
+            op_ids: ids of the operations
+            pids: ids of the processes that invoked the operations on the leader
+        """
+        self.number = number
+        self.ops = ops
+        self.op_ids = op_ids
+        self.pids = pids
+        self.s = State.ELABORATION
+        self.t = None
+        self.r = None
+        self.signs = None
+        self.msg_buffer = {}
+        self.last_order = None
+        self.new_config = False
+
+    def __repr__(self) -> str:
+        return f"Slot(number={self.number}, op_ids={self.op_ids}, s={self.s.name})"
+
+    @property
+    def op_id(self) -> tuple:
+        """
+        Id of the slot, the id of its first operation: the messages of the round refer to the slot by it.
+        """
+
+        return self.op_ids[0]
+
+    def is_batch(self) -> bool:
+        """
+        Check if the slot executes more than one operation.
+
+        Returns:
+            True if the slot is a batch, False otherwise
+        """
+
+        return len(self.ops) > 1
+
+    def keys(self) -> set:
+        """
+        Get the keys written by the operations of the slot.
+
+        Returns:
+            the set of the keys
+        """
+
+        return set(o[0] for o in self.ops)
+
+    def sign(self) -> object:
+        """
+        Sign the speculative responses, one signature for each operation of a batch.
+
+        Returns:
+            the signature of the response, the list of the signatures for a batch
+        """
+
+        return [signp(r) for r in self.r] if self.is_batch() else signp(self.r[0])
+
+    def diverged(self) -> bool:
+        """
+        Check if the order of the batch aborts an operation, or if the speculative response of the process differs
+        from the one approved for an operation.
+
+        Returns:
+            True if the batch diverged, False otherwise
+        """
+
+        return any(sign is None or not verifyp(r, sign) for r, sign in zip(self.r, self.signs))
+
+    def responses(self, pid: int) -> list:
+        """
+        Get the response to commit for each operation, given the last order: the speculative response of the process
+        if it is the approved one, else the response carried by the order.
+
+        Parameters:
+            pid: id of the process
+
+        Returns:
+            the response of each operation, None for the operations aborted by the order of a batch
+        """
+
+        message = self.last_order
+        if not self.is_batch():
+            if message is None or str(pid) in message.msg_set.keys():
+                return list(self.r)
+            return [message.rc]  # Fix faulty operation value
+
+        if message is None or self.signs is None:
+            return list(self.r)
+        return [None if sign is None else r if verifyp(r, sign) else rc
+                for r, rc, sign in zip(self.r, message.rc, self.signs)]
+
+
+class SlotWindow:
+    """
+    Class keeping the slots in progress, at most as many as the size of the window. The slots are decided in any
+    order but committed in the order of their number, so that all the processes apply the operations in the same
+    order.
+
+    Attributes:
+        size (int): max number of slots in progress
+        slots (dict): dictionary that contains the id of the slot as key and the slot as value
+        index (dict): dictionary that contains the id of each operation in progress as key and its slot as value
+        stats (dict): counters of the slots opened, committed and aborted and the max number of slots in progress
+    """
+
+    def __init__(self, size: int = 1):
+        """
+        Initialize the window.
+
+        Parameters:
+            size: max number of slots in progress, 1 runs the slots one at a time
+        """
+        self.size = max(1, size)
+        self.slots = {}
+        self.index = {}
+        self.stats = {
+            "opened": 0,
+            "committed": 0,
+            "aborted": 0,
+            "max_in_flight": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, op_id) -> bool:
+        return op_id in self.index
+
+    def __iter__(self):
+        return iter(sorted(self.slots.values(), key=lambda slot: slot.number))
+
+    def is_full(self) -> bool:
+        """
+        Check if the window is full.
+
+        Returns:
+            True if no other slot can be opened, False otherwise
+        """
+
+        return len(self.slots) >= self.size
+
+    def add(self, slot: Slot) -> None:
+        """
+        Add a slot to the window.
+
+        Parameters:
+            slot: slot to add
+        """
+
+        self.slots[slot.op_id] = slot
+        self.index.update((op_id, slot) for op_id in slot.op_ids)
+        self.stats["opened"] += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], len(self.slots))
+
+    def get(self, op_id) -> Slot:
+        """
+        Get the slot of an operation.
+
+        Parameters:
+            op_id: id of the operation, of any operation of a batch
+
+        Returns:
+            the slot, None if the operation is not in progress
+        """
+
+        return self.index.get(op_id)
+
+    def last(self) -> Slot:
+        """
+        Get the last slot added.
+
+        Returns:
+            the last slot, None if the window is empty
+        """
+
+        return next(reversed(self.slots.values())) if self.slots else None
+
+    def abort(self, slot: Slot) -> list:
+        """
+        Remove a slot and the slots that depend on it: the next slots writing a key written by a removed slot were
+        executed on the speculative state it wrote.
+
+        Parameters:
+            slot: slot to abort
+
+        Returns:
+            the slots removed, in the order of their number
+        """
+
+        aborted, keys = [], slot.keys()
+        for other in self:
+            if other is slot or (other.number > slot.number and keys & other.keys()):
+                aborted.append(other)
+                keys |= other.keys()
+                self.__remove(other)
+        self.stats["aborted"] += len(aborted)
+        return aborted
+
+    def clear(self) -> list:
+        """
+        Remove all the slots.
+
+        Returns:
+            the slots removed, in the order of their number
+        """
+
+        aborted = list(self)
+        self.slots, self.index = {}, {}
+        self.stats["aborted"] += len(aborted)
+        return aborted
+
+    def pop_committed(self) -> list:
+        """
+        Remove the committed slots that no slot in progress precedes.
+
+        Returns:
+            the slots to apply, in the order of their number
+        """
+
+        committed = []
+        for slot in self:
+            if slot.s != State.COMMIT:
+                break
+            self.__remove(slot)
+            committed.append(slot)
+        self.stats["committed"] += len(committed)
+        return committed
+
+    def __remove(self, slot: Slot) -> None:
+        """
+        Remove a slot and its operations from the index.
+
+        Parameters:
+            slot: slot to remove
+        """
+
+        del self.slots[slot.op_id]
+        for op_id in slot.op_ids:
+            del self.index[op_id]
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the slots.
+
+        Returns:
+            dictionary containing the counters and the number of slots in progress
+        """
+
+        return dict(self.stats, in_flight=len(self.slots))
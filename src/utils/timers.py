@@ -0,0 +1,189 @@
+#!/bin/bash
+
+from heapq import heapify, heappop, heappush
+from time import monotonic
+
+COMPACT_MIN_ENTRIES = 64  # min number of heap entries before the cancelled ones are compacted
+
+
+class TimerHeap:
+    """
+    Class keeping the timers of a process in a min-heap ordered by their deadline on the monotonic clock, so that the
+    next timer is found in O(1), and a timer is armed or cancelled in O(log n) instead of scanning all of them.
+
+    A cancelled or re-armed timer leaves its old entry in the heap, skipped when it reaches the top, and the heap is
+    compacted when the stale entries are more than the live ones. The timers are not thread safe, they are used by
+    the thread running the process.
+
+    Attributes:
+        heap (list): heap of the (deadline, sequence number, key) entries, including the stale ones
+        timers (dict): dictionary that contains the key as key and the (deadline, sequence number, callback) of the
+            live timer as value
+        sequence (int): number of the last entry pushed, it tells a live entry from a stale one with the same key
+        stats (dict): counters of the timers armed, fired, cancelled and rescheduled and of the heap compactions
+    """
+
+    def __init__(self):
+        """
+        Initialize the timers.
+        """
+        self.heap = []
+        self.timers = {}
+        self.sequence = 0
+        self.stats = {
+            "armed": 0,
+            "fired": 0,
+            "cancelled": 0,
+            "rescheduled": 0,
+            "compactions": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self.timers)
+
+    def __contains__(self, key) -> bool:
+        return key in self.timers
+
+    def __entry(self, key, deadline: float, callback) -> tuple:
+        """
+        Record the live timer of a key, replacing the previous one.
+
+        Parameters:
+            key: key of the timer
+            deadline: monotonic time at which the timer is due
+            callback: function without parameters called when the timer is due, None if there is none
+
+        Returns:
+            the heap entry of the timer
+        """
+
+        self.sequence += 1
+        self.timers[key] = (deadline, self.sequence, callback)
+        return deadline, self.sequence, key
+
+    def arm(self, key, deadline: float, callback=None) -> None:
+        """
+        Arm a timer, replacing the timer with the same key if it is armed.
+
+        Parameters:
+            key: key of the timer, any hashable value
+            deadline: monotonic time at which the timer is due
+            callback: function without parameters called when the timer is due, None if the timer only wakes up the
+                thread waiting for the next deadline
+        """
+
+        heappush(self.heap, self.__entry(key, deadline, callback))
+        self.stats["armed"] += 1
+        self.__compact()
+
+    def cancel(self, key) -> bool:
+        """
+        Cancel a timer.
+
+        Parameters:
+            key: key of the timer
+
+        Returns:
+            True if the timer was armed, False otherwise
+        """
+
+        if self.timers.pop(key, None) is None:
+            return False
+        self.stats["cancelled"] += 1
+        self.__compact()
+        return True
+
+    def reschedule(self, keys, deadline: float) -> None:
+        """
+        Move the armed timers of the given keys to the same deadline. When many timers are moved, the new entries are
+        added at once and the heap is rebuilt in linear time, dropping the stale entries.
+
+        Parameters:
+            keys: keys of the timers, the ones not armed are ignored
+            deadline: new monotonic time at which the timers are due
+        """
+
+        entries = [self.__entry(key, deadline, self.timers[key][2]) for key in keys if key in self.timers]
+        self.stats["rescheduled"] += len(entries)
+
+        if len(entries) > len(self.heap) // 8:
+            self.heap = [entry for entry in self.heap if self.__is_live(entry)] + entries
+            heapify(self.heap)
+        else:
+            for entry in entries:
+                heappush(self.heap, entry)
+        self.__compact()
+
+    def __is_live(self, entry: tuple) -> bool:
+        """
+        Check if a heap entry is the one of a live timer.
+
+        Parameters:
+            entry: heap entry
+
+        Returns:
+            True if the timer of the entry is armed and the entry is its last one
+        """
+
+        timer = self.timers.get(entry[2])
+        return timer is not None and timer[1] == entry[1]
+
+    def __compact(self) -> None:
+        """
+        Rebuild the heap without the stale entries, if they are more than the live ones.
+        """
+
+        if len(self.heap) > COMPACT_MIN_ENTRIES and len(self.heap) > 2 * len(self.timers):
+            self.heap = [entry for entry in self.heap if self.__is_live(entry)]
+            heapify(self.heap)
+            self.stats["compactions"] += 1
+
+    def next_deadline(self) -> float:
+        """
+        Get the deadline of the next timer.
+
+        Returns:
+            the monotonic time at which the next timer is due, None if no timer is armed
+        """
+
+        while self.heap and not self.__is_live(self.heap[0]):
+            heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def run(self, now: float = None) -> int:
+        """
+        Call the callbacks of the timers that are due, in the order of their deadline. A callback can arm and cancel
+        timers, the ones it arms are run in the same call if they are already due.
+
+        Parameters:
+            now: current monotonic time, the current one if None
+
+        Returns:
+            the number of timers fired
+        """
+
+        now = monotonic() if now is None else now
+        fired = 0
+
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            _, _, key = heappop(self.heap)
+            _, _, callback = self.timers.pop(key)
+            fired += 1
+            if callback is not None:
+                callback()
+
+        self.stats["fired"] += fired
+        return fired
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters of the timers.
+
+        Returns:
+            dictionary containing the counters, the number of armed timers and the number of heap entries
+        """
+
+        return dict(self.stats, live=len(self.timers), entries=len(self.heap))
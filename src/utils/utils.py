@@ -1,7 +1,9 @@
 #!/bin/bash
 
+from collections import OrderedDict
 from enum import Enum
 from hashlib import sha256
+from itertools import islice
 from time import time
 
 
@@ -39,14 +41,29 @@ def dict_to_list(dictionary: dict) -> list:
     return list(dictionary.items())
 
 
-def check_approve(message_buffer: dict, config: int, operation) -> dict:
+def same_operation(message, op_id: tuple) -> bool:
+    """
+    Check if a message refers to an operation, the operation id of a decoded message being a list.
+
+    Parameters:
+        message: message to check
+        op_id: (client id, sequence number) of the operation
+
+    Returns:
+        True if the message carries the operation id, False otherwise
+    """
+
+    return message.op_id is not None and tuple(message.op_id) == op_id
+
+
+def check_approve(message_buffer: dict, config: int, op_id: tuple) -> dict:
     """
     Check if the message buffer contains enough equal approve messages.
 
     Parameters:
         message_buffer: buffer of the received messages
         config: current epoch
-        operation: current operation
+        op_id: id of the current operation
 
     Returns:
         The list of most approve messages with the same signature
@@ -55,7 +72,7 @@ def check_approve(message_buffer: dict, config: int, operation) -> dict:
     pid_count = {}
 
     for pid, message in message_buffer.items():
-        if message.c == config and message.o == operation:
+        if message.c == config and same_operation(message, op_id):
             sign = message.sign
             if sign not in pid_count.keys():
                 pid_count[sign] = [pid]
@@ -104,7 +121,7 @@ def check_validation_confirm(message_buffer: dict, res, n_faulty_processes: int)
     return n_approve == len(message_buffer)
 
 
-def check_validation_abort(message_buffer: dict, n_faulty_processes: int, config: int, operation) -> bool:
+def check_validation_abort(message_buffer: dict, n_faulty_processes: int, config: int, op_id: tuple) -> bool:
     """
     Check if the message buffer contains enough approve messages with incorrect signature.
     
@@ -112,7 +129,7 @@ def check_validation_abort(message_buffer: dict, n_faulty_processes: int, config
         message_buffer: buffer of the received messages
         n_faulty_processes: number of faulty processes
         config: current epoch
-        operation: current operation
+        op_id: id of the current operation
         
     Returns:
         True if the message buffer contains enough approve messages with incorrect signature, False otherwise
@@ -121,7 +138,62 @@ def check_validation_abort(message_buffer: dict, n_faulty_processes: int, config
     if len(message_buffer) < (2 * n_faulty_processes) + 1:
         return False
 
-    return len(check_approve(message_buffer, config, operation)) < n_faulty_processes + 1
+    return len(check_approve(message_buffer, config, op_id)) < n_faulty_processes + 1
+
+
+def check_approve_batch(message_buffer: dict, config: int, op_id: tuple, size: int, n_faulty_processes: int) -> list:
+    """
+    Check the approve messages of a batch operation by operation, each approve carrying a signature for each
+    operation of the batch.
+
+    Parameters:
+        message_buffer: buffer of the received messages
+        config: current epoch
+        op_id: id of the batch, the id of its first operation
+        size: number of operations of the batch
+        n_faulty_processes: number of faulty processes
+
+    Returns:
+        for each operation, the signature carried by most approve messages if more than n_faulty_processes carry it,
+        None if the operation can't be committed
+    """
+
+    counts = [{} for _ in range(size)]
+    for message in message_buffer.values():
+        if message.c == config and same_operation(message, op_id) and isinstance(message.sign, list) and \
+                len(message.sign) == size:
+            for index, sign in enumerate(message.sign):
+                counts[index][sign] = counts[index].get(sign, 0) + 1
+
+    signs = []
+    for count in counts:
+        sign, equal_signs = max(count.items(), key=lambda item: item[1], default=(None, 0))
+        signs.append(sign if equal_signs > n_faulty_processes else None)
+    return signs
+
+
+def check_validation_batch(message_buffer: dict, signs: list, responses: list, commit: bool,
+                           n_faulty_processes: int) -> bool:
+    """
+    Check if the order of a batch is valid: it carries the approves of enough processes, it commits the batch if an
+    operation can be committed, and the speculative responses match the signatures of the operations committed.
+
+    Parameters:
+        message_buffer: approve messages carried by the order
+        signs: signature of each operation given by check_approve_batch on the approve messages
+        responses: speculative response of each operation
+        commit: True if the order commits the batch, False if it aborts it
+        n_faulty_processes: number of faulty processes
+
+    Returns:
+        True if the order is valid, False otherwise
+    """
+
+    if len(message_buffer) < (2 * n_faulty_processes) + 1:
+        return False
+    if commit != any(sign is not None for sign in signs):
+        return False
+    return all(sign is None or verifyp(response, sign) for response, sign in zip(responses, signs))
 
 
 def remove_unwanted_messages(message_buffer: dict, msg_type: int) -> dict:
@@ -204,87 +276,115 @@ class OpQueue:
     Class representing the operation queue to execute to update the shared dictionary.
     It contains the operation queue and the relative ages.
 
+    The queue is an ordered hash map keyed by the (client id, sequence number) id of the operations: the same
+    operation invoked twice is queued twice, and an operation is added, removed, popped or looked up in O(1). The
+    ages follow the order of the queue, as the operations are added with the current time and the reset gives all of
+    them the same age. The operations themselves are kept in the request table of the process.
+
     Attributes:
-        queue (list): list of operations to execute
-        ages (dict): dictionary containing the ages of the operations
+        ages (OrderedDict): dictionary that contains the operation id as key and the age as value, in the order the
+            operations were added
+        clients (dict): dictionary that contains the client id as key and the number of its queued operations as value
     """
 
     def __init__(self):
-        self.queue = []
-        self.ages = {}
+        self.ages = OrderedDict()
         self.clients = {}
 
-    def add(self, op: list, sender_id: int) -> None:
+    def add(self, op_id: tuple) -> None:
         """
-        Add an operation to the queue.
+        Add an operation to the queue. An operation added again is moved to the end of the queue.
 
         Parameters:
-            op: operation to add
-            sender_id: id of the client sender
+            op_id: (client id, sequence number) of the operation
+        """
+
+        if op_id in self.ages:
+            self.ages.move_to_end(op_id)
+        else:
+            self.clients[op_id[0]] = self.clients.get(op_id[0], 0) + 1
+        self.ages[op_id] = time()
+
+    def __discard(self, op_id: tuple) -> None:
+        """
+        Update the client counter of an operation removed from the queue.
+
+        Parameters:
+            op_id: id of the operation removed
         """
 
-        self.queue.append(tuple(op))
-        self.ages[tuple(op)] = time()
-        self.clients[tuple(op)] = sender_id
+        self.clients[op_id[0]] -= 1
+        if not self.clients[op_id[0]]:
+            del self.clients[op_id[0]]
 
-    def pop_left(self) -> list:
+    def pop_left(self) -> tuple:
         """
         Pop the first operation in the queue.
 
         Returns:
-            the first operation in the queue
+            the id of the first operation in the queue
         """
 
-        op = self.queue.pop(0)
-        self.ages.pop(tuple(op))
-        return op
+        op_id, _ = self.ages.popitem(last=False)
+        self.__discard(op_id)
+        return op_id
 
-    def remove(self, op: list) -> None:
+    def remove(self, op_id: tuple) -> None:
         """
         Remove an operation from the queue.
 
         Parameters:
-            op: operation to remove
+            op_id: id of the operation to remove
+
+        Raises:
+            KeyError: if the operation is not in the queue
         """
 
-        self.queue.remove(tuple(op))
-        self.ages.pop(tuple(op))
+        del self.ages[op_id]
+        self.__discard(op_id)
 
     def get_first(self) -> tuple:
         """
         Get the first operation in the queue.
 
         Returns:
-            the first operation in the queue
+            the id of the first operation in the queue
         """
 
-        return self.queue[0]
+        return next(iter(self.ages))
 
     def get(self, index: int) -> tuple:
         """
-        Get the first operation in the queue.
+        Get the operation at the given position of the queue. The queue is walked from its start (or its end for a
+        negative index), so the cost is O(index): use get_first, in O(1), for the first operation.
 
         Parameters:
-            index: index of the operation to get
+            index: index of the operation to get, negative to count from the end
 
         Returns:
-            the operation at the given index
+            the id of the operation at the given index
         """
 
-        return self.queue[index]
+        if index < 0:
+            index += len(self.ages)
+        if not 0 <= index < len(self.ages):
+            raise IndexError("operation index out of range")
+        if index >= len(self.ages) // 2:
+            return next(islice(reversed(self.ages), len(self.ages) - 1 - index, None))
+        return next(islice(self.ages, index, None))
 
-    def get_client_id(self, op: list) -> int:
+    def count_client(self, sender_id: int) -> int:
         """
-        Get the client id of the operation.
+        Get the number of operations of a client in the queue.
 
         Parameters:
-            op: operation to get the client id
+            sender_id: id of the client sender
 
         Returns:
-            the client id of the operation
+            the number of operations invoked by the client still in the queue
         """
 
-        return self.clients[tuple(op)]
+        return self.clients.get(sender_id, 0)
 
     def is_empty(self) -> bool:
         """
@@ -294,52 +394,63 @@ class OpQueue:
             True if the queue is empty, False otherwise
         """
 
-        return len(self.queue) == 0
+        return len(self.ages) == 0
 
     def size(self) -> int:
         """
         Get the number of element in the queue.
         """
 
-        return len(self.queue)
+        return len(self.ages)
 
-    def check_presence(self, op: list) -> bool:
+    def check_presence(self, op_id: tuple) -> bool:
         """
         Check if the operation is in the queue.
 
         Parameters:
-            op: operation to check
+            op_id: id of the operation to check
 
         Returns:
             True if the operation is in the queue, False otherwise
         """
 
-        return tuple(op) in self.queue
+        return op_id in self.ages
 
     def get_queue(self) -> list:
         """
         Get the queue.
 
         Returns:
-            the queue
+            the list of the operation ids in the queue
         """
 
-        return self.queue
+        return list(self.ages)
 
-    def get_ages(self) -> dict:
+    def get_ages(self) -> OrderedDict:
         """
         Get the ages.
 
         Returns:
-            the ages
+            the ages, with the operation id as key, in the order of the queue
         """
 
         return self.ages
 
+    def get_oldest_age(self) -> float:
+        """
+        Get the age of the first operation in the queue.
+
+        Returns:
+            the oldest age, None if the queue is empty
+        """
+
+        return next(iter(self.ages.values())) if self.ages else None
+
     def reset_operations_ages(self) -> None:
         """
         Reset the age of the operations.
         """
 
-        for op in self.get_ages():
-            self.ages[op] = time()
+        now = time()
+        for op_id in self.ages:
+            self.ages[op_id] = now